@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from core.database import database_config, replica_configs
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -54,6 +57,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "course.middleware.CoalesceTouchMiddleware",
 ]
 
 ROOT_URLCONF = "PlanPulse.urls"
@@ -79,14 +83,60 @@ WSGI_APPLICATION = "PlanPulse.wsgi.application"
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+# Chosen with the DATABASE_* environment variables, see core/database.py; SQLite in WAL mode by default
 
 DATABASES = {
+    "default": database_config(os.environ, BASE_DIR),
+}
+DATABASES.update(replica_configs(os.environ, DATABASES["default"]))
+
+# Safe requests read the REPLICA_APPS models from a replica, see core/routers.py; users reads the auth models.
+# A client that wrote reads from the primary for REPLICA_PIN_SECONDS, which should exceed the replication lag.
+DATABASE_ROUTERS = ["core.routers.ReplicaRouter"]
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
+REPLICA_APPS = ["course", "auth"]
+REPLICA_PIN_SECONDS = 10
+
+if REPLICA_DATABASES:
+    MIDDLEWARE.insert(1, "core.middleware.ReplicaMiddleware")
+
+# Runs the tests without replicas, which mirror the primary under test, see core/testing.py
+TEST_RUNNER = "core.testing.TestRunner"
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Use a shared backend (file, Redis or Memcached) when running several processes, so invalidations reach all of them
+
+CACHES = {
     "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "BACKEND": os.environ.get("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.environ.get("CACHE_LOCATION", ""),
     }
 }
 
+# Seconds an API response stays in the per-user response cache, see core/cache.py
+RESPONSE_CACHE_TIMEOUT = 300
+
+
+# Query statistics
+# Per-request SQL statistics (core/querystats.py), opt-in as every statement is timed while it is enabled.
+# Shown per endpoint at /api/stats/queries to staff users, QUERY_STATS_LOG also logs a line per request.
+
+QUERY_STATS = os.environ.get("QUERY_STATS") == "1"
+QUERY_STATS_LOG = os.environ.get("QUERY_STATS_LOG") == "1"
+QUERY_STATS_SLOWEST = 5  # Slowest and most repeated statements kept per endpoint
+
+if QUERY_STATS:
+    MIDDLEWARE.insert(1, "core.middleware.QueryStatsMiddleware")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"core.querystats": {"handlers": ["console"], "level": "INFO"}},
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -22,4 +22,5 @@ urlpatterns = [
     path("", include("frontend.urls")),
     path("api/user/", include("users.urls")),
     path("api/course/", include("course.urls")),
+    path("api/stats/", include("core.urls")),
 ]
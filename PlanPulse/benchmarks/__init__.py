@@ -0,0 +1,7 @@
+'''
+Benchmarks for the course models and API, run from the PlanPulse directory:
+
+    python -m benchmarks.bench_flat_reads
+
+Every benchmark runs against a throw-away test database, so the development database is never touched.
+'''
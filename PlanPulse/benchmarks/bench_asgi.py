@@ -0,0 +1,123 @@
+'''
+Compares the read endpoints (profile, course list, outline, summary) under concurrency when they are served by
+the WSGI application of PlanPulse/wsgi.py from a pool of worker threads, as a threaded WSGI server calls it,
+and by the ASGI application of PlanPulse/asgi.py from one event loop, as an ASGI server calls it.
+
+The applications are called directly, without a server or sockets, so the numbers are the cost of each handler:
+under WSGI the async views run through async_to_sync in every request, under ASGI their queries run in the
+sync_to_async thread. Slow clients and long-lived connections are handled by the server and are not measured here.
+'''
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .utils import setup, test_database
+
+
+def create_data(chapters):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from django.urls import reverse
+    from course.importer import import_course
+
+    user = User.objects.create_user(username='benchmark', password='benchmark')
+    course = import_course(user, {
+        'name': 'Benchmark',
+        'metrics': [{'name': 'Pages', 'levels': [{'name': 'Done', 'time_estimate': 120}]}],
+        'chapters': [{'name': f'Chapter {i}', 'progress': {'Pages': 10}} for i in range(chapters)],
+    })
+    client = Client()
+    client.force_login(user)
+    cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+    urls = [reverse('profile'), reverse('course-list'), reverse('course-outline', args=[course.pk]), reverse('course-summary', args=[course.pk])]
+    return cookie, urls
+
+
+def run_wsgi(cookie, urls, threads):
+    from wsgiref.util import setup_testing_defaults
+    from PlanPulse.wsgi import application
+
+    def request(url):
+        environ = {'PATH_INFO': url, 'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie}
+        setup_testing_defaults(environ)
+        statuses = []
+        start = time.perf_counter()
+        response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        assert statuses[0].startswith('200'), statuses
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = list(pool.map(request, urls))
+    return len(urls) / (time.perf_counter() - start), latencies
+
+
+async def run_asgi(cookie, urls, clients):
+    from PlanPulse.asgi import application
+
+    connections = asyncio.Semaphore(clients)
+
+    async def request(url):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': url, 'raw_path': url.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+        messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+        sent = []
+        done = asyncio.Event()
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await done.wait()  # The client stays connected until the response is complete
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                done.set()
+
+        async with connections:
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            assert sent[0]['status'] == 200, sent[0]
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(request(url) for url in urls))
+    return len(urls) / (time.perf_counter() - start), latencies
+
+
+def run(chapters, requests, threads, concurrency):
+    cookie, urls = create_data(chapters)
+    urls = [urls[i % len(urls)] for i in range(requests)]
+
+    print(f"\nApplications called directly: {requests} requests, {chapters} chapters, at most {threads} WSGI threads")
+    print(f"{'clients':<10}{'WSGI req/s':>12}{'p50 ms':>10}{'ASGI req/s':>12}{'p50 ms':>10}")
+    for clients in concurrency:
+        wsgi, wsgi_latencies = run_wsgi(cookie, urls, min(clients, threads))
+        asgi, asgi_latencies = asyncio.run(run_asgi(cookie, urls, clients))
+        print(f"{clients:<10}{wsgi:>12.1f}{statistics.median(wsgi_latencies) * 1000:>10.1f}"
+              f"{asgi:>12.1f}{statistics.median(asgi_latencies) * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chapters', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--threads', type=int, default=8, help='Worker threads of the WSGI server')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 100])
+    arguments = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(arguments.chapters, arguments.requests, arguments.threads, arguments.concurrency)
@@ -0,0 +1,166 @@
+'''
+Compares the throughput of the database profiles under concurrent writes: every writer process is a user posting
+study sessions with achievements to the ingestion endpoint, while reader processes load course summaries,
+the way the worker processes of a server share the database.
+
+    default     Django's defaults: rollback journal, 5 seconds busy timeout, a new connection per request
+    tuned       the profile of core/database.py for the DATABASE_* environment variables
+
+On SQLite every profile gets a new database file. For PostgreSQL point DATABASE_NAME at a scratch database,
+the benchmark migrates it and adds its users to it. The profiles take turns for --rounds rounds and the best
+round of each is reported, so neither profile runs on a warmer machine than the other.
+Connections are closed or kept after every request as the request_finished signal of a server does.
+'''
+import argparse
+import json
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from copy import copy
+from pathlib import Path
+
+from .utils import setup
+
+
+def get_profiles(directory):
+    import os
+    from core.database import database_config
+
+    tuned = database_config(os.environ, directory)
+    default = {**tuned, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}, 'PRAGMAS': None}
+    if 'sqlite3' in tuned['ENGINE']:
+        default['ENGINE'] = 'django.db.backends.sqlite3'
+        default['NAME'] = directory / 'default.sqlite3'
+        tuned['NAME'] = directory / 'tuned.sqlite3'
+    return {'default': default, 'tuned': tuned}
+
+
+def use_profile(profile):
+    '''
+    Switches the default database to profile for the connections opened from now on, in every thread and forked process
+    '''
+    from django.db import connections
+
+    connections.close_all()
+    connections['default'].settings_dict.update(profile)  # The settings dict is shared by the connections of all threads
+
+
+def create_data(users, prefix):
+    '''
+    Migrates the database and returns the session cookies, progress instances and course of every new user
+    '''
+    from django.core.management import call_command
+    from django.test import Client
+    from course.synthetic import generate
+    from course.progress.models import AchievementMetric, InstanceMetric
+
+    call_command('migrate', verbosity=0)
+    accounts = []
+    for user in generate(users=users, courses=1, chapters=10, depth=1, sessions=0, prefix=prefix):
+        client = Client()
+        client.force_login(user)
+        rows = list(InstanceMetric.objects.filter(course_metric__course__user=user).values_list('pk', 'course_metric_id', 'course_metric__course_id'))
+        levels = dict(AchievementMetric.objects.filter(course_metric__course__user=user).values_list('course_metric_id', 'pk'))
+        accounts.append((client.cookies, [(pk, levels[metric_id]) for pk, metric_id, course_id in rows], rows[0][2]))
+    return accounts
+
+
+def work(kind, account, requests, lines):
+    '''
+    Sends requests requests as one user, ingestion posts of lines study sessions for a writer and course summaries
+    for a reader. Returns the number of successful requests and of requests that failed on a locked database.
+    '''
+    from django.db import OperationalError, close_old_connections, connections
+    from django.test import Client
+    from django.urls import reverse
+
+    cookies, instances, course_id = account
+    client = Client()
+    client.cookies = copy(cookies)
+    counts = {'ok': 0, 'locked': 0, 'rejected': 0}
+    for request in range(requests):
+        try:
+            if kind == 'write':
+                body = b'\n'.join(json.dumps({
+                    'start_time': f'2024-03-01T{request // 60 % 24:02}:{request % 60:02}:{line % 60:02}Z',
+                    'end_time': f'2024-03-01T{request // 60 % 24:02}:{request % 60:02}:{line % 60:02}.999Z',
+                    'duration': '00:00:00.5',
+                    'achievements': [{'progress_instance': pk, 'achievement_metric': level, 'value': 0.01} for pk, level in instances[:3]],
+                }).encode() for line in range(lines))
+                response = client.post(reverse('ingest-sessions'), body, content_type='application/x-ndjson')
+                results = [json.loads(result) for result in b''.join(response.streaming_content).splitlines()]
+                if response.status_code != 200 or len(results) != lines or any('errors' in result for result in results):
+                    counts['rejected'] += 1  # Only posts that stored every session count as writes
+                    continue
+            else:
+                assert client.get(reverse('course-summary', args=[course_id])).status_code == 200
+            counts['ok'] += 1
+        except OperationalError:  # database is locked
+            counts['locked'] += 1
+        close_old_connections()
+    connections.close_all()
+    return counts
+
+
+def run(accounts, readers, requests, lines):
+    from django.db import connections
+
+    tasks = [('write', account) for account in accounts] + [('read', accounts[i % len(accounts)]) for i in range(readers)]
+    connections.close_all()  # The forked processes open their own
+    start = time.perf_counter()
+    with ProcessPoolExecutor(len(tasks), mp_context=multiprocessing.get_context('fork')) as pool:
+        results = list(pool.map(work, *zip(*tasks), [requests] * len(tasks), [lines] * len(tasks)))
+    elapsed = time.perf_counter() - start
+    writes, reads = results[:len(accounts)], results[len(accounts):]
+    return {
+        'writes/s': sum(result['ok'] for result in writes) / elapsed,
+        'reads/s': sum(result['ok'] for result in reads) / elapsed,
+        'locked': sum(result['locked'] for result in results),
+        'rejected': sum(result['rejected'] for result in results),
+    }
+
+
+def drop_data(profile, prefix):
+    from django.contrib.auth.models import User
+
+    use_profile(profile)
+    if 'sqlite3' not in profile['ENGINE']:  # SQLite files are removed with their directory
+        User.objects.filter(username__startswith=prefix).delete()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=30, help='Requests per process and round')
+    parser.add_argument('--lines', type=int, default=5, help='Study sessions per ingestion request')
+    parser.add_argument('--rounds', type=int, default=3)
+    arguments = parser.parse_args()
+
+    setup()
+    from django.db import connections
+    from django.test.utils import setup_test_environment
+    setup_test_environment()  # Allows the host of the test client
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        profiles = get_profiles(Path(directory))
+        accounts = {}
+        for name, profile in profiles.items():
+            use_profile(profile)
+            accounts[name] = create_data(arguments.writers, f'writer-{name}-')
+        for _ in range(arguments.rounds):
+            for name, profile in profiles.items():
+                use_profile(profile)
+                result = run(accounts[name], arguments.readers, arguments.requests, arguments.lines)
+                if name not in results or result['writes/s'] > results[name]['writes/s']:
+                    results[name] = result
+        for name, profile in profiles.items():
+            drop_data(profile, f'writer-{name}-')
+        connections.close_all()
+
+    print(f"\nConcurrent writes: {arguments.writers} writers and {arguments.readers} readers, "
+          f"{arguments.requests} requests each, {arguments.lines} sessions per write, best of {arguments.rounds} rounds")
+    print(f"{'profile':<12}{'writes/s':>10}{'reads/s':>10}{'locked':>8}{'rejected':>10}")
+    for name, result in results.items():
+        print(f"{name:<12}{result['writes/s']:>10.1f}{result['reads/s']:>10.1f}{result['locked']:>8}{result['rejected']:>10}")
@@ -0,0 +1,71 @@
+'''
+Measures the peak memory and the throughput of the account export as the account grows.
+The peak should stay flat: rows are streamed in chunks, only the chunk size bounds the memory.
+'''
+import argparse
+import time
+import tracemalloc
+
+from .utils import setup, test_database
+
+
+def grow(user, course_id, sessions, start):
+    '''
+    Adds study sessions with an achievement each, as the bulk of a large account is its history
+    '''
+    from datetime import timedelta
+    from django.utils import timezone
+    from course.progress.models import Achievement, AchievementMetric, InstanceMetric, StudySession
+
+    done = AchievementMetric.objects.get(course_metric__course_id=course_id)
+    instances = list(InstanceMetric.objects.filter(course_metric=done.course_metric).values_list('pk', flat=True))
+    now = timezone.now()
+    created = StudySession.objects.bulk_create([StudySession(user=user, start_time=now - timedelta(minutes=i), duration=timedelta(minutes=30))
+                                                for i in range(start, start + sessions)], batch_size=1000)
+    Achievement.objects.bulk_create([Achievement(progress_instance_id=instances[i % len(instances)], achievement_metric=done, study_session=session, value=1)
+                                     for i, session in enumerate(created)], batch_size=1000)
+
+
+def measure_export(user, output, zipped):
+    from course.export import export_account
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in export_account(user, output, zipped))
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return size, duration, peak
+
+
+def run(sizes):
+    from django.contrib.auth.models import User
+    from course.importer import import_course
+
+    user = User.objects.create_user(username='benchmark', password='benchmark')
+    course = import_course(user, {
+        'name': 'Benchmark',
+        'metrics': [{'name': 'Pages', 'levels': [{'name': 'Done', 'time_estimate': 120}]}],
+        'chapters': [{'name': f'Chapter {i}', 'progress': {'Pages': 10}} for i in range(100)],
+    })
+
+    print("\nExport of an account with a growing number of study sessions and achievements")
+    print(f"{'sessions':<10}{'export':<10}{'MB out':>10}{'rows/s':>12}{'peak MB':>10}")
+    total = 0
+    for size in sorted(sizes):
+        grow(user, course.pk, size - total, total)
+        total = size
+        for output, zipped in (('json', False), ('json', True), ('csv', True)):
+            out, duration, peak = measure_export(user, output, zipped)
+            name = f"{output}{'.zip' if zipped else ''}"
+            print(f"{size:<10}{name:<10}{out / 2 ** 20:>10.1f}{2 * size / duration:>12.0f}{peak / 2 ** 20:>10.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1000, 10000, 100000])
+    arguments = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(arguments.sessions)
@@ -0,0 +1,50 @@
+'''
+Compares the polymorphic default manager with the flat manager for the list reads of a course with many chapters
+'''
+import argparse
+
+from .utils import measure, print_results, setup, test_database
+
+
+def create_course(user, name, chapters):
+    from course.importer import import_course
+
+    blocks = max(1, chapters // 10)
+    return import_course(user, {
+        'name': name,
+        'chapters': [{'name': f'Block {block}', 'chapters': [{'name': f'Chapter {block}.{i}'} for i in range(chapters // blocks - 1)]}
+                     for block in range(blocks)],
+    })
+
+
+def run(chapters, courses, repeat):
+    from django.contrib.auth.models import User
+    from course.models.models import Course, Chapter
+
+    user = User.objects.create_user(username='benchmark', password='benchmark')
+    course = create_course(user, 'Benchmark', chapters)
+    for i in range(courses - 1):
+        create_course(user, f'Course {i}', 10)
+    columns = ('id', 'name', 'parent_chapter_id', 'order', 'completed')
+
+    results = {
+        'chapters: objects (polymorphic)': measure(lambda: list(Chapter.objects.filter(course=course)), repeat),
+        'chapters: flat': measure(lambda: list(Chapter.flat.filter(course=course)), repeat),
+        'chapters: flat columns': measure(lambda: list(Chapter.flat.filter(course=course).columns(*columns)), repeat),
+        'courses: objects (polymorphic)': measure(lambda: list(Course.objects.filter(user=user)), repeat),
+        'courses: flat': measure(lambda: list(Course.flat.filter(user=user)), repeat),
+        'courses: flat columns': measure(lambda: list(Course.flat.filter(user=user).columns('id', 'name', 'date_modified')), repeat),
+    }
+    print_results(f"Flat reads: {Chapter.objects.filter(course=course).count()} chapters, {courses} courses", results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chapters', type=int, default=1000)
+    parser.add_argument('--courses', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    arguments = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(arguments.chapters, arguments.courses, arguments.repeat)
@@ -0,0 +1,51 @@
+'''
+Measures the remaining-workload forecast of a user with many courses, computed from scratch and from the cache
+'''
+import argparse
+
+from .utils import measure, print_results, setup, test_database
+
+
+def create_course(user, name, chapters):
+    from course.importer import import_course
+
+    return import_course(user, {
+        'name': name,
+        'metrics': [
+            {'name': 'Pages', 'levels': [{'name': 'Read', 'time_estimate': 120}, {'name': 'Summarized', 'weight': 3, 'time_estimate': 300}]},
+            {'name': 'Exercises', 'levels': [{'name': 'Done', 'time_estimate': 600}]},
+        ],
+        'chapters': [{'name': f'Chapter {i}', 'progress': {'Pages': 20 + i % 7, 'Exercises': i % 4}} for i in range(chapters)],
+    })
+
+
+def run(courses, chapters, repeat):
+    from django.contrib.auth.models import User
+    from django.core.cache import cache
+    from course.progress.forecast import get_forecast
+
+    user = User.objects.create_user(username='benchmark', password='benchmark')
+    for i in range(courses):
+        create_course(user, f'Course {i}', chapters)
+
+    def cold():
+        cache.clear()
+        return get_forecast(user)
+
+    results = {
+        'forecast: computed': measure(cold, repeat),
+        'forecast: cached': measure(lambda: get_forecast(user), repeat),
+    }
+    print_results(f"Forecast: {courses} courses x {chapters} chapters", results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--courses', type=int, default=30)
+    parser.add_argument('--chapters', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=50)
+    arguments = parser.parse_args()
+
+    setup()
+    with test_database():
+        run(arguments.courses, arguments.chapters, arguments.repeat)
@@ -0,0 +1,143 @@
+'''
+Runs the core model operations and the API views against a synthetic dataset (see course/synthetic.py) and
+reports latency percentiles and query counts, compared with a saved baseline.
+
+    python -m benchmarks.suite --save        # Measures and saves benchmarks/baselines/default.json
+    python -m benchmarks.suite --check       # Measures, compares and exits with 1 on a regression
+
+A benchmark regresses when it runs more queries than its baseline, or when its p50 is more than --tolerance
+slower and at least --min-delta milliseconds slower, so the noise of fast benchmarks is not reported.
+Baselines are only comparable on the machine and with the dataset sizes they were saved with.
+'''
+import argparse
+import itertools
+import json
+import sys
+from pathlib import Path
+
+from .utils import measure, setup, test_database
+
+BASELINES = Path(__file__).resolve().parent / 'baselines'
+
+
+def get_benchmarks(user):
+    '''
+    Returns the benchmarks as a dict of name to a function running the operation once
+    '''
+    from datetime import timedelta
+    from django.core.cache import cache
+    from django.test import Client
+    from django.utils import timezone
+    from django.urls import reverse
+    from course.models.models import Chapter, Course
+    from course.progress.models import Achievement, CourseMetric
+
+    course = Course.flat.filter(user=user).order_by('pk').first()
+    chapter = Chapter.objects.filter(course=course, parent_chapter__isnull=False).order_by('pk').last()
+    positions = itertools.cycle([1, chapter.get_siblings().count()])
+    achievement_id = Achievement.objects.filter(study_session__user=user).order_by('pk').values_list('pk', flat=True).last()
+    metric = CourseMetric.objects.filter(course=course).first()
+    client = Client()
+    client.force_login(user)
+
+    def get(name, *args, **params):
+        url = reverse(name, args=args)
+
+        def request():
+            cache.clear()  # Measure computing the response, not the response cache
+            response = client.get(url, params)
+            assert response.status_code == 200, (url, response.status_code)
+            b''.join(response.streaming_content) if response.streaming else response.content
+        return request
+
+    def cached(name, *args):
+        url = reverse(name, args=args)
+        return lambda: client.get(url)
+
+    return {
+        'model: Chapter.move_order': lambda: chapter.move_order(next(positions), save=True),
+        'model: Achievement.clean': lambda: Achievement.objects.get(pk=achievement_id).clean(),
+        'model: CourseMetric.get_total': metric.get_total,
+        'api: profile': get('profile'),
+        'api: course list': get('course-list'),
+        'api: course outline': get('course-outline', course.pk),
+        'api: course outline (cached)': cached('course-outline', course.pk),
+        'api: course summary': get('course-summary', course.pk),
+        'api: forecast': get('forecast'),
+        'api: study time by day': get('study-time', start=(timezone.localdate() - timedelta(days=90)).isoformat()),
+        'api: export json': get('export'),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta):
+    '''
+    Returns the names of the benchmarks that regressed against the baseline results
+    '''
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = result['p50'] > base['p50'] * (1 + tolerance) and result['p50'] - base['p50'] >= min_delta
+        if slower or result['queries'] > base['queries']:
+            regressions.append(name)
+    return regressions
+
+
+def print_comparison(title, results, baseline, regressions):
+    print(f"\n{title}")
+    print(f"{'benchmark':<34}{'queries':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'base p50':>10}{'change':>9}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        line = f"{name:<34}{result['queries']:>8}{result['p50']:>10.2f}{result['p95']:>10.2f}{result['p99']:>10.2f}"
+        if base:
+            line += f"{base['p50']:>10.2f}{(result['p50'] / base['p50'] - 1) * 100 if base['p50'] else 0:>+8.0f}%"
+            if base['queries'] != result['queries']:
+                line += f"  queries {base['queries']} -> {result['queries']}"
+        if name in regressions:
+            line += '  REGRESSION'
+        print(line)
+
+
+def run(arguments):
+    from course.synthetic import generate
+
+    config = {key: getattr(arguments, key) for key in ('users', 'courses', 'chapters', 'depth', 'sessions', 'repeat')}
+    users = generate(config['users'], config['courses'], config['chapters'], config['depth'], config['sessions'], prefix='benchmark')
+    results = {name: measure(function, arguments.repeat) for name, function in get_benchmarks(users[0]).items()}
+
+    path = BASELINES / f'{arguments.baseline}.json'
+    baseline = json.loads(path.read_text()) if path.exists() else {'config': config, 'results': {}}
+    if baseline['config'] != config:
+        print(f"The baseline {path.name} was saved with {baseline['config']}, not comparing")
+        baseline = {'config': config, 'results': {}}
+    regressions = compare(results, baseline['results'], arguments.tolerance, arguments.min_delta)
+    print_comparison(f"Benchmarks: {config}", results, baseline['results'], regressions)
+
+    if arguments.save:
+        BASELINES.mkdir(exist_ok=True)
+        path.write_text(json.dumps({'config': config, 'results': results}, indent=2) + '\n')
+        print(f"\nSaved the baseline {path}")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=1)
+    parser.add_argument('--courses', type=int, default=5)
+    parser.add_argument('--chapters', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--baseline', default='default', help='Name of the baseline file in benchmarks/baselines')
+    parser.add_argument('--save', action='store_true', help='Save the results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='Exit with 1 when a benchmark regressed')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative p50 slowdown')
+    parser.add_argument('--min-delta', type=float, default=0.5, help='Smallest p50 slowdown in ms that counts')
+    arguments = parser.parse_args()
+
+    setup()
+    with test_database():
+        regressions = run(arguments)
+    if arguments.check and regressions:
+        sys.exit(1)
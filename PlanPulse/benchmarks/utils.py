@@ -0,0 +1,64 @@
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PlanPulse.settings')
+    django.setup()
+
+
+@contextmanager
+def test_database():
+    '''
+    Creates the test database for the duration of the block
+    '''
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(function, repeat=50, warmup=3):
+    '''
+    Runs function repeat times and returns the latency percentiles in milliseconds and the queries of one run
+    '''
+    from django.db import connection, reset_queries
+    from django.test.utils import CaptureQueriesContext
+
+    for _ in range(warmup):
+        function()
+    reset_queries()  # Requests reset the query log, which would hide their queries from a capture started on a longer log
+    with CaptureQueriesContext(connection) as queries:
+        function()
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1000)
+
+    durations.sort()
+    return {
+        'p50': statistics.median(durations),
+        'p95': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+        'p99': durations[min(len(durations) - 1, int(len(durations) * 0.99))],
+        'mean': statistics.fmean(durations),
+        'queries': len(queries),
+    }
+
+
+def print_results(title, results):
+    print(f"\n{title}")
+    print(f"{'benchmark':<40}{'queries':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<40}{result['queries']:>8}{result['p50']:>10.2f}{result['p95']:>10.2f}{result['p99']:>10.2f}")
@@ -0,0 +1,11 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    '''
+    SQLite that takes the write lock when a transaction begins, as the transaction_mode option of Django 5.1 does.
+    A deferred transaction that read first cannot wait for the lock when it writes: it fails with "database is locked"
+    at once, whatever the busy timeout, as soon as another connection committed in between.
+    '''
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,73 @@
+'''
+Caches API responses per user on Django's cache framework, so any backend works (locmem, file, Redis).
+
+Every user has a generation number in the cache that is part of the keys of their responses. Invalidating
+a user increments it, which misses all of their responses at once; the old entries simply expire.
+A response is stored under the generation read before it was computed, so a response computed while
+the data changed can never be stored as the fresh one.
+'''
+
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+STATS_KEYS = {'hits': 'response-cache:hits', 'misses': 'response-cache:misses'}
+
+
+async def aget(user_id, name):
+    '''
+    Returns the cached response named name of a user, or None, and the generation to store a new one under
+    '''
+    generation = await _ageneration(user_id)
+    value = await cache.aget(_response_key(user_id, generation, name))
+    await _acount('hits' if value is not None else 'misses')
+    return value, generation
+
+
+async def aset(user_id, generation, name, value):
+    await cache.aset(_response_key(user_id, generation, name), value, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+
+def invalidate_users(user_ids):
+    '''
+    Drops all cached responses of the users
+    '''
+    for user_id in set(user_ids):
+        try:
+            cache.incr(_generation_key(user_id))
+        except ValueError:  # Not cached yet or evicted, start from a value no earlier generation can have
+            cache.set(_generation_key(user_id), time.time_ns(), None)
+
+
+def stats():
+    '''
+    Returns the hit and miss counters shared by all processes using the cache
+    '''
+    values = cache.get_many(STATS_KEYS.values())
+    return {name: values.get(key, 0) for name, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    cache.delete_many(STATS_KEYS.values())
+
+
+async def _ageneration(user_id):
+    key = _generation_key(user_id)
+    generation = await cache.aget(key)
+    if generation is None:
+        await cache.aadd(key, time.time_ns(), None)
+        generation = await cache.aget(key)
+    return generation
+
+
+async def _acount(name):
+    if not await cache.aadd(STATS_KEYS[name], 1, None):
+        await cache.aincr(STATS_KEYS[name])
+
+
+def _generation_key(user_id):
+    return f"response-cache:generation:{user_id}"
+
+
+def _response_key(user_id, generation, name):
+    return f"response-cache:{user_id}:{generation}:{name}"
@@ -0,0 +1,93 @@
+'''
+The database profile of the project, chosen with environment variables so one settings file serves development
+and production. settings.DATABASES is built with database_config:
+
+    DATABASE_ENGINE         sqlite (default) or postgresql
+    DATABASE_NAME           the SQLite file, db.sqlite3 next to manage.py by default, or the PostgreSQL database
+    DATABASE_USER, DATABASE_PASSWORD, DATABASE_HOST, DATABASE_PORT      PostgreSQL only
+    DATABASE_CONN_MAX_AGE   seconds a connection is reused between requests, 60 by default, 0 closes it after each request
+    DATABASE_TIMEOUT        seconds a SQLite write waits for the lock of another writer before "database is locked", 20 by default
+    DATABASE_POOL_SIZE      PostgreSQL: the largest connection pool of a process, used on Django 5.1 and later
+    DATABASE_POOLER         PostgreSQL: 1 when the database is reached through PgBouncer in transaction pooling mode
+    DATABASE_REPLICAS       comma separated read replicas, hosts (host or host:port) of PostgreSQL or files of SQLite
+                            stand-ins, see replica_configs and core/routers.py
+
+SQLite runs in WAL mode with synchronous=NORMAL: readers no longer block the writer, and a commit only waits for
+the log, not for the database file. Transactions take the write lock when they begin, so a busy writer is waited
+for up to DATABASE_TIMEOUT instead of failing. The PRAGMAS of a database are set on every new connection by configure_connection.
+'''
+
+import django
+from django.core.exceptions import ImproperlyConfigured
+
+SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+
+
+def database_config(environ, base_dir):
+    '''
+    Returns the settings of the default database for the environment variables in environ
+    '''
+    engine = environ.get('DATABASE_ENGINE', 'sqlite')
+    conn_max_age = int(environ.get('DATABASE_CONN_MAX_AGE', 60))
+    if engine == 'sqlite':
+        options = {'timeout': float(environ.get('DATABASE_TIMEOUT', 20))}
+        engine = 'core.backends.sqlite3'  # Transactions take the write lock at BEGIN, see its DatabaseWrapper
+        if django.VERSION >= (5, 1):
+            engine = 'django.db.backends.sqlite3'
+            options['transaction_mode'] = 'IMMEDIATE'
+        return {
+            'ENGINE': engine,
+            'NAME': environ.get('DATABASE_NAME', base_dir / 'db.sqlite3'),
+            'CONN_MAX_AGE': conn_max_age,
+            'OPTIONS': options,
+            'PRAGMAS': SQLITE_PRAGMAS,
+        }
+    if engine == 'postgresql':
+        config = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': environ.get('DATABASE_NAME', 'planpulse'),
+            'USER': environ.get('DATABASE_USER', ''),
+            'PASSWORD': environ.get('DATABASE_PASSWORD', ''),
+            'HOST': environ.get('DATABASE_HOST', ''),
+            'PORT': environ.get('DATABASE_PORT', ''),
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+        pool_size = int(environ.get('DATABASE_POOL_SIZE', 0))
+        if environ.get('DATABASE_POOLER') == '1':
+            config['DISABLE_SERVER_SIDE_CURSORS'] = True  # Cursors do not survive the transactions PgBouncer switches between
+        elif pool_size and django.VERSION >= (5, 1):  # Needs psycopg[pool]; older versions keep a persistent connection per thread
+            config['CONN_MAX_AGE'] = 0
+            config['OPTIONS']['pool'] = {'min_size': min(2, pool_size), 'max_size': pool_size}
+        return config
+    raise ImproperlyConfigured(f"Unknown DATABASE_ENGINE {engine}, use sqlite or postgresql")
+
+
+def replica_configs(environ, primary):
+    '''
+    Returns the settings of the read replicas in environ by alias, replica1, replica2 and so on, copies of the primary
+    settings with the host or file of the replica. Tests use the primary in their place.
+    '''
+    replicas = {}
+    for number, location in enumerate(filter(None, environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+        config = {**primary, 'TEST': {'MIRROR': 'default'}}
+        if 'sqlite' in primary['ENGINE']:
+            config['NAME'] = location.strip()
+        else:
+            host, _, port = location.strip().partition(':')
+            config.update(HOST=host, PORT=port or primary['PORT'])
+        replicas[f'replica{number}'] = config
+    return replicas
+
+
+def configure_connection(sender, connection, **kwargs):
+    '''
+    Applies the PRAGMAS of the database settings to a new SQLite connection, connected to connection_created
+    '''
+    pragmas = connection.settings_dict.get('PRAGMAS')
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -0,0 +1,118 @@
+'''
+Publish/subscribe of change events between the code that writes and long-lived connections that push them to clients.
+
+Events are published to topics, for example "course.course:3", from sync or async code, and subscribers receive them
+on their event loop. Bursts are coalesced per topic: a subscriber only sees the last event of every topic published
+since its previous batch, so its memory is bounded by the number of topics it listens to.
+
+The broker is the class named by the EVENT_BROKER setting. LocalBroker only reaches subscribers in the same process;
+a broker for several processes implements the same publish and subscribe methods.
+'''
+
+import asyncio
+import functools
+import threading
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+DEFAULT_BROKER = 'core.events.LocalBroker'
+
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    with _broker_lock:  # Concurrent first calls would each create a broker
+        return _create_broker()
+
+
+@functools.cache
+def _create_broker():
+    return import_string(getattr(settings, 'EVENT_BROKER', DEFAULT_BROKER))()
+
+
+def publish(topic, event=None):
+    get_broker().publish(topic, event)
+
+
+def subscribe(topics):
+    '''
+    Subscribes the running event loop to topics, close the subscription when done
+    '''
+    return get_broker().subscribe(topics)
+
+
+class LocalBroker:
+    '''
+    Delivers events to the subscribers of the same process
+    '''
+    def __init__(self):
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, topic, event=None):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(topic, ()))
+        for subscription in subscriptions:
+            subscription.put(topic, event)
+
+    def subscribe(self, topics):
+        subscription = Subscription(self, topics, asyncio.get_running_loop())
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[topic]
+
+
+class Subscription:
+    '''
+    The events of some topics for one event loop, coalesced per topic until the next batch is taken
+    '''
+    def __init__(self, broker, topics, loop):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.loop = loop
+        self._pending = {}
+        self._ready = asyncio.Event()
+
+    def put(self, topic, event):
+        try:
+            self.loop.call_soon_threadsafe(self._add, topic, event)
+        except RuntimeError:  # The event loop is closed
+            self.close()
+
+    def _add(self, topic, event):
+        self._pending[topic] = event
+        self._ready.set()
+
+    async def get_batch(self, window=0.25, timeout=None):
+        '''
+        Waits for an event, then waits window seconds more to collect a burst, and returns {topic: last event}.
+        Returns an empty dict when nothing is published within timeout seconds.
+        '''
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        if window:
+            await asyncio.sleep(window)
+        batch, self._pending = self._pending, {}
+        self._ready.clear()
+        return batch
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from core import cache as response_cache
+
+
+class Command(BaseCommand):
+    help = 'Shows the hit and miss counters of the per-user response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after showing them')
+
+    def handle(self, *args, **options):
+        stats = response_cache.stats()
+        requests = stats['hits'] + stats['misses']
+        ratio = f"{stats['hits'] / requests:.1%}" if requests else "-"
+        self.stdout.write(f"Hits: {stats['hits']}, misses: {stats['misses']}, hit ratio: {ratio}")
+        if options['reset']:
+            response_cache.reset_stats()
@@ -0,0 +1,148 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from . import querystats, routers
+
+
+class QueryStatsMiddleware:
+    '''
+    Records the SQL statements of every request per endpoint, see core.querystats. Opt-in, and best placed
+    near the top of MIDDLEWARE so the statements of the other middleware are recorded as well.
+    Streaming responses are recorded until their content has been sent.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        querystats.install()
+        recorder = querystats.Recorder()
+        token = querystats.activate(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            querystats.deactivate(token)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        await sync_to_async(querystats.install)()  # The connections of the thread the queries run in
+        recorder = querystats.Recorder()
+        token = querystats.activate(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            querystats.deactivate(token)
+        return self.finish(request, response, recorder)
+
+    def finish(self, request, response, recorder):
+        match = request.resolver_match
+        endpoint = f"{request.method} /{match.route}" if match else f"{request.method} unresolved"
+        if not response.streaming:
+            querystats.finish(endpoint, recorder, request.path)
+        elif response.is_async:
+            response.streaming_content = self.arecord(response.streaming_content, endpoint, recorder, request.path)
+        else:
+            response.streaming_content = self.record(response.streaming_content, endpoint, recorder, request.path)
+        return response
+
+    def record(self, content, endpoint, recorder, path):
+        iterator = iter(content)
+        try:
+            while True:
+                token = querystats.activate(recorder)  # Only while the next chunk is produced
+                try:
+                    chunk = next(iterator, None)
+                finally:
+                    querystats.deactivate(token)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            querystats.finish(endpoint, recorder, path)
+
+    async def arecord(self, content, endpoint, recorder, path):
+        iterator = aiter(content)
+        try:
+            while True:
+                token = querystats.activate(recorder)
+                try:
+                    chunk = await anext(iterator, None)
+                finally:
+                    querystats.deactivate(token)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            querystats.finish(endpoint, recorder, path)
+
+
+class ReplicaMiddleware:
+    '''
+    Routes the queries of every request with a core.routers.Policy: the reads of safe requests go to a replica,
+    unless the client is pinned to the primary by a recent write. Unsafe requests and requests that wrote pin their
+    client; unsafe ones up front, as a streaming response may only write after its headers were sent.
+    Streaming responses keep the policy while their content is produced.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        policy = routers.get_policy(request.method, routers.PIN_COOKIE in request.COOKIES)
+        token = routers.activate(policy)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        return self.finish(request, response, policy)
+
+    async def __acall__(self, request):
+        policy = routers.get_policy(request.method, routers.PIN_COOKIE in request.COOKIES)
+        token = routers.activate(policy)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.deactivate(token)
+        return self.finish(request, response, policy)
+
+    def finish(self, request, response, policy):
+        if policy.wrote or request.method not in routers.SAFE_METHODS:
+            response.set_cookie(routers.PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 10), httponly=True, samesite='Lax')
+        if response.streaming and policy.replica:
+            response.streaming_content = (self.aroute if response.is_async else self.route)(response.streaming_content, policy)
+        return response
+
+    def route(self, content, policy):
+        iterator = iter(content)
+        while True:
+            token = routers.activate(policy)
+            try:
+                chunk = next(iterator, None)
+            finally:
+                routers.deactivate(token)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def aroute(self, content, policy):
+        iterator = aiter(content)
+        while True:
+            token = routers.activate(policy)
+            try:
+                chunk = await anext(iterator, None)
+            finally:
+                routers.deactivate(token)
+            if chunk is None:
+                return
+            yield chunk
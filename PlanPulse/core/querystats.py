@@ -0,0 +1,193 @@
+'''
+Records the SQL statements of each request: how many and on which database, the time spent in the database,
+the slowest statements and the statements that ran more than once. The records are aggregated per endpoint into histograms.
+
+Recording is opt-in, see core.middleware.QueryStatsMiddleware. A database execute wrapper is installed on every
+connection once, and only records while a request is being recorded, so it costs one context lookup otherwise.
+The aggregates live in the memory of the process, every worker process keeps its own.
+'''
+
+import heapq
+import logging
+import threading
+from contextvars import ContextVar
+from time import perf_counter
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, the last bucket counts everything above
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+TIME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)  # Milliseconds
+
+_current = ContextVar('query_recorder', default=None)
+_lock = threading.Lock()
+_endpoints = {}
+
+
+class Recorder:
+    '''
+    The statements of one request
+    '''
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.slowest = []  # Heap of (seconds, sql)
+        self.statements = {}  # (sql, params) -> number of executions
+        self.databases = {}  # Database alias -> number of statements
+
+    def add(self, sql, params, many, duration, alias=DEFAULT_DB_ALIAS):
+        self.count += 1
+        self.time += duration
+        self.databases[alias] = self.databases.get(alias, 0) + 1
+        entry = (duration, sql)
+        if len(self.slowest) < getattr(settings, 'QUERY_STATS_SLOWEST', 5):
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+        key = (sql, _freeze(params, many))
+        self.statements[key] = self.statements.get(key, 0) + 1
+
+    def get_duplicates(self):
+        '''
+        Returns the statements that ran with the same parameters more than once, with their count
+        '''
+        return sorted(((sql, count) for (sql, params), count in self.statements.items() if count > 1), key=lambda item: -item[1])
+
+    def get_repeated(self):
+        '''
+        Returns the statements that ran more than once with any parameters, the usual sign of a query per row
+        '''
+        counts = {}
+        for (sql, _), count in self.statements.items():
+            counts[sql] = counts.get(sql, 0) + count
+        return sorted(((sql, count) for sql, count in counts.items() if count > 1), key=lambda item: -item[1])
+
+
+class Endpoint:
+    '''
+    The aggregated records of one endpoint
+    '''
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.time = 0.0
+        self.max_queries = 0
+        self.max_time = 0.0
+        self.duplicates = 0
+        self.query_histogram = [0] * (len(QUERY_BUCKETS) + 1)
+        self.time_histogram = [0] * (len(TIME_BUCKETS) + 1)
+        self.slowest = []  # Heap of (seconds, sql) over all requests
+        self.repeated = {}  # sql -> highest count in one request
+        self.databases = {}  # Database alias -> number of statements
+
+    def add(self, recorder):
+        self.requests += 1
+        self.queries += recorder.count
+        self.time += recorder.time
+        self.max_queries = max(self.max_queries, recorder.count)
+        self.max_time = max(self.max_time, recorder.time)
+        self.duplicates += sum(count - 1 for sql, count in recorder.get_duplicates())
+        self.query_histogram[_bucket(QUERY_BUCKETS, recorder.count)] += 1
+        self.time_histogram[_bucket(TIME_BUCKETS, recorder.time * 1000)] += 1
+        for entry in recorder.slowest:
+            if len(self.slowest) < getattr(settings, 'QUERY_STATS_SLOWEST', 5):
+                heapq.heappush(self.slowest, entry)
+            elif entry > self.slowest[0]:
+                heapq.heapreplace(self.slowest, entry)
+        for sql, count in recorder.get_repeated():
+            self.repeated[sql] = max(self.repeated.get(sql, 0), count)
+        for alias, count in recorder.databases.items():
+            self.databases[alias] = self.databases.get(alias, 0) + count
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'queries': {'total': self.queries, 'mean': self.queries / self.requests, 'max': self.max_queries,
+                        'histogram': _histogram(QUERY_BUCKETS, self.query_histogram)},
+            'time_ms': {'total': self.time * 1000, 'mean': self.time * 1000 / self.requests, 'max': self.max_time * 1000,
+                        'histogram': _histogram(TIME_BUCKETS, self.time_histogram)},
+            'duplicates': self.duplicates,
+            'databases': dict(self.databases),
+            'slowest': [{'sql': sql, 'time_ms': duration * 1000} for duration, sql in sorted(self.slowest, reverse=True)],
+            'repeated': [{'sql': sql, 'max_per_request': count}
+                         for sql, count in sorted(self.repeated.items(), key=lambda item: -item[1])[:getattr(settings, 'QUERY_STATS_SLOWEST', 5)]],
+        }
+
+
+def install():
+    '''
+    Adds the recording execute wrapper to the connections of the current thread that do not have it yet
+    '''
+    for connection in connections.all():
+        if _execute not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_execute)
+
+
+def activate(recorder):
+    '''
+    Records the statements of the current context with recorder until the returned token is passed to deactivate
+    '''
+    return _current.set(recorder)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def finish(endpoint, recorder, path=None):
+    '''
+    Adds the statements of a finished request to the aggregates of its endpoint, and logs them when enabled
+    '''
+    with _lock:
+        _endpoints.setdefault(endpoint, Endpoint()).add(recorder)
+    if getattr(settings, 'QUERY_STATS_LOG', False):
+        duplicates = sum(count - 1 for sql, count in recorder.get_duplicates())
+        logger.info("%s %s: %d queries in %.1f ms, %d duplicate(s)", endpoint, path or '', recorder.count, recorder.time * 1000, duplicates)
+
+
+def stats():
+    '''
+    Returns the aggregates of all endpoints, the busiest first
+    '''
+    with _lock:
+        endpoints = sorted(_endpoints.items(), key=lambda item: -item[1].time)
+        return {endpoint: aggregate.as_dict() for endpoint, aggregate in endpoints}
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+
+def _execute(execute, sql, params, many, context):
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start_time = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add(sql, params, many, perf_counter() - start_time, context['connection'].alias)
+
+
+def _freeze(params, many):
+    try:
+        if many:
+            return hash(tuple(tuple(row) for row in params))
+        return hash(tuple(params) if isinstance(params, (list, tuple)) else tuple(sorted((params or {}).items())))
+    except TypeError:  # Unhashable parameters, count as distinct
+        return object()
+
+
+def _bucket(bounds, value):
+    for index, bound in enumerate(bounds):
+        if value <= bound:
+            return index
+    return len(bounds)
+
+
+def _histogram(bounds, counts):
+    labels = [f'<={bound}' for bound in bounds] + [f'>{bounds[-1]}']
+    return dict(zip(labels, counts))
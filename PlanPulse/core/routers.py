@@ -0,0 +1,106 @@
+'''
+Sends the reads of safe requests to the read replicas, settings.REPLICA_DATABASES, and everything else to the primary.
+
+The choice is made per request by core.middleware.ReplicaMiddleware, which activates a Policy: GET, HEAD and OPTIONS
+requests read the REPLICA_APPS models from one replica, picked at random, other requests only use the primary.
+Outside requests, in commands and tests, there is no policy and the primary is used as well. Within a request
+reads return to the primary as soon as anything was written, and inside transactions, so code that reads to write
+sees its own data. Every unsafe request, and every request that wrote, pins its client to the primary for
+REPLICA_PIN_SECONDS with a cookie, which covers the replication lag for the user's own writes. The cookie is set
+before the response starts, also for views that only write while their content streams.
+
+The pin is per client, another device of the same user may read a lagging replica. So responses read from
+a replica are never stored in the per-user response cache (core/cache.py), see reads_replica.
+'''
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+PIN_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current = ContextVar('database_policy', default=None)
+_outer_blocks = ContextVar('outer_atomic_blocks', default=0)
+
+
+class Policy:
+    '''
+    The databases of one request: the replica its reads may use, None for the primary, and whether it wrote
+    '''
+    def __init__(self, replica=None):
+        self.replica = replica
+        self.wrote = False
+
+
+def get_policy(method, pinned):
+    '''
+    Returns the policy of a request with the HTTP method, pinned when the client wrote recently
+    '''
+    replicas = getattr(settings, 'REPLICA_DATABASES', [])
+    if method not in SAFE_METHODS or pinned or not replicas:
+        return Policy()
+    return Policy(random.choice(replicas))
+
+
+def reads_replica():
+    '''
+    Whether the reads of the current context may have come from a replica
+    '''
+    policy = _current.get()
+    return policy is not None and policy.replica is not None
+
+
+def activate(policy):
+    '''
+    Routes the queries of the current context with policy until the returned token is passed to deactivate
+    '''
+    return _current.set(policy)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        policy = _current.get()
+        if policy is None or policy.replica is None or policy.wrote:
+            return None
+        if model._meta.app_label not in getattr(settings, 'REPLICA_APPS', ()):
+            return None
+        if _in_transaction():
+            return None
+        return policy.replica
+
+    def db_for_write(self, model, **hints):
+        policy = _current.get()
+        if policy is not None:
+            policy.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *getattr(settings, 'REPLICA_DATABASES', [])}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True  # Replicas hold the same rows as the primary
+        return None
+
+
+@contextmanager
+def ignore_atomic_blocks():
+    '''
+    Routes the reads inside the block as outside a transaction until another atomic block starts, for tests that
+    run inside the atomic blocks of TestCase
+    '''
+    token = _outer_blocks.set(len(transaction.get_connection().atomic_blocks))
+    try:
+        yield
+    finally:
+        _outer_blocks.reset(token)
+
+
+def _in_transaction():
+    connection = transaction.get_connection()
+    return connection.in_atomic_block and len(connection.atomic_blocks) > _outer_blocks.get()
@@ -0,0 +1,21 @@
+'''
+The test runner of the project, settings.TEST_RUNNER.
+
+Under test the read replicas mirror the primary (see core/database.py), and test cases only allow queries to
+"default", so the tests run with REPLICA_DATABASES empty. Other runners, such as pytest-django, need the same
+override_settings(REPLICA_DATABASES=[]), or no DATABASE_REPLICAS in the environment.
+'''
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.without_replicas = override_settings(REPLICA_DATABASES=[])
+        self.without_replicas.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.without_replicas.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,355 @@
-from django.test import TestCase
+import asyncio
+import tempfile
+import threading
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.contrib.sessions.models import Session
+from django.db import connection, router, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db.utils import ConnectionHandler
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from core import cache as response_cache, querystats, routers
+from core.database import database_config, replica_configs
+from core.middleware import ReplicaMiddleware
+from core.routers import Policy, ReplicaRouter, get_policy
+from core.events import LocalBroker
+from course.models.models import Course
 
-# Create your tests here.
+
+class LocalBrokerTest(SimpleTestCase):
+    async def test_coalesce_per_topic(self):
+        broker = LocalBroker()
+        with broker.subscribe(['a', 'b']) as subscription:
+            for event in range(5):
+                broker.publish('a', event)
+            broker.publish('b', 'x')
+            broker.publish('c', 'ignored')
+
+            self.assertEqual(await subscription.get_batch(window=0, timeout=1), {'a': 4, 'b': 'x'})
+            self.assertEqual(await subscription.get_batch(window=0, timeout=0.01), {})
+
+    async def test_publish_from_thread(self):
+        broker = LocalBroker()
+        with broker.subscribe(['a']) as subscription:
+            thread = threading.Thread(target=broker.publish, args=('a', 1))
+            thread.start()
+            thread.join()
+            self.assertEqual(await subscription.get_batch(window=0, timeout=1), {'a': 1})
+
+    async def test_unsubscribe(self):
+        broker = LocalBroker()
+        subscription = broker.subscribe(['a'])
+        subscription.close()
+        broker.publish('a', 1)
+        self.assertEqual(broker._subscriptions, {})
+        self.assertEqual(await subscription.get_batch(window=0, timeout=0.01), {})
+
+    def test_closed_loop(self):
+        broker = LocalBroker()
+        loop = asyncio.new_event_loop()
+        subscription = loop.run_until_complete(self.subscribe(broker))
+        loop.close()
+        broker.publish('a', 1)
+        self.assertEqual(broker._subscriptions, {})
+
+    async def subscribe(self, broker):
+        return broker.subscribe(['a'])
+
+
+class ResponseCacheTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_generations(self):
+        value, generation = await response_cache.aget(1, '/a')
+        self.assertIsNone(value)
+        await response_cache.aset(1, generation, '/a', b'a')
+        self.assertEqual(await response_cache.aget(1, '/a'), (b'a', generation))
+
+        response_cache.invalidate_users([1, 1])
+        value, new_generation = await response_cache.aget(1, '/a')
+        self.assertEqual((value, new_generation), (None, generation + 1))
+        await response_cache.aset(1, generation, '/a', b'stale')  # Computed before the invalidation
+        self.assertIsNone((await response_cache.aget(1, '/a'))[0])
+
+    async def test_evicted_generation(self):
+        await response_cache.aset(1, (await response_cache.aget(1, '/a'))[1], '/a', b'a')
+        cache.clear()
+        response_cache.invalidate_users([1])
+        self.assertIsNone((await response_cache.aget(1, '/a'))[0])
+
+    async def test_stats(self):
+        _, generation = await response_cache.aget(1, '/a')
+        await response_cache.aset(1, generation, '/a', b'a')
+        await response_cache.aget(1, '/a')
+        await response_cache.aget(2, '/a')
+        self.assertEqual(response_cache.stats(), {'hits': 1, 'misses': 2})
+
+    def test_stats_command(self):
+        cache.set_many({'response-cache:hits': 3, 'response-cache:misses': 1})
+        out = StringIO()
+        call_command('response_cache_stats', '--reset', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Hits: 3, misses: 1, hit ratio: 75.0%')
+        self.assertEqual(response_cache.stats(), {'hits': 0, 'misses': 0})
+
+
+class RecorderTest(SimpleTestCase):
+    def test_duplicates(self):
+        recorder = querystats.Recorder()
+        for pk in (1, 2, 2, 2):
+            recorder.add('SELECT * FROM t WHERE id = %s', (pk,), False, 0.001 * pk)
+        recorder.add('SELECT 1', None, False, 0.01)
+
+        self.assertEqual(recorder.count, 5)
+        self.assertAlmostEqual(recorder.time, 0.017)
+        self.assertEqual(recorder.get_duplicates(), [('SELECT * FROM t WHERE id = %s', 3)])
+        self.assertEqual(recorder.get_repeated(), [('SELECT * FROM t WHERE id = %s', 4)])
+        self.assertEqual(recorder.databases, {'default': 5})
+
+    @override_settings(QUERY_STATS_SLOWEST=2)
+    def test_slowest(self):
+        recorder = querystats.Recorder()
+        for index, duration in enumerate((0.3, 0.1, 0.5, 0.2)):
+            recorder.add(f'SELECT {index}', [], False, duration)
+        self.assertEqual(sorted(recorder.slowest, reverse=True), [(0.5, 'SELECT 2'), (0.3, 'SELECT 0')])
+
+    def test_histograms(self):
+        querystats.reset()
+        for count in (0, 3, 300):
+            recorder = querystats.Recorder()
+            for _ in range(count):
+                recorder.add('SELECT 1', [], False, 0)
+            querystats.finish('GET /a', recorder)
+
+        stats = querystats.stats()['GET /a']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['queries']['max'], 300)
+        self.assertEqual(stats['queries']['histogram']['<=0'], 1)
+        self.assertEqual(stats['queries']['histogram']['<=5'], 1)
+        self.assertEqual(stats['queries']['histogram']['>200'], 1)
+        self.assertEqual(stats['duplicates'], 2 + 299)
+        self.assertEqual(stats['databases'], {'default': 303})
+        querystats.reset()
+
+
+@override_settings(MIDDLEWARE=[settings.MIDDLEWARE[0], 'core.middleware.QueryStatsMiddleware', *settings.MIDDLEWARE[1:]])
+class QueryStatsMiddlewareTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        querystats.reset()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        querystats.reset()
+        if querystats._execute in connection.execute_wrappers:
+            connection.execute_wrappers.remove(querystats._execute)
+
+    def test_sync_view(self):
+        self.client.get(reverse('forecast'))
+        self.client.get(reverse('forecast'))
+
+        stats = querystats.stats()['GET /api/course/forecast']
+        self.assertEqual(stats['requests'], 2)
+        self.assertGreater(stats['queries']['total'], 2)
+        self.assertTrue(stats['slowest'])
+
+    async def test_async_view(self):
+        await self.async_client.aforce_login(self.user)
+        await self.async_client.get(reverse('course-list'))
+        self.assertGreaterEqual(querystats.stats()['GET /api/course/']['queries']['total'], 2)  # Session and user at least
+
+    def test_streaming_response(self):
+        response = self.client.get(reverse('export'))
+        self.assertNotIn('GET /api/course/export', querystats.stats())
+        b''.join(response.streaming_content)
+        response.close()
+        self.assertGreaterEqual(querystats.stats()['GET /api/course/export']['queries']['total'], 7)
+
+    def test_not_recording_outside_requests(self):
+        self.client.get(reverse('forecast'))
+        User.objects.count()
+        self.assertEqual(list(querystats.stats()), ['GET /api/course/forecast'])
+
+    @override_settings(QUERY_STATS_LOG=True)
+    def test_log(self):
+        with self.assertLogs('core.querystats', 'INFO') as logs:
+            self.client.get(reverse('forecast'))
+        self.assertRegex(logs.output[0], r'GET /api/course/forecast /api/course/forecast: \d+ queries in [\d.]+ ms, 0 duplicate\(s\)')
+
+    def test_endpoint(self):
+        self.assertEqual(self.client.get(reverse('query-stats')).status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(reverse('forecast'))
+        response = self.client.get(reverse('query-stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET /api/course/forecast', response.json())
+
+        self.assertEqual(self.client.delete(reverse('query-stats')).status_code, 204)
+        self.assertEqual(list(querystats.stats()), ['DELETE /api/stats/queries'])  # Recorded after the reset
+
+
+class DatabaseConfigTest(SimpleTestCase):
+    def test_sqlite(self):
+        config = database_config({'DATABASE_TIMEOUT': '5'}, Path('/srv'))
+        self.assertEqual(config['NAME'], Path('/srv/db.sqlite3'))
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertEqual(config['OPTIONS']['timeout'], 5)
+        self.assertEqual(config['PRAGMAS'], {'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+
+    def test_postgresql(self):
+        environ = {'DATABASE_ENGINE': 'postgresql', 'DATABASE_NAME': 'planpulse', 'DATABASE_HOST': 'db', 'DATABASE_POOL_SIZE': '10'}
+        config = database_config(environ, Path('/srv'))
+        self.assertEqual((config['ENGINE'], config['HOST']), ('django.db.backends.postgresql', 'db'))
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+        with mock.patch('django.VERSION', (5, 1, 0, 'final', 0)):
+            config = database_config(environ, Path('/srv'))
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 2, 'max_size': 10})
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+        config = database_config({**environ, 'DATABASE_POOLER': '1'}, Path('/srv'))
+        self.assertTrue(config['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertNotIn('pool', config['OPTIONS'])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_config({'DATABASE_ENGINE': 'oracle'}, Path('/srv'))
+
+    def test_sqlite_connection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            handler = ConnectionHandler({'default': database_config({}, Path(directory))})
+            connection = handler['default']
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('PRAGMA journal_mode')
+                    self.assertEqual(cursor.fetchone()[0], 'wal')
+                    cursor.execute('PRAGMA synchronous')
+                    self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+                with CaptureQueriesContext(connection) as queries:
+                    connection.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)  # As atomic does
+                    connection.rollback()
+                    connection.set_autocommit(True)
+                self.assertEqual(queries[0]['sql'], 'BEGIN IMMEDIATE')
+            finally:
+                connection.close()
+
+    def test_replicas(self):
+        primary = database_config({'DATABASE_ENGINE': 'postgresql', 'DATABASE_HOST': 'primary', 'DATABASE_PORT': '5432'}, Path('/srv'))
+        replicas = replica_configs({'DATABASE_REPLICAS': 'replica-a, replica-b:6432'}, primary)
+        self.assertEqual(list(replicas), ['replica1', 'replica2'])
+        self.assertEqual((replicas['replica1']['HOST'], replicas['replica1']['PORT']), ('replica-a', '5432'))
+        self.assertEqual((replicas['replica2']['HOST'], replicas['replica2']['PORT']), ('replica-b', '6432'))
+        self.assertEqual(replicas['replica1']['TEST'], {'MIRROR': 'default'})
+
+        replicas = replica_configs({'DATABASE_REPLICAS': '/srv/replica.sqlite3'}, database_config({}, Path('/srv')))
+        self.assertEqual(replicas['replica1']['NAME'], '/srv/replica.sqlite3')
+        self.assertEqual(replica_configs({}, primary), {})
+
+
+@override_settings(REPLICA_DATABASES=['replica1'], REPLICA_APPS=['course', 'auth'], DATABASE_ROUTERS=['core.routers.ReplicaRouter'])
+class ReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.enterContext(routers.ignore_atomic_blocks())
+
+    def route(self, policy, model=Course):
+        token = routers.activate(policy)
+        try:
+            return model.objects.all().db
+        finally:
+            routers.deactivate(token)
+
+    def test_policy(self):
+        self.assertEqual(get_policy('GET', False).replica, 'replica1')
+        self.assertIsNone(get_policy('POST', False).replica)
+        self.assertIsNone(get_policy('GET', True).replica)
+        with override_settings(REPLICA_DATABASES=[]):
+            self.assertIsNone(get_policy('GET', False).replica)
+
+    def test_reads(self):
+        self.assertEqual(Course.objects.all().db, 'default')  # No request
+        self.assertEqual(self.route(Policy('replica1')), 'replica1')
+        self.assertEqual(self.route(Policy('replica1'), User), 'replica1')
+        self.assertEqual(self.route(Policy('replica1'), Session), 'default')
+        self.assertEqual(self.route(Policy()), 'default')
+        with transaction.atomic():
+            self.assertEqual(self.route(Policy('replica1')), 'default')
+
+    def test_writes(self):
+        policy = Policy('replica1')
+        token = routers.activate(policy)
+        try:
+            self.assertEqual(router.db_for_write(Course), 'default')
+            self.assertEqual(Course.objects.all().db, 'default')  # Reads its own write
+        finally:
+            routers.deactivate(token)
+        self.assertTrue(policy.wrote)
+
+        course, user = Course(), User()
+        course._state.db, user._state.db = 'replica1', 'default'
+        self.assertTrue(ReplicaRouter().allow_relation(course, user))
+
+
+@override_settings(REPLICA_DATABASES=['replica1'], REPLICA_APPS=['course'], REPLICA_PIN_SECONDS=5, DATABASE_ROUTERS=['core.routers.ReplicaRouter'])
+class ReplicaMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.databases_used = []
+
+    def view(self, write=False):
+        def get_response(request):
+            self.databases_used.append(Course.objects.all().db)
+            if write:
+                router.db_for_write(Course)
+                self.databases_used.append(Course.objects.all().db)
+            return HttpResponse()
+        return get_response
+
+    def test_safe_request(self):
+        response = ReplicaMiddleware(self.view())(self.factory.get('/'))
+        self.assertEqual(self.databases_used, ['replica1'])
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+        self.assertEqual(Course.objects.all().db, 'default')
+
+    def test_write_pins(self):
+        response = ReplicaMiddleware(self.view(write=True))(self.factory.get('/'))
+        self.assertEqual(self.databases_used, ['replica1', 'default'])
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 5)
+
+        request = self.factory.get('/')
+        request.COOKIES[routers.PIN_COOKIE] = '1'
+        ReplicaMiddleware(self.view())(request)
+        ReplicaMiddleware(self.view())(self.factory.post('/'))
+        self.assertEqual(self.databases_used[2:], ['default', 'default'])
+
+    def test_unsafe_request_pins_up_front(self):
+        def content():
+            router.db_for_write(Course)  # Writes while streaming, after the headers
+            yield b'chunk'
+        response = ReplicaMiddleware(lambda request: StreamingHttpResponse(content()))(self.factory.post('/'))
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+    async def test_async(self):
+        async def get_response(request):
+            self.databases_used.append(Course.objects.all().db)
+            return HttpResponse()
+        await ReplicaMiddleware(get_response)(self.factory.get('/'))
+        self.assertEqual(self.databases_used, ['replica1'])
+
+    def test_streaming_response(self):
+        def content():
+            for _ in range(2):
+                self.databases_used.append(Course.objects.all().db)
+                yield b'chunk'
+        response = ReplicaMiddleware(lambda request: StreamingHttpResponse(content()))(self.factory.get('/'))
+        self.assertEqual(b''.join(response.streaming_content), b'chunkchunk')
+        self.assertEqual(self.databases_used, ['replica1', 'replica1'])
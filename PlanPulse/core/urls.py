@@ -0,0 +1,6 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("queries", views.QueryStatsView.as_view(), name="query-stats"),
+]
@@ -1,3 +1,80 @@
-from django.shortcuts import render
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import permissions, status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from . import cache as response_cache, querystats, routers
 
-# Create your views here.
+
+def render(data, status_code=status.HTTP_200_OK):
+    '''
+    Renders data as JSON the same way a REST framework Response does
+    '''
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def stream(request, content, **kwargs):
+    '''
+    Returns a StreamingHttpResponse of the iterator content that streams under ASGI as well. Django reads a sync
+    iterator into a list before serving it from the event loop, so there every chunk is pulled from a thread instead.
+    '''
+    if isinstance(getattr(request, '_request', request), ASGIRequest):  # REST framework requests wrap the HttpRequest
+        content = _pull(iter(content))
+    return StreamingHttpResponse(content, **kwargs)
+
+
+async def _pull(iterator):
+    done = object()
+    while (chunk := await sync_to_async(next)(iterator, done)) is not done:
+        yield chunk
+
+
+class AsyncReadView(View):
+    '''
+    Base of the read-only endpoints that run on the event loop under ASGI, where the REST framework views need a thread.
+    Loads the session user without blocking and refuses anonymous requests like IsAuthenticated does.
+    With cache_responses the successful responses are cached per user and full path, see core.cache,
+    unless they were read from a replica that may lag behind the writes of another client of the user.
+    '''
+    http_method_names = ['get', 'head', 'options']
+    cache_responses = False
+
+    # Django awaits dispatch when the handlers of a view are async, View.dispatch being sync does not matter
+    async def dispatch(self, request, *args, **kwargs):  # pylint: disable=invalid-overridden-method
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return render({"detail": "Authentication credentials were not provided."}, status_code=status.HTTP_403_FORBIDDEN)
+        if not self.cache_responses or request.method not in ('GET', 'HEAD'):
+            return await super().dispatch(request, *args, **kwargs)
+
+        name = request.get_full_path()
+        content, generation = await response_cache.aget(request.user.pk, name)
+        if content is not None:
+            response = HttpResponse(content, content_type='application/json')
+            response['X-Cache'] = 'hit'
+            return response
+
+        response = await super().dispatch(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK and not response.streaming and not routers.reads_replica():
+            await response_cache.aset(request.user.pk, generation, name, response.content)
+        response['X-Cache'] = 'miss'
+        return response
+
+
+class QueryStatsView(APIView):
+    '''
+    Shows the SQL statistics per endpoint recorded by QueryStatsMiddleware in this process, DELETE resets them
+    '''
+    permission_classes = (permissions.IsAdminUser,)
+    authentication_classes = (SessionAuthentication,)
+
+    def get(self, request):
+        return Response(querystats.stats())
+
+    def delete(self, request):
+        querystats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,141 @@
+'''
+Exports all data of an account: courses, chapters, metrics, progress, study sessions and achievements.
+
+The tables are streamed one after another in dependency order, so every row only refers to rows exported
+before it. Rows are read with queryset.iterator in chunks and written out chunk by chunk, so the memory
+use is bounded by the chunk size and not by the size of the account.
+
+As JSON the export is one object with a list of rows per table. As CSV it is a zip archive with a file
+per table, the JSON can be zipped as well. Zip archives are written as a stream with data descriptors,
+so they are never held in memory either.
+'''
+
+import csv
+import io
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.serializers.json import DjangoJSONEncoder
+from .models.models import Course, Chapter
+from .progress.models import CourseMetric, AchievementMetric, InstanceMetric, Achievement, StudySession
+
+CHUNK_SIZE = 2000
+FORMATS = ('json', 'csv')
+
+
+def get_tables(user):
+    '''
+    Returns the name, columns and queryset of every exported table of user, in dependency order
+    '''
+    return [
+        ('courses', ('id', 'name', 'description', 'institution', 'instructor', 'study_points', 'completed', 'date_added', 'date_modified', 'date_completed'),
+         Course.flat.filter(user=user).order_by('pk')),
+        # Parents sort before their children by path
+        ('chapters', ('id', 'course_id', 'parent_chapter_id', 'name', 'description', 'order', 'is_numbered', 'completed', 'date_added', 'date_modified', 'date_completed'),
+         Chapter.flat.filter(course__user=user).order_by('course_id', 'path')),
+        ('course_metrics', ('id', 'course_id', 'name', 'metric_type', 'total'),
+         CourseMetric.objects.filter(course__user=user).order_by('pk')),
+        ('achievement_metrics', ('id', 'course_metric_id', 'achievement_level', 'weight', 'time_estimate', 'total'),
+         AchievementMetric.objects.filter(course_metric__course__user=user).order_by('pk')),
+        ('instance_metrics', ('id', 'course_metric_id', 'content_type__model', 'object_id', 'value'),
+         InstanceMetric.objects.filter(course_metric__course__user=user).order_by('pk')),
+        ('study_sessions', ('id', 'start_time', 'end_time', 'duration'),
+         StudySession.objects.filter(user=user).order_by('pk')),
+        ('achievements', ('id', 'progress_instance_id', 'achievement_metric_id', 'study_session_id', 'value'),
+         Achievement.objects.filter(progress_instance__course_metric__course__user=user).order_by('pk')),
+    ]
+
+
+def export_account(user, output='json', zipped=False, chunk_size=CHUNK_SIZE):
+    '''
+    Returns an iterator over the export of user in chunks of bytes, CSV exports are always zipped
+    '''
+    tables = get_tables(user)
+    if output == 'csv':
+        return _zip((f'{name}.csv', _csv_table(columns, queryset, chunk_size)) for name, columns, queryset in tables)
+    if zipped:
+        return _zip([('account.json', _json(tables, chunk_size))])
+    return _json(tables, chunk_size)
+
+
+def _chunks(columns, queryset, chunk_size):
+    '''
+    Yields lists of up to chunk_size rows
+    '''
+    chunk = []
+    for row in queryset.values_list(*columns).iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _json(tables, chunk_size):
+    encoder = DjangoJSONEncoder()
+    for index, (name, columns, queryset) in enumerate(tables):
+        yield ('{' if index == 0 else '],').encode() + f'\n"{name}": ['.encode()
+        names = _names(columns)
+        separator = '\n'
+        for chunk in _chunks(columns, queryset, chunk_size):
+            yield (separator + ',\n'.join(encoder.encode(dict(zip(names, row))) for row in chunk)).encode()
+            separator = ',\n'
+    yield b'\n]}\n'
+
+
+def _csv_table(columns, queryset, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(_names(columns))
+    for chunk in _chunks(columns, queryset, chunk_size):
+        writer.writerows([_cell(value) for value in row] for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _names(columns):
+    return [column.replace('content_type__model', 'object_type') for column in columns]
+
+
+def _cell(value):
+    '''
+    Writes dates, durations and decimals the same way as the JSON export
+    '''
+    if isinstance(value, (date, timedelta, Decimal)):
+        return DjangoJSONEncoder().default(value)
+    return value
+
+
+class _Stream(io.RawIOBase):
+    '''
+    Write-only stream that keeps the written bytes until they are taken, zipfile writes to it without seeking
+    '''
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _zip(files):
+    stream = _Stream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in files:
+            with archive.open(name, 'w', force_zip64=True) as file:
+                for chunk in chunks:
+                    file.write(chunk)
+                    if stream.chunks:
+                        yield stream.take()
+    yield stream.take()  # The rest of the last file and the central directory
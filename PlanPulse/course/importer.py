@@ -0,0 +1,218 @@
+'''
+Imports courses from declarative documents, for example (as YAML):
+
+    name: Concepten van Programeertalen
+    institution: KU Leuven
+    metrics:
+      - name: Pages
+        type: number
+        levels:
+          - {name: Done, weight: 4, time_estimate: "00:04:00"}
+    chapters:
+      - name: Basisconcepten
+        chapters:
+          - name: Waarden en typen
+            progress: {Pages: 32}
+
+Time values (time_estimate and the progress of time metrics) are seconds or "HH:MM:SS" durations.
+'''
+
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.forms import ValidationError
+from django.utils.dateparse import parse_duration
+from core import cache as response_cache
+from .models.models import Course, Chapter
+from .progress.models import CourseMetric, AchievementMetric, InstanceMetric
+from .progress.metric import metric_types as registry
+
+COURSE_FIELDS = ('name', 'description', 'institution', 'instructor', 'study_points')
+BATCH_SIZE = 500
+MAX_VALUE = Decimal('1e8')  # InstanceMetric.value has 10 digits, 2 of them after the point, time values are seconds
+
+
+def import_course(user, document):
+    return import_courses(user, [document])[0]
+
+
+def import_courses(user, documents):
+    '''
+    Creates the courses described by documents for user in one transaction.
+    Orders and totals are computed in memory, so every kind of row is written with one bulk insert
+    (one per chapter depth for the chapters), independent of the number of courses.
+    '''
+    documents = [clean_document(document, index) for index, document in enumerate(documents)]
+    names = [document['name'] for document in documents]
+    duplicates = set(Course.objects.filter(user=user, name__in=names).values_list('name', flat=True))
+    duplicates.update(name for name in names if names.count(name) > 1)
+    if duplicates:
+        raise ValidationError(f"Courses with these names already exist: {', '.join(sorted(duplicates))}")
+
+    with transaction.atomic():
+        courses = [Course(user=user, **{field: document.get(field) for field in COURSE_FIELDS}) for document in documents]
+        for course in courses:
+            course.pre_save_polymorphic()
+        Course.objects.bulk_create(courses, batch_size=BATCH_SIZE)
+
+        metrics = {}  # (course index, metric name) -> CourseMetric
+        levels = []
+        for index, (course, document) in enumerate(zip(courses, documents)):
+            for metric in document['metrics']:
+                course_metric = CourseMetric(course=course, name=metric['name'], metric_type=metric['type'])
+                metrics[(index, metric['name'])] = course_metric
+                levels += [AchievementMetric(course_metric=course_metric, achievement_level=level['name'], weight=level['weight'], time_estimate=level['time_estimate'])
+                           for level in metric['levels']]
+
+        chapters = _create_chapters(courses, documents)
+
+        progress = []
+        for index, chapter, values in chapters:
+            for name, value in values.items():
+                course_metric = metrics[(index, name)]
+                course_metric.total += value
+                progress.append((course_metric, chapter, value))
+
+        CourseMetric.objects.bulk_create(metrics.values(), batch_size=BATCH_SIZE)
+        AchievementMetric.objects.bulk_create(levels, batch_size=BATCH_SIZE)
+        content_type = ContentType.objects.get_for_model(Chapter)
+        instances = InstanceMetric.objects.bulk_create([InstanceMetric(course_metric=course_metric, content_type=content_type, object_id=chapter.pk, value=value)
+                                                        for course_metric, chapter, value in progress], batch_size=BATCH_SIZE)
+        for instance in instances:  # As from_db does, the totals already include them
+            instance._stored = instance.get_stored_value()
+        transaction.on_commit(lambda: response_cache.invalidate_users([user.pk]))  # Bulk inserts send no signals
+    return courses
+
+
+def _create_chapters(courses, documents):
+    '''
+    Inserts the chapters one depth at a time, so the parents have their ids, then writes all paths at once.
+    Returns (course index, chapter, progress) for every chapter.
+    '''
+    created = []
+    level = [(index, None, document['chapters']) for index, document in enumerate(documents)]
+    while level:
+        chapters = []
+        next_level = []
+        for index, parent, children in level:
+            for position, child in enumerate(children, start=1):
+                chapter = Chapter(course=courses[index], parent_chapter=parent, name=child['name'], description=child.get('description'),
+                                  is_numbered=child.get('is_numbered', True), order=position * Chapter.ORDER_GAP)
+                chapter.pre_save_polymorphic()
+                chapters.append(chapter)
+                created.append((index, chapter, child['progress']))
+                next_level.append((index, chapter, child['chapters']))
+        Chapter.objects.bulk_create(chapters, batch_size=BATCH_SIZE)
+        level = [item for item in next_level if item[2]]
+
+    for index, chapter, values in created:
+        parent_path = chapter.parent_chapter.path if chapter.parent_chapter else ''
+        chapter.path = f"{parent_path}{chapter.pk}/"
+    Chapter.objects.bulk_update([chapter for index, chapter, values in created], ['path'], batch_size=BATCH_SIZE)
+    return created
+
+
+def clean_document(document, index=0):
+    '''
+    Validates a course document and fills in the defaults, raises a ValidationError otherwise
+    '''
+    if not isinstance(document, dict) or not document.get('name'):
+        raise ValidationError(f"Course {index}: a course needs a name")
+    name = document['name']
+
+    metrics = []
+    for metric in document.get('metrics') or []:
+        if not isinstance(metric, dict) or not metric.get('name'):
+            raise ValidationError(f"{name}: every metric needs a name")
+        metric_type = metric.get('type', 'number')
+        if metric_type not in registry:
+            raise ValidationError(f"{name}: unknown metric type {metric_type}")
+        if any(not isinstance(level, dict) for level in metric.get('levels') or []):
+            raise ValidationError(f"{name}: every level of {metric['name']} must be an object")
+        levels = [{
+            'name': level.get('name') or '',
+            'weight': level.get('weight', 1),
+            'time_estimate': _to_duration(level.get('time_estimate'), name),
+        } for level in metric.get('levels') or []]
+        if any(not isinstance(level['weight'], int) or not 0 <= level['weight'] <= 100 for level in levels):
+            raise ValidationError(f"{name}: level weights must be whole numbers from 0 to 100")
+        if len({level['name'] for level in levels}) != len(levels):
+            raise ValidationError(f"{name}: level names of {metric['name']} must be unique")
+        metrics.append({'name': metric['name'], 'type': metric_type, 'levels': levels})
+
+    if len({metric['name'] for metric in metrics}) != len(metrics):
+        raise ValidationError(f"{name}: metric names must be unique")
+    metric_types = {metric['name']: metric['type'] for metric in metrics}
+
+    cleaned = {field: document.get(field) for field in COURSE_FIELDS}
+    cleaned['metrics'] = metrics
+    cleaned['chapters'] = [_clean_chapter(chapter, metric_types, name) for chapter in document.get('chapters') or []]
+
+    values = {}
+    _collect_progress(cleaned['chapters'], values)
+    for metric in metrics:
+        errors = registry.get(metric['type']).validate_many(values.get(metric['name'], []))
+        if errors:
+            raise ValidationError(f"{name}: {metric['name']} progress: {next(iter(errors.values()))}")
+    return cleaned
+
+
+def _collect_progress(chapters, values):
+    for chapter in chapters:
+        for metric_name, value in chapter['progress'].items():
+            values.setdefault(metric_name, []).append(value)
+        _collect_progress(chapter['chapters'], values)
+
+
+def _clean_chapter(chapter, metric_types, course_name):
+    if not isinstance(chapter, dict) or not chapter.get('name'):
+        raise ValidationError(f"{course_name}: every chapter needs a name")
+
+    if not isinstance(chapter.get('progress') or {}, dict):
+        raise ValidationError(f"{course_name}: the progress of chapter {chapter['name']} must be an object")
+    progress = {}
+    for metric_name, value in (chapter.get('progress') or {}).items():
+        if metric_name not in metric_types:
+            raise ValidationError(f"{course_name}: chapter {chapter['name']} has progress for unknown metric {metric_name}")
+        if metric_types[metric_name] == 'time':
+            progress[metric_name] = Decimal(_to_duration(value, course_name).total_seconds())
+        else:
+            progress[metric_name] = _to_decimal(value, course_name)
+
+    return {
+        'name': chapter['name'],
+        'description': chapter.get('description'),
+        'is_numbered': chapter.get('is_numbered', True),
+        'progress': progress,
+        'chapters': [_clean_chapter(child, metric_types, course_name) for child in chapter.get('chapters') or []],
+    }
+
+
+def _to_duration(value, course_name):
+    if value is None:
+        return None
+    try:
+        if isinstance(value, timedelta):
+            duration = value
+        elif isinstance(value, (int, float)):
+            duration = timedelta(seconds=value)
+        else:
+            duration = parse_duration(str(value))
+    except (OverflowError, ValueError) as error:  # Out of range, NaN or infinite seconds
+        raise ValidationError(f"{course_name}: invalid duration {value}") from error
+    if duration is None or not timedelta(0) <= duration < timedelta(seconds=int(MAX_VALUE)):
+        raise ValidationError(f"{course_name}: invalid duration {value}")
+    return duration
+
+
+def _to_decimal(value, course_name):
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation as error:
+        raise ValidationError(f"{course_name}: invalid value {value}") from error
+    if not value.is_finite() or value >= MAX_VALUE:
+        raise ValidationError(f"{course_name}: invalid value {value}")
+    if value < 0:
+        raise ValidationError(f"{course_name}: values cannot be negative")
+    return value
@@ -0,0 +1,141 @@
+'''
+Ingests study sessions that clients buffered offline, as NDJSON with one session per line, for example:
+
+    {"start_time": "2024-03-01T10:00:00Z", "end_time": "2024-03-01T11:00:00Z", "duration": "00:45:00",
+     "achievements": [{"progress_instance": 12, "achievement_metric": 3, "value": 8}]}
+
+The lines are processed in batches, so the memory use is bounded by the batch size and not by the upload.
+Every line gets its own result, either the created ids or the errors of that line only.
+'''
+
+import json
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.forms import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_duration
+from .models.touch import coalesce_touches
+from .progress.models import StudySession
+from .progress import rollups
+from . import service
+
+BATCH_SIZE = 500
+MAX_VALUE = Decimal('1e8')  # Achievement.value has 10 digits, 2 of them after the point
+
+
+def ingest_sessions(user, lines, batch_size=BATCH_SIZE):
+    '''
+    Creates the study sessions and achievements of an iterable of NDJSON lines for user.
+    Yields a result dict per non-empty line, in order, after each batch is committed.
+    '''
+    batch = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        batch.append((number, line))
+        if len(batch) >= batch_size:
+            yield from _ingest_batch(user, batch)
+            batch = []
+    if batch:
+        yield from _ingest_batch(user, batch)
+
+
+def _ingest_batch(user, batch):
+    '''
+    Validates and writes one batch with a fixed number of queries.
+    A line is rejected as a whole when its session or one of its achievements is invalid. Capacity is claimed in line order;
+    what the valid achievements of a rejected line claimed still counts for the rest of its batch, which errs on the safe side.
+    '''
+    results = {}
+    sessions = []
+    for number, line in batch:
+        try:
+            sessions.append((number, *clean_line(user, line)))
+        except ValidationError as error:
+            results[number] = {'line': number, 'errors': error.messages}
+
+    with coalesce_touches(), transaction.atomic(), rollups.coalesce_rollups():
+        numbers = [number for number, session, records in sessions for record in records]
+        errors, instances = service.check_achievements(user, [record for number, session, records in sessions for record in records], in_order=True)
+        for index, message in errors.items():
+            results.setdefault(numbers[index], {'line': numbers[index], 'errors': []})['errors'].append(message)
+        sessions = [(number, session, records) for number, session, records in sessions if number not in results]
+
+        StudySession.objects.bulk_create([session for number, session, records in sessions], batch_size=BATCH_SIZE)
+        for number, session, records in sessions:
+            rollups.mark_day(*session.get_stored_value())
+        for number, session, records in sessions:
+            for record in records:
+                record['study_session'] = session.pk
+        records = [record for number, session, records in sessions for record in records]
+        achievements = iter(service.save_achievements(records, instances) if records else [])
+
+        for number, session, records in sessions:
+            results[number] = {'line': number, 'study_session': session.pk, 'achievements': [next(achievements).pk for record in records]}
+
+    for number, line in batch:
+        yield results[number]
+
+
+def clean_line(user, line):
+    '''
+    Parses one line into an unsaved StudySession and its achievement records, raises a ValidationError otherwise
+    '''
+    try:
+        data = json.loads(line)
+    except ValueError as error:
+        raise ValidationError("The line is not valid JSON") from error
+    if not isinstance(data, dict):
+        raise ValidationError("Every line must be a JSON object")
+    if not data.get('start_time'):
+        raise ValidationError("A study session needs a start time")
+
+    session = StudySession(user=user, start_time=_to_datetime(data['start_time']), end_time=_to_datetime(data.get('end_time')),
+                           duration=_to_duration(data.get('duration')))
+    session.clean()
+
+    records = []
+    for record in data.get('achievements') or []:
+        if not isinstance(record, dict) or not isinstance(record.get('progress_instance'), int) or not isinstance(record.get('achievement_metric'), int):
+            raise ValidationError("Every achievement needs a progress_instance and an achievement_metric id")
+        records.append({'progress_instance': record['progress_instance'], 'achievement_metric': record['achievement_metric'],
+                        'value': _to_decimal(record.get('value', 0))})
+    keys = [(record['progress_instance'], record['achievement_metric']) for record in records]
+    if len(set(keys)) != len(keys):
+        raise ValidationError("The achievement is recorded more than once for the same study session")
+    return session, records
+
+
+def _to_datetime(value):
+    if value is None:
+        return None
+    try:
+        moment = parse_datetime(str(value))
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ValidationError(f"Invalid date and time {value}")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def _to_duration(value):
+    if value is None:
+        return None
+    try:
+        duration = timedelta(seconds=value) if isinstance(value, (int, float)) else parse_duration(str(value))
+    except (OverflowError, ValueError) as error:  # Out of range, NaN or infinite seconds
+        raise ValidationError(f"Invalid duration {value}") from error
+    if duration is None:
+        raise ValidationError(f"Invalid duration {value}")
+    return duration
+
+
+def _to_decimal(value):
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation as error:
+        raise ValidationError(f"Invalid value {value}") from error
+    if not number.is_finite() or abs(number) >= MAX_VALUE:
+        raise ValidationError(f"Invalid value {value}")
+    return number
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+from course.models.models import Course, Chapter
+from course.progress.models import Achievement, StudySession
+from course.synthetic import generate
+
+
+class Command(BaseCommand):
+    help = 'Generates synthetic users with courses, nested chapters, metrics, study sessions and achievements'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--courses', type=int, default=3, help='Courses per user')
+        parser.add_argument('--chapters', type=int, default=20, help='Chapters per course, blocks included')
+        parser.add_argument('--depth', type=int, default=2, help='Levels of nested chapters')
+        parser.add_argument('--sessions', type=int, default=50, help='Study sessions per course')
+        parser.add_argument('--days', type=int, default=90, help='Days the study sessions are spread over')
+        parser.add_argument('--prefix', default='synthetic', help='Usernames are the prefix followed by a number')
+        parser.add_argument('--password', help='Password of all users, by default they cannot log in')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f"Users starting with {options['prefix']} already exist, use another --prefix")
+
+        users = generate(options['users'], options['courses'], options['chapters'], options['depth'], options['sessions'],
+                         options['days'], options['prefix'], options['seed'], options['password'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(users)} user(s) with {Course.objects.filter(user__in=users).count()} course(s), "
+            f"{Chapter.objects.filter(course__user__in=users).count()} chapter(s), "
+            f"{StudySession.objects.filter(user__in=users).count()} study session(s) and "
+            f"{Achievement.objects.filter(study_session__user__in=users).count()} achievement(s)"))
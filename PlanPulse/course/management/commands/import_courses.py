@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.forms import ValidationError
+from course.importer import import_courses
+
+
+class Command(BaseCommand):
+    help = 'Imports course documents (JSON or YAML files with one course or a list of courses) for a user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('files', nargs='+', type=Path)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist as error:
+            raise CommandError(f"User {options['username']} does not exist") from error
+
+        documents = []
+        for path in options['files']:
+            document = self.load(path)
+            documents += document if isinstance(document, list) else [document]
+
+        try:
+            courses = import_courses(user, documents)
+        except ValidationError as error:
+            raise CommandError('; '.join(error.messages)) from error
+        self.stdout.write(self.style.SUCCESS(f"Imported {len(courses)} course(s)"))
+
+    def load(self, path):
+        text = path.read_text(encoding='utf-8')
+        if path.suffix in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError as error:
+                raise CommandError('Importing YAML files requires PyYAML') from error
+            return yaml.safe_load(text)
+        return json.loads(text)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from course.progress.totals import check_totals, rebuild_totals
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the stored CourseMetric and AchievementMetric totals, or only checks them with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report totals that are out of sync')
+
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = check_totals()
+            for metric in mismatches:
+                self.stdout.write(f"{type(metric).__name__} {metric.pk} ({metric}): stored {metric.total}, computed {metric.computed}")
+            if mismatches:
+                raise CommandError(f"{len(mismatches)} total(s) are out of sync")
+            self.stdout.write(self.style.SUCCESS('All totals are in sync'))
+            return
+
+        with transaction.atomic():
+            updated = rebuild_totals()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {updated} total(s)"))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from course.progress.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the DailyStudyTime and WeeklyStudyTime rollups from the study sessions'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            buckets = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {buckets} day(s) of study time"))
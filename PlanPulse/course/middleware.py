@@ -0,0 +1,28 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .models.touch import acoalesce_touches, coalesce_touches
+from .progress.rollups import acoalesce_rollups, coalesce_rollups
+
+
+class CoalesceTouchMiddleware:
+    '''
+    Writes the modified dates touched while handling a request once per object, and recomputes
+    the marked study time rollups once per bucket, after the view returns.
+    Runs on the event loop under ASGI, so async views are not moved to a thread for it.
+    '''
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with coalesce_touches(), coalesce_rollups():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        async with acoalesce_touches(), acoalesce_rollups():
+            return await self.get_response(request)
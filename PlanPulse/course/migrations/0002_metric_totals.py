@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:17
+
+from django.db import migrations, models
+
+
+def fill_totals(apps, schema_editor):
+    CourseMetric = apps.get_model('course', 'CourseMetric')
+    AchievementMetric = apps.get_model('course', 'AchievementMetric')
+
+    for course_metric in CourseMetric.objects.all():
+        course_metric.total = course_metric.instancemetric_set.aggregate(models.Sum('value'))['value__sum'] or 0
+        course_metric.save(update_fields=['total'])
+
+    for achievement_metric in AchievementMetric.objects.all():
+        achievement_metric.total = achievement_metric.achievement_set.aggregate(models.Sum('value'))['value__sum'] or 0
+        achievement_metric.save(update_fields=['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='achievementmetric',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='coursemetric',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
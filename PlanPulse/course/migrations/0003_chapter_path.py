@@ -0,0 +1,34 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:20
+
+from django.db import migrations, models
+
+
+def fill_paths(apps, schema_editor):
+    Chapter = apps.get_model('course', 'Chapter')
+    chapters = {chapter.pk: chapter for chapter in Chapter.objects.only('pk', 'parent_chapter_id')}
+
+    def path_of(chapter):
+        if not chapter.path:
+            parent = chapters.get(chapter.parent_chapter_id)
+            chapter.path = (path_of(parent) if parent else '') + f"{chapter.pk}/"
+        return chapter.path
+
+    for chapter in chapters.values():
+        path_of(chapter)
+    Chapter.objects.bulk_update(chapters.values(), ['path'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0002_metric_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chapter',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+    ]
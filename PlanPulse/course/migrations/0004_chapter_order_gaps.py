@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:22
+
+from django.db import migrations, models
+
+ORDER_GAP = 1024
+
+
+def spread_orders(apps, schema_editor):
+    Chapter = apps.get_model('course', 'Chapter')
+    # Shift above every existing key first, so no row collides on the unique order while updating
+    offset = (Chapter.objects.aggregate(models.Max('order'))['order__max'] or 0) + 1
+    Chapter.objects.update(order=models.F('order') + offset)
+    Chapter.objects.update(order=(models.F('order') - offset) * ORDER_GAP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0003_chapter_path'),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_orders, migrations.RunPython.noop),
+    ]
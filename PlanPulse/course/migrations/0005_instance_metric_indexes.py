@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('course', '0004_chapter_order_gaps'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='instancemetric',
+            index=models.Index(fields=['content_type', 'object_id'], name='course_inst_content_565f7c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instancemetric',
+            index=models.Index(fields=['course_metric', 'content_type'], name='course_inst_course__305080_idx'),
+        ),
+    ]
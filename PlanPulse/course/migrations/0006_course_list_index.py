@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:31
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('course', '0005_instance_metric_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['user', 'date_modified', 'id'], name='course_cour_user_id_46af67_idx'),
+        ),
+    ]
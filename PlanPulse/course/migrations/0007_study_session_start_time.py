@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:35
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0006_course_list_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studysession',
+            name='start_time',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-18 05:14
+
+import course.progress.metric
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0008_study_time_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='coursemetric',
+            name='metric_type',
+            field=models.CharField(choices=course.progress.metric.metric_type_choices, default='number', editable=False, max_length=20),
+        ),
+    ]
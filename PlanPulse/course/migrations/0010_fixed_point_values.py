@@ -0,0 +1,37 @@
+# Generated by Django 5.0.2 on 2026-10-18 05:19
+
+import course.progress.fields
+import django.core.validators
+from django.db import migrations, models
+
+# (model, field, table, max_digits, options of the field)
+FIELDS = [
+    ('instancemetric', 'value', 'course_instancemetric', 10, {'validators': [django.core.validators.MinValueValidator(0)]}),
+    ('achievement', 'value', 'course_achievement', 10, {'validators': [django.core.validators.MinValueValidator(0)]}),
+    ('coursemetric', 'total', 'course_coursemetric', 14, {'editable': False}),
+    ('achievementmetric', 'total', 'course_achievementmetric', 14, {'editable': False}),
+]
+
+
+def convert(model_name, name, table, max_digits, options):
+    '''
+    Replaces the decimal column by a column of hundredths, through a temporary column so the values are kept
+    '''
+    fixed = f'{name}_fixed'
+    return [
+        migrations.AddField(model_name=model_name, name=fixed, field=course.progress.fields.FixedPointField(
+            decimal_places=2, default=0, max_digits=max_digits, **options)),
+        migrations.RunSQL(f'UPDATE {table} SET {fixed} = ROUND({name} * 100)',
+                          f'UPDATE {table} SET {name} = {fixed} / 100.0'),
+        migrations.RemoveField(model_name=model_name, name=name),
+        migrations.RenameField(model_name=model_name, old_name=fixed, new_name=name),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0009_metric_type_registry'),
+    ]
+
+    operations = [operation for field in FIELDS for operation in convert(*field)]
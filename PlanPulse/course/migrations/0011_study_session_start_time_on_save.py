@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 06:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0010_fixed_point_values'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studysession',
+            name='start_time',
+            field=models.DateTimeField(blank=True),
+        ),
+    ]
@@ -1,7 +1,45 @@
 from django.utils import timezone
-from django.db import models
+from django.contrib.contenttypes.fields import GenericRelation
+from django.db import models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.db.models.functions import Concat, Length, Substr
 from django.contrib.auth.models import User
+from django.forms import ValidationError
+from polymorphic.managers import PolymorphicManager
 from polymorphic.models import PolymorphicModel
+from polymorphic.query import PolymorphicQuerySet
+from core import cache as response_cache
+from .touch import touch, touched
+
+
+class ProgressQuerySetMixin:
+    def with_progress(self):
+        '''
+        Prefetches the InstanceMetrics of every object with their achievements,
+        in two extra queries however many objects there are
+        '''
+        from ..progress.models import InstanceMetric
+
+        progress = InstanceMetric.objects.prefetch_related('achievements')
+        return self.prefetch_related(models.Prefetch('progress', queryset=progress))
+
+
+class TrackableQuerySet(ProgressQuerySetMixin, PolymorphicQuerySet):
+    pass
+
+
+class FlatQuerySet(ProgressQuerySetMixin, models.QuerySet):
+    '''
+    Queryset without the polymorphic machinery: no polymorphic_ctype handling and no
+    per-subclass queries, rows are returned as instances of the queried model.
+    Used by the read endpoints, which only need the columns of the table itself.
+    '''
+    def columns(self, *fields):
+        '''
+        Returns dicts with only the given columns
+        '''
+        return self.values(*fields)
 
 
 class Trackable(PolymorphicModel):
@@ -15,6 +53,11 @@ class Trackable(PolymorphicModel):
     date_added = models.DateTimeField(auto_now_add=True)
     date_modified = models.DateTimeField(auto_now=True)
     date_completed = models.DateTimeField(null=True, blank=True)
+    # InstanceMetrics tracking this object, lets the generic relation be prefetched and joined
+    progress = GenericRelation('course.InstanceMetric', related_query_name='%(class)s')
+
+    objects = PolymorphicManager.from_queryset(TrackableQuerySet)()
+    flat = models.Manager.from_queryset(FlatQuerySet)()  # Fast reads, see FlatQuerySet
     
     class Meta:
         abstract = True
@@ -22,10 +65,16 @@ class Trackable(PolymorphicModel):
     def complete(self):
         self.date_completed = timezone.now()
         self.save()
+
+    def delete(self, *args, **kwargs):
+        from ..progress import rollups
+
+        with transaction.atomic(), rollups.coalesce_rollups():  # Recomputes the buckets of the cascaded achievements once
+            return super().delete(*args, **kwargs)
     
     def modified(self):
         self.date_modified = timezone.now()
-        self.save()
+        touch(self)
 
 
 class Course(Trackable):
@@ -40,6 +89,9 @@ class Course(Trackable):
     class Meta:
         ordering = ['date_modified',]
         unique_together = ('user', 'name')
+        indexes = [
+            models.Index(fields=['user', 'date_modified', 'id']),  # Keyset pagination of the course list
+        ]
 
     def __str__(self):
         return self.name
@@ -50,6 +102,26 @@ class Course(Trackable):
     def add_chapter(self, name, is_numbered=True):
         return Chapter.objects.get_or_create(course=self, name=name, is_numbered=is_numbered)
 
+    def get_chapter_tree(self):
+        '''
+        Returns the root chapters of the course with their subchapters nested, loaded in one query
+        '''
+        return build_tree(Chapter.objects.filter(course=self))
+
+
+@receiver(touched, sender=Course)
+def invalidate_touched(sender, pks, **kwargs):
+    '''
+    Drops the cached responses of the owners of courses whose progress or chapters changed
+    '''
+    response_cache.invalidate_users(Course.flat.filter(pk__in=pks).values_list('user_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_course(sender, instance, **kwargs):
+    transaction.on_commit(lambda: response_cache.invalidate_users([instance.user_id]))
+
 
 class Chapter(Trackable):
     '''
@@ -57,8 +129,11 @@ class Chapter(Trackable):
     '''
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     parent_chapter = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True)
-    order = models.PositiveIntegerField(default=1)
+    order = models.PositiveIntegerField(default=1)  # Sparse sort key among the siblings, see get_position for the 1..N number
     is_numbered = models.BooleanField(default=True)
+    path = models.CharField(max_length=255, default='', editable=False, db_index=True)  # Ids from the root chapter down to this chapter, e.g. "3/8/21/"
+
+    ORDER_GAP = 1024  # Space left between the order keys of siblings, so a move only rewrites the moved chapter
 
     class Meta:
         ordering = ['order',]
@@ -66,47 +141,90 @@ class Chapter(Trackable):
 
     def __str__(self):
         return f"{self.course.name} - {self.name}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_parent_id = instance.__dict__.get('parent_chapter_id')
+        return instance
     
     def save(self, *args, **kwargs):        
-        # auto increment order
+        # Append new chapters, and chapters moved to another parent, after their siblings
         if not self.pk:
-            self.auto_increment_order(None)           
-        super().save(*args, **kwargs)
+            self.order = self.get_max_order() + self.ORDER_GAP
+        elif self.parent_changed():
+            self.check_parent()
+            self.order = self.get_max_order() + self.ORDER_GAP
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.update_path()
+
+        self._loaded_parent_id = self.parent_chapter_id
         self.course.modified()  # Update the course modified date
 
     def delete(self, *args, **kwargs):
-        # Decrement the order of chapters with a bigger order
-        self.auto_decrement_order(None)
-        self.order = None
-        super().delete(*args, **kwargs)
-
-    def auto_increment_order(self, new_order):
-        if new_order is None:
-            self.order = self.get_max_order() + 1
-        else:
-            Chapter.objects.filter(course=self.course, parent_chapter=self.parent_chapter, order__gte=new_order, order__lt=self.order).update(order=models.F('order') + 1)
-            
-    def auto_decrement_order(self, new_order):
-        if new_order is None:
-            Chapter.objects.filter(course=self.course, parent_chapter=self.parent_chapter, order__gt=self.order).update(order=models.F('order') - 1)
-        else:
-            Chapter.objects.filter(course=self.course, parent_chapter=self.parent_chapter, order__gt=self.order, order__lte=new_order).update(order=models.F('order') - 1)
-        
+        result = super().delete(*args, **kwargs)
+        self.course.modified()
+        return result
+
     def move_order(self, new_order, save=False):
-        current_order = self.order
+        '''
+        Moves the chapter to position new_order (1..N) among its siblings by giving it an order key
+        between its new neighbours. Only this chapter is written unless the gap is used up,
+        in which case all siblings are spread out again with reorder.
+        '''
+        siblings = list(self.get_siblings().exclude(pk=self.pk).values_list('pk', 'order'))
+        new_order = min(max(new_order, 1), len(siblings) + 1)
 
-        if new_order == current_order:
+        before = siblings[new_order - 2][1] if new_order > 1 else 0
+        after = siblings[new_order - 1][1] if new_order <= len(siblings) else before + 2 * self.ORDER_GAP
+        if before < self.order < after:
             return
 
-        if new_order < current_order:
-            self.auto_increment_order(new_order)
+        if after - before < 2:
+            chapter_ids = [pk for pk, order in siblings]
+            chapter_ids.insert(new_order - 1, self.pk)
+            Chapter.reorder(self.course, self.parent_chapter, chapter_ids)
+            self.order = new_order * self.ORDER_GAP
         else:
-            self.auto_decrement_order(new_order)
+            self.order = (before + after) // 2
 
-        self.order = new_order
         if save:
             self.save()
 
+    @classmethod
+    def reorder(cls, course, parent_chapter, chapter_ids):
+        '''
+        Applies a new order to all chapters of a parent (None for the top level chapters of the course).
+        Runs a fixed number of statements, whatever the number of chapters.
+        '''
+        siblings = dict(cls.objects.filter(course=course, parent_chapter=parent_chapter).values_list('pk', 'order'))
+        if len(chapter_ids) != len(siblings) or set(chapter_ids) != set(siblings):
+            raise ValidationError("The new order must contain every chapter of the parent exactly once")
+        if not chapter_ids:
+            return
+
+        # Move every key above the current and the new keys first, so no statement violates the unique order
+        temporary = max(max(siblings.values()), len(chapter_ids) * cls.ORDER_GAP) + 1
+        with transaction.atomic():
+            for start, step in ((temporary, 1), (cls.ORDER_GAP, cls.ORDER_GAP)):
+                keys = models.Case(
+                    *[models.When(pk=pk, then=models.Value(start + index * step)) for index, pk in enumerate(chapter_ids)],
+                    output_field=models.PositiveIntegerField(),
+                )
+                cls.objects.filter(pk__in=chapter_ids).update(order=keys)
+            course.modified()
+
+    def get_siblings(self):
+        return Chapter.objects.filter(course=self.course_id, parent_chapter=self.parent_chapter_id)
+
+    def get_position(self):
+        '''
+        Returns the 1..N number of the chapter among its siblings
+        '''
+        return self.get_siblings().filter(order__lt=self.order).count() + 1
+
     def get_max_order(self):
         max_order = Chapter.objects.filter(course=self.course, parent_chapter=self.parent_chapter).aggregate(models.Max('order'))['order__max']
         if max_order is None:
@@ -117,4 +235,74 @@ class Chapter(Trackable):
         return self.course.has_access(user)
 
     def add_subchapter(self, name, is_numbered=True):
-        return Chapter.objects.create(course=self.course, name=name, parent_chapter=self, is_numbered=is_numbered)
\ No newline at end of file
+        return Chapter.objects.create(course=self.course, name=name, parent_chapter=self, is_numbered=is_numbered)
+
+    def parent_changed(self):
+        return hasattr(self, '_loaded_parent_id') and self._loaded_parent_id != self.parent_chapter_id
+
+    def check_parent(self):
+        if self.parent_chapter is None:
+            return
+        if self.parent_chapter.course_id != self.course_id:
+            raise ValidationError("The parent chapter must belong to the same course")
+        if self.path and self.parent_chapter.path.startswith(self.path):
+            raise ValidationError("A chapter cannot be moved into its own subchapters")
+
+    def update_path(self):
+        '''
+        Recomputes the materialized path of the chapter and rewrites it for all of its subchapters
+        '''
+        parent_path = self.parent_chapter.path if self.parent_chapter_id else ''
+        new_path = f"{parent_path}{self.pk}/"
+        old_path = self.path
+        if new_path == old_path:
+            return
+
+        if old_path:
+            (Chapter.objects
+             .filter(course=self.course, path__startswith=old_path)
+             .update(path=Concat(models.Value(new_path), Substr('path', len(old_path) + 1), output_field=models.CharField())))
+        else:
+            Chapter.objects.filter(pk=self.pk).update(path=new_path)
+        self.path = new_path
+
+    @property
+    def depth(self):
+        return self.path.count('/') - 1
+
+    def get_ancestor_ids(self):
+        return [int(pk) for pk in self.path.split('/')[:-2]]
+
+    def get_ancestors(self):
+        '''
+        Returns the ancestors of the chapter, from the root chapter down to the parent chapter
+        '''
+        return Chapter.objects.filter(pk__in=self.get_ancestor_ids()).order_by(Length('path'))
+
+    def get_descendants(self):
+        return Chapter.objects.filter(course=self.course_id, path__startswith=self.path).exclude(pk=self.pk)
+
+    def get_subtree(self):
+        '''
+        Returns the chapter with all of its subchapters nested, loaded in one query
+        '''
+        return build_tree(Chapter.objects.filter(course=self.course_id, path__startswith=self.path))[0]
+
+
+def build_tree(chapters):
+    '''
+    Nests chapters in the subchapters list of their parent and returns the chapters without a loaded parent.
+    Siblings keep the order of the input, so pass chapters ordered by order; their position is set to 1..N.
+    '''
+    nodes = {}
+    for chapter in chapters:
+        chapter.subchapters = []
+        nodes[chapter.pk] = chapter
+
+    roots = []
+    for chapter in nodes.values():
+        parent = nodes.get(chapter.parent_chapter_id)
+        siblings = roots if parent is None else parent.subchapters
+        siblings.append(chapter)
+        chapter.position = len(siblings)
+    return roots
\ No newline at end of file
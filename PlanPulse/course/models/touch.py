@@ -0,0 +1,93 @@
+from asgiref.sync import sync_to_async
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+from core import events
+
+_pending = ContextVar('pending_touches', default=None)
+
+# Sent with the model and the primary keys once the touches are committed
+touched = Signal()
+
+
+def touch(instance):
+    '''
+    Writes the modified date of a Trackable with a narrow UPDATE, or postpones it
+    until the surrounding coalesce_touches block ends
+    '''
+    touch_ids(instance._meta.concrete_model, [instance.pk])
+
+
+def touch_ids(model, pks):
+    '''
+    Touches objects by primary key, without loading them
+    '''
+    pending = _pending.get()
+    if pending is None:
+        _write(model, set(pks))
+    else:
+        pending.setdefault(model, set()).update(pks)
+
+
+@contextmanager
+def coalesce_touches():
+    '''
+    Collects all touches made inside the block and writes them with one UPDATE per model when the block ends.
+    Nested blocks are merged into the outermost one; nothing is written when the block raises.
+    '''
+    if _pending.get() is not None:
+        yield
+        return
+
+    pending = {}
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    _write_pending(pending)
+
+
+@asynccontextmanager
+async def acoalesce_touches():
+    '''
+    coalesce_touches for async code, the touches are written from a thread when the block ends
+    '''
+    if _pending.get() is not None:
+        yield
+        return
+
+    pending = {}
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    await sync_to_async(_write_pending)(pending)
+
+
+def _write_pending(pending):
+    for model, pks in pending.items():
+        _write(model, pks)
+
+
+def topic(model, pk):
+    '''
+    The event topic that announces the changes of an object, published once the touch is committed
+    '''
+    return f"{model._meta.label_lower}:{pk}"
+
+
+def _write(model, pks):
+    pks.discard(None)
+    if pks:
+        model._base_manager.filter(pk__in=pks).update(date_modified=timezone.now())
+        transaction.on_commit(lambda: _committed(model, pks))
+
+
+def _committed(model, pks):
+    touched.send(sender=model, pks=pks)
+    for pk in pks:
+        events.publish(topic(model, pk))
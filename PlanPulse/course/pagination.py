@@ -0,0 +1,63 @@
+import base64
+from django.db.models import Q
+from django.forms import ValidationError
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def paginate_by_modified(queryset, cursor=None, limit=DEFAULT_LIMIT):
+    '''
+    Keyset pagination on (date_modified, id), the order of Course.Meta.ordering with the id to break ties.
+    queryset must return dicts with date_modified and id. Reads limit + 1 rows and never counts,
+    so every page costs the same however many rows come before it.
+    Returns the rows of the page and the cursor of the next page, or None on the last page.
+    '''
+    return _split_page(list(_page_queryset(queryset, cursor)[:limit + 1]), limit)
+
+
+async def apaginate_by_modified(queryset, cursor=None, limit=DEFAULT_LIMIT):
+    '''
+    paginate_by_modified for async views
+    '''
+    return _split_page([row async for row in _page_queryset(queryset, cursor)[:limit + 1]], limit)
+
+
+def _page_queryset(queryset, cursor):
+    queryset = queryset.order_by('date_modified', 'id')
+    if cursor:
+        date_modified, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(date_modified__gt=date_modified) | Q(date_modified=date_modified, id__gt=pk))
+    return queryset
+
+
+def _split_page(rows, limit):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]['date_modified'], rows[-1]['id'])
+
+
+def encode_cursor(date_modified, pk):
+    return base64.urlsafe_b64encode(f"{date_modified.isoformat()}|{pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        date_modified, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        date_modified = parse_datetime(date_modified)
+        pk = int(pk)
+    except ValueError as error:  # Covers invalid base64, unicode and numbers
+        raise ValidationError("Invalid cursor") from error
+    if date_modified is None:
+        raise ValidationError("Invalid cursor")
+    return date_modified, pk
+
+
+def get_limit(value):
+    try:
+        limit = int(value) if value else DEFAULT_LIMIT
+    except ValueError as error:
+        raise ValidationError("Invalid limit") from error
+    return min(max(limit, 1), MAX_LIMIT)
@@ -0,0 +1,50 @@
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import models
+
+
+class FixedPointField(models.DecimalField):
+    '''
+    A decimal stored as a whole number of its smallest unit (hundredths for two decimal places) in a bigint column.
+    Models, forms and serializers see Decimals as with a DecimalField, while the database sums, compares and
+    subtracts native integers, exactly on every backend.
+    Expressions that write a Python number next to such a column need output_field=FixedPointField(), see fixed_value.
+    '''
+    def get_internal_type(self):
+        return 'BigIntegerField'
+
+    @property
+    def scale(self):
+        return 10 ** self.decimal_places
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Decimal(int(value)).scaleb(-self.decimal_places)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None or hasattr(value, 'as_sql'):
+            return value
+        return int((value * self.scale).to_integral_value(ROUND_HALF_UP))
+
+    def get_db_prep_save(self, value, connection):
+        if hasattr(value, 'as_sql'):
+            return value
+        return self.get_db_prep_value(value, connection)
+
+
+def fixed_value(value, decimal_places=2):
+    '''
+    Wraps a Python number for expressions on fixed-point columns, e.g. F('total') + fixed_value(delta)
+    '''
+    return models.Value(value, output_field=FixedPointField(max_digits=20, decimal_places=decimal_places))
+
+
+def fixed(expression):
+    '''
+    Reads a fixed-point column, or arithmetic on such columns, as its stored integer, e.g. values_list(fixed('value'))
+    '''
+    if isinstance(expression, str):
+        expression = models.F(expression)
+    return models.ExpressionWrapper(expression, output_field=models.BigIntegerField())
@@ -0,0 +1,80 @@
+'''
+Forecasts the remaining study time of a user per chapter and per course.
+
+Every achievement level is a pass over all units of its metric, so the remaining time of a progress instance is,
+summed over the levels, the units not yet achieved at that level times the time estimate of the level.
+Levels without a time estimate are left out. The units of time metrics are seconds already, so what is left of them
+at a level is its remaining time as it is, with or without an estimate.
+'''
+
+import numpy as np
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import models
+from django.db.models.functions import Coalesce
+from ..models.models import Course, Chapter
+from .fields import FixedPointField, fixed, fixed_value
+from .models import InstanceMetric, Achievement
+
+
+def get_forecast(user):
+    '''
+    Returns the remaining study time of user in seconds, in total and per course and chapter.
+    The forecast of every course is cached until the course is modified, only the changed courses are recomputed.
+    '''
+    keys = {pk: f"course-forecast:{pk}:{date_modified.timestamp()}"
+            for pk, date_modified in Course.flat.filter(user=user).order_by('pk').values_list('pk', 'date_modified')}
+    cached = cache.get_many(keys.values())
+    forecasts = {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+    missing = [pk for pk in keys if pk not in forecasts]
+    if missing:
+        computed = compute_forecasts(missing)
+        cache.set_many({keys[pk]: forecast for pk, forecast in computed.items()})
+        forecasts.update(computed)
+
+    courses = [forecasts[pk] for pk in keys]
+    return {'remaining': sum(course['remaining'] for course in courses), 'courses': courses}
+
+
+def compute_forecasts(course_ids):
+    '''
+    Computes the forecast of many courses with one query; the rows, one per progress instance and level,
+    are summed per chapter and per course as NumPy arrays.
+    '''
+    achieved = (Achievement.objects
+                .filter(progress_instance=models.OuterRef('pk'), achievement_metric=models.OuterRef('course_metric__achievement_levels'))
+                .values('progress_instance')
+                .annotate(sum=models.Sum('value'))
+                .values('sum'))
+    # The database subtracts the fixed-point integers and returns the stored integers, so no Decimal is built per row
+    output_field = FixedPointField(max_digits=14, decimal_places=2)
+    left = models.F('value') - Coalesce(models.Subquery(achieved, output_field=output_field), fixed_value(0), output_field=output_field)
+    estimated = models.Q(course_metric__achievement_levels__time_estimate__isnull=False) | models.Q(course_metric__metric_type='time')
+    rows = list(InstanceMetric.objects
+                .filter(estimated, course_metric__course_id__in=course_ids, course_metric__achievement_levels__isnull=False)
+                .values_list('course_metric__course_id', 'content_type_id', 'object_id', 'course_metric__metric_type',
+                             'course_metric__achievement_levels__time_estimate', fixed(left)))
+
+    forecasts = {pk: {'id': pk, 'remaining': 0, 'chapters': []} for pk in course_ids}
+    if not rows:
+        return forecasts
+
+    course, content_type, object_id, metric_type, estimate, left = zip(*rows)
+    course = np.array(course, dtype=np.int64)
+    object_id = np.array(object_id, dtype=np.int64)
+    # Seconds per unit: the estimate, or 1 for time metrics whose units are seconds
+    estimate = np.where(np.array(metric_type) == 'time', 1.0,
+                        [time_estimate.total_seconds() if time_estimate else 0.0 for time_estimate in estimate])
+    remaining = np.clip(np.array(left, dtype=np.int64), 0, None) / output_field.scale * estimate
+
+    courses, course_index = np.unique(course, return_inverse=True)
+    for pk, seconds in zip(courses.tolist(), np.bincount(course_index, weights=remaining).tolist()):
+        forecasts[pk]['remaining'] = round(seconds)
+
+    chapters = np.array(content_type) == ContentType.objects.get_for_model(Chapter).pk
+    chapter_ids, first, chapter_index = np.unique(object_id[chapters], return_index=True, return_inverse=True)
+    chapter_remaining = np.bincount(chapter_index, weights=remaining[chapters])
+    for pk, course_id, seconds in zip(chapter_ids.tolist(), course[chapters][first].tolist(), chapter_remaining.tolist()):
+        forecasts[course_id]['chapters'].append({'id': pk, 'remaining': round(seconds)})
+    return forecasts
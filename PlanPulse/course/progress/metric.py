@@ -1,12 +1,29 @@
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models.functions import Coalesce
 from django.forms import ValidationError
+from django.utils.module_loading import import_string
 from datetime import timedelta
 from decimal import Decimal
+from .fields import FixedPointField, fixed_value
+
+MAX_NAME_LENGTH = 20  # Length of CourseMetric.metric_type
 
 
 class Metric:
     '''
-    Base class that coverts between Decimal values and the appropriate metric type
+    Base class that coverts between Decimal values and the appropriate metric type.
+    Metric types hold no state, the registry below shares one instance of each.
+    The *_many methods work on whole arrays of stored values at once.
+    The API serializers, the summary and the export return stored Decimals, which clients and re-imports rely on,
+    so to_display_many is for Python callers such as commands and reports.
     '''
+    label = None
+    summable = True
+    error = 'Invalid value'
+
     def get(self, value):
         '''
         Converts a Decimal value to the appropriate metric type
@@ -39,12 +56,59 @@ class Metric:
         for value in values:
             result = self.add(result, value)
         return result
+
+    def sum_expression(self, field='value'):
+        '''
+        Returns the SQL aggregate that sums the stored Decimal values of field
+        '''
+        output_field = FixedPointField(max_digits=14, decimal_places=2)
+        return Coalesce(models.Sum(field), fixed_value(0), output_field=output_field)
+
+    def from_sum(self, value):
+        '''
+        Converts the result of sum_expression, validating it once for the whole sum
+        '''
+        raise NotImplementedError('Subclasses must implement this method')
+
+    def sum_queryset(self, queryset, field='value'):
+        '''
+        Sums the values of a queryset in the database
+        '''
+        return self.from_sum(queryset.aggregate(sum=self.sum_expression(field))['sum'])
+
+    def invalid(self, values):
+        '''
+        Returns a boolean array that marks the invalid values of a float array of stored values
+        '''
+        raise NotImplementedError('Subclasses must implement this method')
+
+    def validate_many(self, values):
+        '''
+        Checks an array of stored values at once, returns the errors by index
+        '''
+        return {int(index): self.error for index in np.flatnonzero(self.invalid(_to_array(values)))}
+
+    def sum_many(self, values):
+        '''
+        Sums an array of stored values, validating them at once instead of per addition
+        '''
+        _raise_first(self.validate_many(values))
+        return self.from_sum(sum(values, Decimal(0)))
+
+    def to_display_many(self, values):
+        '''
+        Converts an array of stored values to the metric type, like get does for one value
+        '''
+        return [self.get(value) for value in values]
     
 
 class Number(Metric):
     '''
     Class that coverts between Decimal values and the appropriate number type
     '''
+    label = 'Number'
+    error = 'Invalid number value'
+
     def get(self, value):
         self.isNumber(value)
         return int(value)
@@ -62,16 +126,31 @@ class Number(Metric):
         self.isNumber(value1)
         self.isNumber(value2)
         return value1 - value2
+
+    def from_sum(self, value):
+        self.isNumber(value)
+        return value
     
     def isNumber(self, value):
         if value < 0:
             raise ValidationError('Invalid number value')
+
+    def invalid(self, values):
+        return values < 0
+
+    def to_display_many(self, values):
+        array = _to_array(values)
+        _raise_first(self.validate_many(array))
+        return array.astype(np.int64).tolist()
         
 
 class Time(Metric):
     '''
     Class that coverts between Decimal in seconds values and timedelta type
     '''
+    label = 'Time'
+    error = 'Invalid time value: negative'
+
     def get(self, value):
         self.isTimeDecimal(value)
         return timedelta(seconds=int(value))
@@ -81,6 +160,10 @@ class Time(Metric):
         return Decimal(value.total_seconds())
     
     def add(self, value1, value2):
+        if isinstance(value1, Decimal) and isinstance(value2, Decimal):  # Whole seconds, no timedelta needed
+            self.isTimeDecimal(value1)
+            self.isTimeDecimal(value2)
+            return Decimal(int(value1) + int(value2))
         if isinstance(value1, Decimal):
             value1 = self.get(value1)
         if isinstance(value2, Decimal):
@@ -89,6 +172,12 @@ class Time(Metric):
         return self.put(value1 + value2)
 
     def subtract(self, value1, value2):
+        if isinstance(value1, Decimal) and isinstance(value2, Decimal):
+            self.isTimeDecimal(value1)
+            self.isTimeDecimal(value2)
+            if int(value1) < int(value2):
+                raise ValidationError('Invalid time value: negative result')
+            return Decimal(int(value1) - int(value2))
         if isinstance(value1, Decimal):
             value1 = self.get(value1)
         if isinstance(value2, Decimal):
@@ -98,6 +187,9 @@ class Time(Metric):
             raise ValidationError('Invalid time value: negative result')
         return self.put(value1 - value2)
 
+    def from_sum(self, value):
+        return self.put(self.get(value))  # Truncates to whole seconds
+
     def isTimeDecimal(self, value):
         if not isinstance(value, Decimal):
             raise ValidationError('Invalid time value: not a decimal')
@@ -109,12 +201,24 @@ class Time(Metric):
             raise ValidationError('Invalid time value: not a timedelta')
         if value < timedelta(0):
             raise ValidationError('Invalid time value: negative')
+
+    def invalid(self, values):
+        return values < 0
+
+    def to_display_many(self, values):
+        array = _to_array(values)
+        _raise_first(self.validate_many(array))
+        return [timedelta(seconds=seconds) for seconds in array.astype(np.int64).tolist()]
     
 
 class Boolean(Metric):
     '''
     Class that coverts between Decimal values and the appropriate boolean type
     '''
+    label = 'Boolean'
+    summable = False
+    error = 'Invalid boolean value'
+
     def get(self, value):
         if value == 0:
             return False
@@ -134,12 +238,32 @@ class Boolean(Metric):
     
     def sum(self, values):
         raise ValidationError('Cannot sum boolean values')
+
+    def sum_expression(self, field='value'):
+        raise ValidationError('Cannot sum boolean values')
+
+    def from_sum(self, value):
+        raise ValidationError('Cannot sum boolean values')
+
+    def sum_many(self, values):
+        raise ValidationError('Cannot sum boolean values')
+
+    def invalid(self, values):
+        return (values != 0) & (values != 1)
+
+    def to_display_many(self, values):
+        array = _to_array(values)
+        _raise_first(self.validate_many(array))
+        return (array == 1).tolist()
     
 
 class Percentage(Metric):
     '''
     Class that coverts between Decimal values and the appropriate percentage type
     '''
+    label = 'Percentage'
+    error = 'Invalid percentage value'
+
     def get(self, value):
         self.isPercentage(value)
         return value
@@ -162,8 +286,83 @@ class Percentage(Metric):
             raise ValidationError('Invalid percentage value')
         return value1 - value2
 
+    def from_sum(self, value):
+        self.isPercentage(value)
+        return value
+
     def isPercentage(self, value):
         if not isinstance(value, Decimal):
             raise ValidationError('Invalid percentage value')
         if not 0 <= value <= 100:
-            raise ValidationError('Invalid percentage value')
\ No newline at end of file
+            raise ValidationError('Invalid percentage value')
+
+    def invalid(self, values):
+        return (values < 0) | (values > 100)
+
+    def to_display_many(self, values):
+        _raise_first(self.validate_many(values))
+        return list(values)
+
+
+class MetricTypes:
+    '''
+    Registry of the metric types by the name stored in CourseMetric.metric_type, with one shared instance per type.
+    Custom types are registered with register, or listed in the METRIC_TYPES setting as {name: dotted path of the class}.
+    '''
+    def __init__(self):
+        self._types = {}
+        self._loaded = False
+
+    def register(self, name, metric_class):
+        if len(name) > MAX_NAME_LENGTH:
+            raise ImproperlyConfigured(f"The metric type name {name} is longer than {MAX_NAME_LENGTH} characters")
+        self._types[name] = metric_class()
+
+    def get(self, name):
+        '''
+        Returns the shared instance of a type, the base Metric for unknown names, which raises NotImplementedError
+        '''
+        return self._get_types().get(name, UNKNOWN)
+
+    def __contains__(self, name):
+        return name in self._get_types()
+
+    def items(self):
+        return self._get_types().items()
+
+    def choices(self):
+        return [(name, metric.label or name.capitalize()) for name, metric in self._get_types().items()]
+
+    def _get_types(self):
+        if not self._loaded:
+            self._loaded = True
+            for name, path in getattr(settings, 'METRIC_TYPES', {}).items():
+                self.register(name, import_string(path))
+        return self._types
+
+
+UNKNOWN = Metric()
+
+metric_types = MetricTypes()
+metric_types.register('number', Number)
+metric_types.register('time', Time)
+metric_types.register('boolean', Boolean)
+metric_types.register('percentage', Percentage)
+
+
+def metric_type_choices():
+    '''
+    The choices of CourseMetric.metric_type, a function so types registered later are included
+    '''
+    return metric_types.choices()
+
+
+def _to_array(values):
+    if isinstance(values, np.ndarray):
+        return values
+    return np.fromiter((float(value) for value in values), dtype=np.float64)
+
+
+def _raise_first(errors):
+    if errors:
+        raise ValidationError(next(iter(errors.values())))
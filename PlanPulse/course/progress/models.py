@@ -2,25 +2,27 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.forms import ValidationError
+from django.utils import timezone
 from datetime import timedelta
 from ..models.models import Course, Trackable
-from .metric import Metric, Number, Time, Boolean, Percentage
+from ..models.touch import touch_ids
+from .fields import FixedPointField
+from .metric import MAX_NAME_LENGTH, metric_types, metric_type_choices
+from . import rollups, totals
 
 
 class CourseMetric(models.Model):
     '''
     Tracks the progress of a user in a course using a specific metric
     '''
-    TYPE_CHOICES = (
-        ('number', 'Number'),
-        ('time', 'Time'),
-    )
-
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
-    metric_type = models.CharField(max_length=10, choices=TYPE_CHOICES, default='number', editable=False)
+    metric_type = models.CharField(max_length=MAX_NAME_LENGTH, choices=metric_type_choices, default='number', editable=False)
+    total = FixedPointField(max_digits=14, decimal_places=2, default=0, editable=False)  # Sum of the InstanceMetric values, kept up to date on every write
 
     class Meta:
         unique_together = ('course', 'name')
@@ -32,23 +34,50 @@ class CourseMetric(models.Model):
         super().save(*args, **kwargs)
         self.course.modified()
 
+    def delete(self, *args, **kwargs):
+        course_id = self.course_id
+        with transaction.atomic(), rollups.coalesce_rollups():  # Recomputes the buckets of the cascaded achievements once
+            result = super().delete(*args, **kwargs)
+        touch_ids(Course, [course_id])
+        return result
+
     def getMetric(self):
         '''
-        Returns the metric object
+        Returns the shared metric type object, see metric.metric_types
         '''
-        metric_class = {
-            'number': Number,
-            'time': Time,
-        }.get(self.metric_type, Metric)  # Fallback to the base Metric class, which raises NotImplementedError
-    
-        return metric_class()
+        return metric_types.get(self.metric_type)
+
+    @classmethod
+    def sum_many(cls, course_metric_ids):
+        '''
+        Returns a dict with the summed InstanceMetric values of every given course metric, computed in one GROUP BY query.
+        Metrics of types that cannot be summed are left out.
+        '''
+        field = 'instancemetric__value'
+        summable = [(metric_type, metric) for metric_type, metric in metric_types.items() if metric.summable]
+        expression = models.Case(
+            *[models.When(metric_type=metric_type, then=metric.sum_expression(field)) for metric_type, metric in summable],
+            output_field=FixedPointField(max_digits=14, decimal_places=2),
+        )
+        rows = (cls.objects
+                .filter(pk__in=course_metric_ids, metric_type__in=[metric_type for metric_type, metric in summable])
+                .values('pk', 'metric_type')
+                .annotate(sum=expression)
+                .order_by())
+        return {row['pk']: metric_types.get(row['metric_type']).from_sum(row['sum']) for row in rows}
+
+    def compute_total(self):
+        '''
+        Sums the InstanceMetric values in the database, bypassing the stored total
+        '''
+        return self.getMetric().sum_queryset(InstanceMetric.objects.filter(course_metric=self))
     
     def get_total(self):
         '''
         Returns the total value of the metric
         '''
-        instances = InstanceMetric.objects.filter(course_metric=self).values_list('value', flat=True)
-        return self.getMetric().sum(instances)
+        self.refresh_from_db(fields=['total'])
+        return self.total
         
     def add_achievement_metric(self, achievement_level, weight, time_estimate=None, value=0):
         '''
@@ -65,6 +94,7 @@ class AchievementMetric(models.Model):
     achievement_level = models.CharField(max_length=255)
     weight = models.PositiveIntegerField(default=1, validators=[MaxValueValidator(100)])
     time_estimate = models.DurationField(null=True, blank=True)
+    total = FixedPointField(max_digits=14, decimal_places=2, default=0, editable=False)  # Sum of the Achievement values, kept up to date on every write
 
     class Meta:
         unique_together = ('course_metric', 'achievement_level')
@@ -77,9 +107,26 @@ class AchievementMetric(models.Model):
             if self.time_estimate < timedelta(0):
                 raise ValidationError("The time estimate cannot be negative")
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        touch_ids(Course, [self.course_metric.course_id])
+
+    def delete(self, *args, **kwargs):
+        course_id = self.course_metric.course_id
+        with transaction.atomic(), rollups.coalesce_rollups():
+            result = super().delete(*args, **kwargs)
+        touch_ids(Course, [course_id])
+        return result
+
     def get_total(self):
-        achievements = Achievement.objects.filter(achievement_metric=self).values_list('value', flat=True)
-        return self.get_metric().sum(achievements)
+        self.refresh_from_db(fields=['total'])
+        return self.total
+
+    def compute_total(self):
+        '''
+        Sums the Achievement values in the database, bypassing the stored total
+        '''
+        return self.get_metric().sum_queryset(Achievement.objects.filter(achievement_metric=self))
     
     def get_metric(self):
         return self.course_metric.getMetric()
@@ -94,10 +141,26 @@ class InstanceMetric(models.Model):
     content_object = GenericForeignKey('content_type', 'object_id')
 
     course_metric = models.ForeignKey(CourseMetric, on_delete=models.CASCADE)
-    value = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    value = FixedPointField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
 
     class Meta:
         unique_together = ('content_type', 'object_id', 'course_metric')
+        indexes = [
+            models.Index(fields=['content_type', 'object_id']),
+            models.Index(fields=['course_metric', 'content_type']),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored = instance.get_stored_value()
+        return instance
+
+    def get_stored_value(self):
+        '''
+        Returns the (course metric id, value) pair this instance contributes to a total
+        '''
+        return (self.course_metric_id, self.value)
 
     def clean(self):
         if self.value is None:
@@ -108,8 +171,19 @@ class InstanceMetric(models.Model):
             raise ValidationError('Content object must be an instance of a Trackable subclass.')
 
     def save(self, *args, **kwargs):
-        self.clean()           
-        super().save(*args, **kwargs)
+        self.clean()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            totals.move(CourseMetric, getattr(self, '_stored', None), self.get_stored_value())
+        self._stored = self.get_stored_value()
+        touch_ids(Course, [self.get_course_id()])
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(), rollups.coalesce_rollups():
+            return super().delete(*args, **kwargs)
+
+    def get_course_id(self):
+        return self.course_metric.course_id
 
 
 class Achievement(models.Model):
@@ -119,11 +193,24 @@ class Achievement(models.Model):
     progress_instance = models.ForeignKey(InstanceMetric, on_delete=models.CASCADE, related_name='achievements')
     achievement_metric = models.ForeignKey(AchievementMetric, on_delete=models.CASCADE)
     study_session = models.ForeignKey('StudySession', on_delete=models.CASCADE, null=True, blank=True)
-    value = models.DecimalField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    value = FixedPointField(max_digits=10, decimal_places=2, default=0, validators=[MinValueValidator(0)])
 
     class Meta:
         unique_together = ('progress_instance', 'achievement_metric', 'study_session')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored = instance.get_stored_value()
+        instance._loaded_session_id = instance.study_session_id
+        return instance
+
+    def get_stored_value(self):
+        '''
+        Returns the (achievement metric id, value) pair this achievement contributes to a total
+        '''
+        return (self.achievement_metric_id, self.value)
+
     def clean(self):  
         if self.value is None:
             self.value = 0
@@ -146,7 +233,16 @@ class Achievement(models.Model):
     
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            totals.move(AchievementMetric, getattr(self, '_stored', None), self.get_stored_value())
+        self._stored = self.get_stored_value()
+        touch_ids(Course, [self.get_course_id()])
+        rollups.mark_sessions({getattr(self, '_loaded_session_id', None), self.study_session_id})
+        self._loaded_session_id = self.study_session_id
+
+    def get_course_id(self):
+        return self.progress_instance.course_metric.course_id
 
     def get_metric(self):
         return self.progress_instance.course_metric.getMetric()
@@ -157,7 +253,7 @@ class StudySession(models.Model):
     Represents a study session, which can include progress on multiple instances/achievements
     '''
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    start_time = models.DateTimeField(auto_now_add=True)
+    start_time = models.DateTimeField(blank=True)  # Set to now on save when not given
     end_time = models.DateTimeField(null=True, blank=True)
     duration = models.DurationField(null=True, blank=True)
 
@@ -176,4 +272,94 @@ class StudySession(models.Model):
             
         if self.start_time or self.end_time:
             if not self.end_time or not self.start_time:
-                raise ValidationError("Both start and end time or neither must be set")
\ No newline at end of file
+                raise ValidationError("Both start and end time or neither must be set")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._stored = instance.get_stored_value()
+        return instance
+
+    def get_stored_value(self):
+        '''
+        Returns the (user id, day) rollup bucket this session counts in
+        '''
+        return (self.user_id, timezone.localdate(self.start_time) if self.start_time else None)
+
+    def save(self, *args, **kwargs):
+        if self.start_time is None:
+            self.start_time = timezone.now()
+        super().save(*args, **kwargs)
+        rollups.mark_day(*getattr(self, '_stored', (None, None)))
+        rollups.mark_day(*self.get_stored_value())
+        self._stored = self.get_stored_value()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(), rollups.coalesce_rollups():
+            return super().delete(*args, **kwargs)
+
+
+class DailyStudyTime(models.Model):
+    '''
+    Rollup of the time a user studied per course and day, maintained by progress.rollups.
+    The course is empty for the time of sessions without achievements.
+    '''
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True)
+    day = models.DateField()
+    duration = models.DurationField(default=timedelta(0))
+    sessions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'course', 'day')
+        indexes = [models.Index(fields=['user', 'day'])]
+
+
+class WeeklyStudyTime(models.Model):
+    '''
+    Rollup of the time a user studied per week, starting on Monday, maintained by progress.rollups
+    '''
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    week = models.DateField()
+    duration = models.DurationField(default=timedelta(0))
+    sessions = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'week')
+
+
+@receiver(post_delete, sender=InstanceMetric)
+@receiver(post_delete, sender=Achievement)
+def remove_progress(sender, instance, origin=None, **kwargs):
+    '''
+    Subtracts a deleted value from its total, also when it is removed by a cascade, unless the cascade
+    deletes the metric holding the total as well.
+    The course is only touched when the progress itself is deleted; cascades touch it from their origin.
+    '''
+    target = CourseMetric if sender is InstanceMetric else AchievementMetric
+    if not _deletes_total(target, origin):
+        totals.move(target, getattr(instance, '_stored', instance.get_stored_value()), None)
+
+    if getattr(origin, 'model', type(origin)) is sender:
+        touch_ids(Course, [instance.get_course_id()])
+
+
+def _deletes_total(target, origin):
+    '''
+    Whether a delete started from origin, an object or a queryset, removes the target metrics as well
+    '''
+    model = getattr(origin, 'model', type(origin))
+    owners = (User, Course, CourseMetric, target)
+    return isinstance(model, type) and issubclass(model, owners)
+
+
+@receiver(post_delete, sender=StudySession)
+@receiver(post_delete, sender=Achievement)
+def remove_study_time(sender, instance, **kwargs):
+    '''
+    Recomputes the rollup bucket of a deleted session, or of the session a deleted achievement was recorded in
+    '''
+    if sender is StudySession:
+        rollups.mark_day(*getattr(instance, '_stored', instance.get_stored_value()))
+    else:
+        rollups.mark_sessions([getattr(instance, '_loaded_session_id', instance.study_session_id)])
@@ -0,0 +1,213 @@
+'''
+Maintains the DailyStudyTime and WeeklyStudyTime rollups, so study time over a range of days is read
+from a handful of rows per day instead of summing every StudySession.
+
+A rollup bucket is the study time of one user on one day. Writing a session or an achievement marks its
+bucket, and a marked bucket is recomputed from the sessions of that day only, together with its week.
+Inside a coalesce_rollups block the marks are collected and every bucket is recomputed once when the block ends.
+A bucket is read and replaced in one transaction that locks its user, so concurrent refreshes of a bucket take turns.
+The models whose deletes cascade to sessions or achievements delete inside a block, so a cascade recomputes every bucket once.
+'''
+
+from asgiref.sync import sync_to_async
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from django.db import models, transaction
+from django.forms import ValidationError
+from django.utils import timezone
+
+_pending = ContextVar('pending_rollups', default=None)
+
+
+def mark_day(user_id, day):
+    '''
+    Marks the rollup bucket of a user and day as changed
+    '''
+    _mark(buckets={(user_id, day)})
+
+
+def mark_sessions(session_ids):
+    '''
+    Marks the rollup buckets of study sessions by primary key, the sessions are looked up when the marks are written
+    '''
+    _mark(sessions=set(session_ids))
+
+
+@contextmanager
+def coalesce_rollups():
+    '''
+    Collects all marks made inside the block and recomputes each bucket once when the block ends.
+    Nested blocks are merged into the outermost one, except that a nested block ending inside a transaction writes
+    the marks collected so far, so the rollups commit together with the writes that marked them.
+    Nothing is written when the block raises.
+    '''
+    pending = _pending.get()
+    if pending is not None:
+        yield
+        if transaction.get_connection().in_atomic_block:
+            _flush(pending)
+        return
+
+    pending = {'buckets': set(), 'sessions': set()}
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    _write(pending['buckets'], pending['sessions'])
+
+
+@asynccontextmanager
+async def acoalesce_rollups():
+    '''
+    coalesce_rollups for async code, the buckets are recomputed from a thread when the block ends
+    '''
+    if _pending.get() is not None:
+        yield
+        return
+
+    pending = {'buckets': set(), 'sessions': set()}
+    token = _pending.set(pending)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    await sync_to_async(_write)(pending['buckets'], pending['sessions'])
+
+
+def _mark(buckets=(), sessions=()):
+    pending = _pending.get()
+    if pending is None:
+        _write(set(buckets), set(sessions))
+    else:
+        pending['buckets'].update(buckets)
+        pending['sessions'].update(sessions)
+
+
+def _flush(pending):
+    buckets, sessions = set(pending['buckets']), set(pending['sessions'])
+    pending['buckets'].clear()
+    pending['sessions'].clear()
+    _write(buckets, sessions)
+
+
+def _write(buckets, sessions):
+    from .models import StudySession
+
+    sessions.discard(None)
+    if sessions:
+        buckets.update((user_id, timezone.localdate(start_time))
+                       for user_id, start_time in StudySession.objects.filter(pk__in=sessions).values_list('user_id', 'start_time'))
+    days = {}
+    for user_id, day in buckets:
+        if user_id is not None and day is not None:
+            days.setdefault(user_id, set()).add(day)
+    for user_id, user_days in days.items():
+        refresh(user_id, user_days)
+
+
+def refresh(user_id, days):
+    '''
+    Recomputes the daily rollups of a user for days, and the weekly rollups of the weeks they fall in.
+    The time of a session is split evenly over the courses it has achievements in; sessions without achievements
+    are counted without a course.
+    '''
+    with transaction.atomic():
+        _refresh(user_id, set(days))
+
+
+def _refresh(user_id, days):
+    from django.contrib.auth.models import User
+    from .models import StudySession, Achievement, DailyStudyTime, WeeklyStudyTime
+
+    # Serializes the refreshes of a user's buckets on databases with row locks, SQLite locks at BEGIN already
+    list(User.objects.select_for_update().filter(pk=user_id).values_list('pk'))
+    sessions = list(StudySession.objects
+                    .filter(user_id=user_id, start_time__date__in=days)
+                    .values_list('pk', 'start_time', 'end_time', 'duration'))
+    courses = {}
+    for session_id, course_id in (Achievement.objects
+                                  .filter(study_session__in=[session[0] for session in sessions])
+                                  .values_list('study_session_id', 'progress_instance__course_metric__course_id')
+                                  .distinct()):
+        courses.setdefault(session_id, set()).add(course_id)
+
+    daily = {}
+    for session_id, start_time, end_time, duration in sessions:
+        spent = session_duration(start_time, end_time, duration)
+        session_courses = courses.get(session_id) or {None}
+        for course_id in session_courses:
+            row = daily.setdefault((timezone.localdate(start_time), course_id), DailyStudyTime(user_id=user_id, course_id=course_id, day=timezone.localdate(start_time)))
+            row.duration += spent / len(session_courses)
+            row.sessions += 1
+
+    weeks = {week_of(day) for day in days}
+    in_weeks = models.Q()
+    for week in weeks:
+        in_weeks |= models.Q(start_time__date__range=(week, week + timedelta(days=6)))
+    weekly = {week: WeeklyStudyTime(user_id=user_id, week=week) for week in weeks}
+    for start_time, end_time, duration in StudySession.objects.filter(in_weeks, user_id=user_id).values_list('start_time', 'end_time', 'duration'):
+        row = weekly[week_of(timezone.localdate(start_time))]
+        row.duration += session_duration(start_time, end_time, duration)
+        row.sessions += 1
+
+    DailyStudyTime.objects.filter(user_id=user_id, day__in=days).delete()
+    DailyStudyTime.objects.bulk_create(daily.values())
+    WeeklyStudyTime.objects.filter(user_id=user_id, week__in=weeks).delete()
+    WeeklyStudyTime.objects.bulk_create([row for row in weekly.values() if row.sessions])
+
+
+def rebuild():
+    '''
+    Recomputes all rollups from the study sessions, returns the number of refreshed buckets
+    '''
+    from .models import StudySession, DailyStudyTime, WeeklyStudyTime
+
+    DailyStudyTime.objects.all().delete()
+    WeeklyStudyTime.objects.all().delete()
+    days = {}
+    for user_id, start_time in StudySession.objects.values_list('user_id', 'start_time').iterator():
+        days.setdefault(user_id, set()).add(timezone.localdate(start_time))
+    for user_id, user_days in days.items():
+        refresh(user_id, user_days)
+    return sum(len(user_days) for user_days in days.values())
+
+
+def study_time(user, start, end, by='day', course_id=None):
+    '''
+    Returns the study time of user from start to end (inclusive dates) per day and course, or per week,
+    read from the rollups only. A week is included when its Monday falls in the range.
+    '''
+    from .models import DailyStudyTime, WeeklyStudyTime
+
+    if start > end:
+        raise ValidationError("The start date cannot be later than the end date")
+    if by == 'day':
+        rows = DailyStudyTime.objects.filter(user=user, day__range=(start, end))
+        if course_id is not None:
+            rows = rows.filter(course_id=course_id)
+        return [{'day': day, 'course': course, 'duration': duration, 'sessions': sessions}
+                for day, course, duration, sessions in rows.order_by('day', 'course_id').values_list('day', 'course_id', 'duration', 'sessions')]
+    if by == 'week':
+        if course_id is not None:
+            raise ValidationError("Weekly study time is not split per course")
+        rows = WeeklyStudyTime.objects.filter(user=user, week__range=(start, end)).order_by('week')
+        return [{'week': week, 'duration': duration, 'sessions': sessions}
+                for week, duration, sessions in rows.values_list('week', 'duration', 'sessions')]
+    raise ValidationError(f"Unknown grouping {by}, use day or week")
+
+
+def session_duration(start_time, end_time, duration):
+    '''
+    The time spent in a session: its duration, or the time between start and end when no duration is given
+    '''
+    if duration is not None:
+        return duration
+    if start_time and end_time:
+        return end_time - start_time
+    return timedelta(0)
+
+
+def week_of(day):
+    return day - timedelta(days=day.weekday())
@@ -0,0 +1,103 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from .models import CourseMetric
+
+
+def get_summary(course_id, date_modified):
+    '''
+    Returns the progress summary of a course, cached until the course is modified.
+    Progress writes touch the course, so its modified date is the version of the summary.
+    '''
+    return cache.get_or_set(_summary_key(course_id, date_modified), lambda: compute_summary(course_id))
+
+
+async def aget_summary(course_id, date_modified):
+    '''
+    get_summary for async views, only a cache miss computes the summary in a thread
+    '''
+    key = _summary_key(course_id, date_modified)
+    summary = await cache.aget(key)
+    if summary is None:
+        summary = await sync_to_async(compute_summary)(course_id)
+        await cache.aset(key, summary)
+    return summary
+
+
+def _summary_key(course_id, date_modified):
+    return f"course-summary:{course_id}:{date_modified.timestamp()}"
+
+
+def compute_summary(course_id):
+    '''
+    Computes the percentage done per metric and per achievement level from the stored totals.
+    Levels are weighted by their weight, so the percentage of a metric (and of the course)
+    is the share of the weighted work that is done.
+    '''
+    metrics = []
+    course_done = course_work = 0
+    for course_metric in CourseMetric.objects.filter(course_id=course_id).prefetch_related('achievement_levels').order_by('name'):
+        levels = []
+        done = work = 0
+        for level in sorted(course_metric.achievement_levels.all(), key=lambda level: level.achievement_level):
+            levels.append({
+                'id': level.pk,
+                'name': level.achievement_level,
+                'weight': level.weight,
+                'total': level.total,
+                'percent_done': _percent(level.total, course_metric.total),
+            })
+            done += level.weight * level.total
+            work += level.weight * course_metric.total
+        metrics.append({
+            'id': course_metric.pk,
+            'name': course_metric.name,
+            'metric_type': course_metric.metric_type,
+            'total': course_metric.total,
+            'percent_done': _percent(done, work),
+            'levels': levels,
+        })
+        course_done += done
+        course_work += work
+    return {'course': course_id, 'percent_done': _percent(course_done, course_work), 'metrics': metrics}
+
+
+def summary_delta(previous, summary):
+    '''
+    Returns what changed from the summary previous to summary, or None when nothing changed.
+    Changed metrics and levels are listed with their id and changed fields only, new ones in full and removed ones
+    by id under removed. The delta from no previous summary is the whole summary.
+    '''
+    if previous is None:
+        return summary
+    metrics, removed = _changed(previous['metrics'], summary['metrics'], nested='levels')
+    if not metrics and not removed and previous['percent_done'] == summary['percent_done']:
+        return None
+    delta = {'course': summary['course'], 'percent_done': summary['percent_done'], 'metrics': metrics}
+    if removed:
+        delta['removed'] = removed
+    return delta
+
+
+def _changed(previous, entries, nested=None):
+    before = {entry['id']: entry for entry in previous}
+    changed = []
+    for entry in entries:
+        old = before.get(entry['id'])
+        if old is None:
+            changed.append(entry)
+            continue
+        fields = {key: value for key, value in entry.items() if key != nested and old[key] != value}
+        if nested:
+            children, removed = _changed(old[nested], entry[nested])
+            if children:
+                fields[nested] = children
+            if removed:
+                fields['removed'] = removed
+        if fields:
+            changed.append({'id': entry['id'], **fields})
+    ids = {entry['id'] for entry in entries}
+    return changed, [pk for pk in before if pk not in ids]
+
+
+def _percent(part, whole):
+    return round(float(part) * 100 / float(whole), 2) if whole else 0.0
@@ -0,0 +1,84 @@
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.forms import ValidationError
+from django.test import TestCase
+from django.urls import reverse
+from datetime import timedelta
+from course.progress.models import CourseMetric, AchievementMetric, InstanceMetric, Achievement, StudySession
+from course.models.models import Course, Chapter
+from course.service import record_achievements
+
+
+class RecordAchievementsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = Course.objects.create(user=self.user, name='Test Course')
+        self.course_metric = CourseMetric.objects.create(course=self.course, name='Pages', metric_type='number')
+        self.done = AchievementMetric.objects.create(course_metric=self.course_metric, achievement_level='Done', weight=1, time_estimate=timedelta(minutes=1))
+        self.summarized = AchievementMetric.objects.create(course_metric=self.course_metric, achievement_level='Summarized', weight=3)
+        self.session = StudySession.objects.create(user=self.user)
+        self.instances = []
+        for i in range(30):
+            chapter = Chapter.objects.create(course=self.course, name=f'Chapter {i}')
+            self.instances.append(InstanceMetric.objects.create(content_type=ContentType.objects.get_for_model(chapter), object_id=chapter.id, course_metric=self.course_metric, value=10))
+
+    def get_records(self, value=5):
+        return [{'progress_instance': instance.pk, 'achievement_metric': level.pk, 'study_session': self.session.pk, 'value': value}
+                for instance in self.instances for level in (self.done, self.summarized)]
+
+    def test_record_in_constant_queries(self):
+        # Savepoint, four lookups, the insert, the totals update, the release, the course modified date,
+        # the session lookup and the refresh of its study time rollup bucket, which locks the user first
+        with self.assertNumQueries(9 + 11):
+            achievements = record_achievements(self.user, self.get_records())
+
+        self.assertEqual(len(achievements), 60)
+        self.assertEqual(Achievement.objects.count(), 60)
+        self.assertEqual(self.done.get_total(), 150)
+        self.assertEqual(self.summarized.get_total(), 150)
+
+    def test_metric_type_validated(self):
+        done = AchievementMetric.objects.create(course_metric=CourseMetric.objects.create(course=self.course, name='Exercise', metric_type='boolean'), achievement_level='Done')
+        instance = InstanceMetric.objects.create(content_type=self.instances[0].content_type, object_id=self.instances[0].object_id, course_metric=done.course_metric, value=1)
+        records = [{'progress_instance': self.instances[0].pk, 'achievement_metric': self.done.pk, 'value': 2},
+                   {'progress_instance': instance.pk, 'achievement_metric': done.pk, 'value': 2}]
+
+        with self.assertRaises(ValidationError) as context:
+            record_achievements(self.user, records)
+        self.assertEqual(context.exception.message_dict, {1: ['Invalid boolean value']})
+
+    def test_capacity_exceeded(self):
+        Achievement.objects.create(progress_instance=self.instances[0], achievement_metric=self.done, value=1)
+        with self.assertRaises(ValidationError) as context:
+            record_achievements(self.user, self.get_records())
+
+        self.assertEqual(set(context.exception.message_dict), {0, 1})
+        self.assertEqual(Achievement.objects.count(), 1)
+        self.assertEqual(self.done.get_total(), 1)
+
+    def test_save_recorded(self):
+        achievement, = record_achievements(self.user, self.get_records(value=3)[:1])
+        achievement.value = 4
+        achievement.save()
+
+        self.assertEqual(self.done.get_total(), 4)
+        self.assertEqual(self.done.compute_total(), 4)
+
+    def test_already_recorded(self):
+        record_achievements(self.user, self.get_records(value=1)[:1])
+        with self.assertRaises(ValidationError):
+            record_achievements(self.user, self.get_records(value=1)[:1])
+
+    def test_other_user(self):
+        other_user = User.objects.create_user(username='testuser2', password='testpassword')
+        with self.assertRaises(ValidationError):
+            record_achievements(other_user, self.get_records(value=1)[:1])
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('bulk-achievements'), {'achievements': self.get_records(value=2)}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['achievements']), 60)
+
+        response = self.client.post(reverse('bulk-achievements'), {'achievements': self.get_records(value=20)}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,40 @@
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase
+from course.progress.fields import fixed
+from course.progress.models import CourseMetric, InstanceMetric
+from course.models.models import Course, Chapter
+
+
+class FixedPointFieldTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(user=User.objects.create_user(username='testuser', password='testpassword'), name='Test Course')
+        self.course_metric = CourseMetric.objects.create(course=self.course, name='Percent', metric_type='percentage')
+
+    def create(self, value):
+        chapter = Chapter.objects.create(course=self.course, name='Test Chapter')
+        return InstanceMetric.objects.create(content_type=ContentType.objects.get_for_model(chapter), object_id=chapter.id,
+                                             course_metric=self.course_metric, value=value)
+
+    def test_stored_as_hundredths(self):
+        instance = self.create(Decimal('12.34'))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT value FROM course_instancemetric WHERE id = %s', [instance.pk])
+            self.assertEqual(cursor.fetchone()[0], 1234)
+        self.assertEqual(InstanceMetric.objects.get(pk=instance.pk).value, Decimal('12.34'))
+        self.assertEqual(InstanceMetric.objects.values_list(fixed('value'), flat=True).get(pk=instance.pk), 1234)
+        self.assertEqual(InstanceMetric.objects.values_list(fixed(F('value') - F('value') / 2), flat=True).get(pk=instance.pk), 617)
+
+    def test_rounds_to_hundredths(self):
+        self.assertEqual(InstanceMetric.objects.get(pk=self.create(Decimal('0.125')).pk).value, Decimal('0.13'))
+
+    def test_filter_and_total(self):
+        self.create(Decimal('0.5'))
+        self.create(Decimal('1.25'))
+        self.assertEqual(InstanceMetric.objects.filter(value__gt=Decimal('0.75')).count(), 1)
+        self.assertEqual(self.course_metric.get_total(), Decimal('1.75'))
+        self.assertEqual(self.course_metric.compute_total(), Decimal('1.75'))
+
@@ -0,0 +1,91 @@
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from datetime import timedelta
+from course.progress.models import CourseMetric, AchievementMetric, InstanceMetric, Achievement
+from course.progress.forecast import get_forecast
+from course.models.models import Course, Chapter
+
+
+class ForecastTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        ContentType.objects.get_for_model(Chapter)
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = Course.objects.create(user=self.user, name='Test Course')
+        self.other_course = Course.objects.create(user=self.user, name='Other Course')
+        pages = CourseMetric.objects.create(course=self.course, name='Pages', metric_type='number')
+        self.read = AchievementMetric.objects.create(course_metric=pages, achievement_level='Read', weight=1, time_estimate=timedelta(minutes=2))
+        self.summarized = AchievementMetric.objects.create(course_metric=pages, achievement_level='Summarized', weight=3, time_estimate=timedelta(minutes=5))
+        AchievementMetric.objects.create(course_metric=pages, achievement_level='Memorized', weight=1)
+        self.chapters = [Chapter.objects.create(course=self.course, name=f'Chapter {i}') for i in range(3)]
+        self.instances = [InstanceMetric.objects.create(content_type=ContentType.objects.get_for_model(chapter), object_id=chapter.id, course_metric=pages, value=10)
+                          for chapter in self.chapters]
+        Achievement.objects.create(progress_instance=self.instances[0], achievement_metric=self.read, value=4)
+        Achievement.objects.create(progress_instance=self.instances[0], achievement_metric=self.summarized, value=2)
+
+    def get_course(self, forecast, course):
+        return next(item for item in forecast['courses'] if item['id'] == course.pk)
+
+    def test_forecast(self):
+        forecast = get_forecast(self.user)
+        course = self.get_course(forecast, self.course)
+
+        # Chapter 0: 6 pages left to read and 8 to summarize, the others 10 of each
+        self.assertEqual(course['chapters'], [
+            {'id': self.chapters[0].pk, 'remaining': 6 * 120 + 8 * 300},
+            {'id': self.chapters[1].pk, 'remaining': 10 * 120 + 10 * 300},
+            {'id': self.chapters[2].pk, 'remaining': 10 * 120 + 10 * 300},
+        ])
+        self.assertEqual(course['remaining'], 3120 + 2 * 4200)
+        self.assertEqual(self.get_course(forecast, self.other_course), {'id': self.other_course.pk, 'remaining': 0, 'chapters': []})
+        self.assertEqual(forecast['remaining'], 3120 + 2 * 4200)
+
+    def test_time_metric(self):
+        # The units of a time metric are seconds, what is left of them is the remaining time whatever the estimate
+        lectures = CourseMetric.objects.create(course=self.other_course, name='Lectures', metric_type='time')
+        watched = AchievementMetric.objects.create(course_metric=lectures, achievement_level='Watched', weight=1, time_estimate=timedelta(minutes=2))
+        AchievementMetric.objects.create(course_metric=lectures, achievement_level='Reviewed', weight=1)
+        chapter = Chapter.objects.create(course=self.other_course, name='Lecture 1')
+        instance = InstanceMetric.objects.create(content_type=ContentType.objects.get_for_model(chapter), object_id=chapter.id, course_metric=lectures, value=3600)
+        Achievement.objects.create(progress_instance=instance, achievement_metric=watched, value=600)
+
+        course = self.get_course(get_forecast(self.user), self.other_course)
+        self.assertEqual(course['chapters'], [{'id': chapter.pk, 'remaining': 3000 + 3600}])
+        self.assertEqual(course['remaining'], 3000 + 3600)
+
+    def test_cached_until_course_modified(self):
+        get_forecast(self.user)
+        with self.assertNumQueries(1):
+            get_forecast(self.user)
+
+        Achievement.objects.create(progress_instance=self.instances[1], achievement_metric=self.read, value=10)
+        forecast = get_forecast(self.user)
+        self.assertEqual(self.get_course(forecast, self.course)['chapters'][1]['remaining'], 10 * 300)
+
+        self.read.time_estimate = timedelta(minutes=1)
+        self.read.save()
+        forecast = get_forecast(self.user)
+        self.assertEqual(self.get_course(forecast, self.course)['chapters'][0]['remaining'], 6 * 60 + 8 * 300)
+
+    def test_recompute_in_one_query(self):
+        for i in range(20):
+            course = Course.objects.create(user=self.user, name=f'Course {i}')
+            metric = CourseMetric.objects.create(course=course, name='Pages', metric_type='number')
+            AchievementMetric.objects.create(course_metric=metric, achievement_level='Read', weight=1, time_estimate=timedelta(minutes=1))
+            for j in range(5):
+                chapter = Chapter.objects.create(course=course, name=f'Chapter {j}')
+                InstanceMetric.objects.create(content_type=ContentType.objects.get_for_model(chapter), object_id=chapter.id, course_metric=metric, value=j)
+
+        with self.assertNumQueries(2):
+            forecast = get_forecast(self.user)
+        self.assertEqual(len(forecast['courses']), 22)
+        self.assertEqual(forecast['remaining'], 3120 + 2 * 4200 + 20 * 10 * 60)
+
+    def test_endpoint(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('forecast'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['remaining'], 3120 + 2 * 4200)
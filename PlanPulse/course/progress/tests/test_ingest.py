@@ -0,0 +1,122 @@
+import json
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+from django.urls import reverse
+from datetime import datetime, timedelta, timezone
+from course.progress.models import CourseMetric, AchievementMetric, InstanceMetric, Achievement, StudySession
+from course.models.models import Course, Chapter
+from course.ingest import ingest_sessions
+
+
+class IngestSessionsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = Course.objects.create(user=self.user, name='Test Course')
+        self.course_metric = CourseMetric.objects.create(course=self.course, name='Pages', metric_type='number')
+        self.done = AchievementMetric.objects.create(course_metric=self.course_metric, achievement_level='Done', weight=1)
+        chapter = Chapter.objects.create(course=self.course, name='Chapter 1')
+        self.instance = InstanceMetric.objects.create(content_type=ContentType.objects.get_for_model(chapter), object_id=chapter.id, course_metric=self.course_metric, value=100)
+
+    def get_line(self, hour=10, value=1, **fields):
+        line = {
+            'start_time': f'2024-03-01T{hour:02}:00:00Z',
+            'end_time': f'2024-03-01T{hour:02}:50:00Z',
+            'duration': '00:45:00',
+            'achievements': [{'progress_instance': self.instance.pk, 'achievement_metric': self.done.pk, 'value': value}],
+        }
+        line.update(fields)
+        return json.dumps(line).encode()
+
+    def test_ingest(self):
+        results = list(ingest_sessions(self.user, [self.get_line(hour) for hour in range(10)]))
+
+        self.assertEqual([result['line'] for result in results], list(range(1, 11)))
+        self.assertEqual(StudySession.objects.filter(user=self.user).count(), 10)
+        self.assertEqual(Achievement.objects.count(), 10)
+        self.assertEqual(self.done.get_total(), 10)
+        session = StudySession.objects.get(pk=results[3]['study_session'])
+        self.assertEqual(session.start_time, datetime(2024, 3, 1, 3, tzinfo=timezone.utc))
+        self.assertEqual(session.duration, timedelta(minutes=45))
+        self.assertEqual(Achievement.objects.get(pk=results[3]['achievements'][0]).study_session, session)
+
+    def test_errors_per_line(self):
+        lines = [
+            self.get_line(),
+            b'not json',
+            self.get_line(end_time='2024-03-01T09:00:00Z'),
+            self.get_line(start_time=None),
+            self.get_line(value=-1),
+            b'',
+            self.get_line(achievements=[{'progress_instance': self.instance.pk, 'achievement_metric': self.done.pk}] * 2),
+            self.get_line(value=200),
+            self.get_line(hour=11),
+        ]
+        results = list(ingest_sessions(self.user, lines))
+
+        self.assertEqual([result['line'] for result in results], [1, 2, 3, 4, 5, 7, 8, 9])
+        self.assertEqual([result['line'] for result in results if 'errors' in result], [2, 3, 4, 5, 7, 8])
+        self.assertEqual(results[2]['errors'], ["The end time cannot be earlier than the start time"])
+        self.assertEqual(results[6]['errors'], ["The sum of the achievement values cannot exceed the progress instance value"])
+        self.assertEqual(StudySession.objects.count(), 2)
+        self.assertEqual(self.done.get_total(), 2)
+
+    def test_queries_per_batch(self):
+        lines = [self.get_line(hour % 24) for hour in range(50)]
+        # Per batch: savepoint, three lookups, the sessions, the achievements, the totals, the release, the course modified date,
+        # the session lookup and the refresh of the study time rollups, which locks the user first
+        with self.assertNumQueries(2 * (9 + 11)):
+            results = list(ingest_sessions(self.user, lines, batch_size=25))
+
+        self.assertEqual(len(results), 50)
+        self.assertEqual(self.done.get_total(), 50)
+
+    def test_view(self):
+        self.client.login(username='testuser', password='testpassword')
+        body = b'\n'.join([self.get_line(), b'{}', self.get_line(hour=12)]) + b'\n'
+        response = self.client.post(reverse('ingest-sessions'), body, content_type='application/x-ndjson')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        results = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([result['line'] for result in results], [1, 2, 3])
+        self.assertEqual(results[1]['errors'], ["A study session needs a start time"])
+        self.assertEqual(StudySession.objects.count(), 2)
+
+    def test_values_out_of_range(self):
+        lines = [b'{"start_time": "2024-03-01T10:00:00Z", "end_time": "2024-03-01T11:00:00Z", "achievements": [{"progress_instance": %d, "achievement_metric": %d, "value": NaN}]}'
+                 % (self.instance.pk, self.done.pk)]
+        lines += [self.get_line(hour, value=value) for hour, value in enumerate(['NaN', 'Infinity', 1e8, '1e30'])]
+        lines += [self.get_line(duration=1e300), self.get_line(duration=float('nan')), self.get_line(hour=5, value=99)]
+        results = list(ingest_sessions(self.user, lines))
+
+        # NaN is valid JSON, as a literal or a string
+        self.assertEqual(results[0]['errors'], ["Invalid value nan"])
+        self.assertEqual([result['errors'][0] for result in results[1:5]], ["Invalid value NaN", "Invalid value Infinity", "Invalid value 100000000.0", "Invalid value 1e30"])
+        self.assertEqual([result['line'] for result in results if 'errors' in result], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(self.done.get_total(), 99)
+
+    def test_start_time_set_on_save(self):
+        # A session with only a duration is valid, it starts when it is saved
+        session = StudySession(user=self.user, duration=timedelta(minutes=30))
+        session.full_clean()
+        session.save()
+        self.assertIsNotNone(session.start_time)
+
+        start_time = datetime(2024, 3, 1, 10, tzinfo=timezone.utc)
+        session = StudySession.objects.create(user=self.user, start_time=start_time, end_time=start_time + timedelta(hours=1))
+        self.assertEqual(StudySession.objects.get(pk=session.pk).start_time, start_time)
+
+    async def test_view_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        body = b'\n'.join([self.get_line(), self.get_line(hour=12)])
+        response = await self.async_client.post(reverse('ingest-sessions'), body, content_type='application/x-ndjson')
+
+        self.assertTrue(response.is_async)
+        results = [json.loads(line) async for line in response.streaming_content]
+        self.assertEqual([result['line'] for result in results], [1, 2])
+        self.assertEqual(await StudySession.objects.acount(), 2)
+
+    def test_view_requires_login(self):
+        response = self.client.post(reverse('ingest-sessions'), self.get_line(), content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 403)
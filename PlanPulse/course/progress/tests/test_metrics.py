@@ -4,7 +4,9 @@ from django.forms import ValidationError
 from datetime import timedelta
 from decimal import Decimal
 
-from course.progress.metric import Number, Boolean, Time, Percentage
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from course.progress.metric import Number, Boolean, Time, Percentage, Metric, MetricTypes, metric_types
 
 class NumberTest(unittest.TestCase):
     def setUp(self):
@@ -67,6 +69,10 @@ class TestBoolean(unittest.TestCase):
         with self.assertRaises(ValidationError):
             boolean.sum([Decimal(1.00), Decimal(0.00), Decimal(1.00)])
 
+    def test_boolean_from_sum(self):
+        with self.assertRaises(ValidationError):
+            self.boolean.from_sum(Decimal(2.00))
+
 
 class TestTime(unittest.TestCase):
     def setUp(self):
@@ -184,6 +190,11 @@ class TestTime(unittest.TestCase):
         self.assertEqual(self.time.sum([Decimal(10), timedelta(seconds=20), Decimal(30)]), Decimal(60))
         self.assertEqual(self.time.sum([timedelta(seconds=10), Decimal(20)]), Decimal(30))
 
+    def test_time_from_sum(self):
+        self.assertEqual(self.time.from_sum(Decimal('90.75')), Decimal(90))
+        with self.assertRaises(ValidationError):
+            self.time.from_sum(Decimal(-1))
+
 
 class TestPercentage(unittest.TestCase):
     def setUp(self):
@@ -240,4 +251,63 @@ class TestPercentage(unittest.TestCase):
         self.assertEqual(result, Decimal(61.5))
 
         with self.assertRaises(ValidationError):
-            self.percentage.sum([Decimal(10.5), Decimal(20.5), Decimal(30.5), Decimal(99)])
\ No newline at end of file
+            self.percentage.sum([Decimal(10.5), Decimal(20.5), Decimal(30.5), Decimal(99)])
+
+
+class BatchTest(unittest.TestCase):
+    def test_validate_many(self):
+        values = [Decimal('1.00'), Decimal('-1.00'), Decimal('0.00'), Decimal('100.50'), Decimal('1.00')]
+        self.assertEqual(Number().validate_many(values), {1: 'Invalid number value'})
+        self.assertEqual(Time().validate_many(values), {1: 'Invalid time value: negative'})
+        self.assertEqual(Boolean().validate_many(values), {1: 'Invalid boolean value', 3: 'Invalid boolean value'})
+        self.assertEqual(Percentage().validate_many(values), {1: 'Invalid percentage value', 3: 'Invalid percentage value'})
+        self.assertEqual(Number().validate_many([]), {})
+
+    def test_sum_many(self):
+        values = [Decimal('0.10')] * 1000
+        self.assertEqual(Number().sum_many(values), Decimal('100.00'))
+        self.assertEqual(Time().sum_many([Decimal('90.75'), Decimal('30')]), Decimal(120))
+        with self.assertRaises(ValidationError):
+            Number().sum_many(values + [Decimal(-1)])
+        with self.assertRaises(ValidationError):
+            Boolean().sum_many([Decimal(1)])
+
+    def test_to_display_many(self):
+        values = [Decimal('0.00'), Decimal('1.00'), Decimal('90.75')]
+        self.assertEqual(Number().to_display_many(values), [Number().get(value) for value in values])
+        self.assertEqual(Time().to_display_many(values), [Time().get(value) for value in values])
+        self.assertEqual(Percentage().to_display_many(values), values)
+        self.assertEqual(Boolean().to_display_many(values[:2]), [False, True])
+        with self.assertRaises(ValidationError):
+            Boolean().to_display_many(values)
+
+
+class Custom(Number):
+    label = 'Custom'
+
+
+class MetricTypesTest(SimpleTestCase):
+    def test_shared_instances(self):
+        self.assertIs(metric_types.get('number'), metric_types.get('number'))
+        self.assertIsInstance(metric_types.get('percentage'), Percentage)
+        self.assertIs(type(metric_types.get('unknown')), Metric)
+        self.assertEqual(metric_types.choices()[:4], [('number', 'Number'), ('time', 'Time'), ('boolean', 'Boolean'), ('percentage', 'Percentage')])
+
+    @override_settings(METRIC_TYPES={'custom': 'course.progress.tests.test_metrics.Custom'})
+    def test_settings(self):
+        types = MetricTypes()
+        self.assertIsInstance(types.get('custom'), Custom)
+        self.assertIn(('custom', 'Custom'), types.choices())
+
+    def test_name_length(self):
+        with self.assertRaises(ImproperlyConfigured):
+            MetricTypes().register('x' * 21, Custom)
+
+
+class TimeArithmeticTest(unittest.TestCase):
+    def test_time_add_whole_seconds(self):
+        time = metric_types.get('time')
+        self.assertEqual(time.add(Decimal('60.9'), Decimal(30)), Decimal(90))
+        self.assertEqual(time.subtract(Decimal('60.9'), Decimal('60.1')), Decimal(0))
+        with self.assertRaises(ValidationError):
+            time.subtract(Decimal(30), Decimal(60))
@@ -22,10 +22,15 @@ class CourseMetricsTest(TestCase):
         # Arrange
         number_metric = CourseMetric.objects.create(course=self.course, name='number', metric_type='number')
         time_metric = CourseMetric.objects.create(course=self.course, name='time', metric_type='time')
+        boolean_metric = CourseMetric.objects.create(course=self.course, name='boolean', metric_type='boolean')
+        percentage_metric = CourseMetric.objects.create(course=self.course, name='percentage', metric_type='percentage')
 
         # Act & Assert
         self.assertIsInstance(number_metric.getMetric(), Number)
         self.assertIsInstance(time_metric.getMetric(), Time)
+        self.assertIsInstance(boolean_metric.getMetric(), Boolean)
+        self.assertIsInstance(percentage_metric.getMetric(), Percentage)
+        self.assertIs(number_metric.getMetric(), CourseMetric.objects.get(pk=number_metric.pk).getMetric())
 
 
 class AchievementMetricTest(TestCase):
@@ -0,0 +1,148 @@
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from datetime import date, datetime, timedelta, timezone
+from course.progress.models import CourseMetric, AchievementMetric, InstanceMetric, Achievement, StudySession, DailyStudyTime, WeeklyStudyTime
+from course.progress.rollups import coalesce_rollups, rebuild, study_time
+from course.models.models import Course, Chapter
+
+
+class StudyTimeRollupTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.courses = []
+        self.instances = []
+        self.levels = []
+        for name in ('Course A', 'Course B'):
+            course = Course.objects.create(user=self.user, name=name)
+            course_metric = CourseMetric.objects.create(course=course, name='Pages', metric_type='number')
+            chapter = Chapter.objects.create(course=course, name='Chapter 1')
+            self.courses.append(course)
+            self.levels.append(AchievementMetric.objects.create(course_metric=course_metric, achievement_level='Done', weight=1))
+            self.instances.append(InstanceMetric.objects.create(content_type=ContentType.objects.get_for_model(chapter), object_id=chapter.id, course_metric=course_metric, value=100))
+
+    def create_session(self, day, hours=1):
+        start_time = datetime(2024, 3, day, 10, tzinfo=timezone.utc)
+        return StudySession.objects.create(user=self.user, start_time=start_time, end_time=start_time + timedelta(hours=hours))
+
+    def achieve(self, session, index):
+        return Achievement.objects.create(progress_instance=self.instances[index], achievement_metric=self.levels[index], study_session=session, value=1)
+
+    def get_daily(self):
+        return {(row.day.day, row.course_id): (row.duration, row.sessions) for row in DailyStudyTime.objects.all()}
+
+    def test_session_without_achievements(self):
+        self.create_session(4)
+        self.create_session(4, hours=2)
+
+        self.assertEqual(self.get_daily(), {(4, None): (timedelta(hours=3), 2)})
+        week = WeeklyStudyTime.objects.get()
+        self.assertEqual((week.week, week.duration, week.sessions), (date(2024, 3, 4), timedelta(hours=3), 2))
+
+    def test_split_over_courses(self):
+        session = self.create_session(5, hours=2)
+        self.achieve(session, 0)
+        self.achieve(session, 1)
+
+        self.assertEqual(self.get_daily(), {
+            (5, self.courses[0].pk): (timedelta(hours=1), 1),
+            (5, self.courses[1].pk): (timedelta(hours=1), 1),
+        })
+
+    def test_move_and_delete(self):
+        session = self.create_session(5)
+        achievement = self.achieve(session, 0)
+        session.start_time = datetime(2024, 3, 12, 10, tzinfo=timezone.utc)
+        session.end_time = session.start_time + timedelta(hours=1)
+        session.save()
+
+        self.assertEqual(self.get_daily(), {(12, self.courses[0].pk): (timedelta(hours=1), 1)})
+        self.assertEqual(list(WeeklyStudyTime.objects.values_list('week', flat=True)), [date(2024, 3, 11)])
+
+        achievement.delete()
+        self.assertEqual(self.get_daily(), {(12, None): (timedelta(hours=1), 1)})
+
+        session.delete()
+        self.assertFalse(DailyStudyTime.objects.exists())
+        self.assertFalse(WeeklyStudyTime.objects.exists())
+
+    def test_course_deleted(self):
+        session = self.create_session(5)
+        self.achieve(session, 0)
+        self.courses[0].delete()
+
+        self.assertEqual(self.get_daily(), {(5, None): (timedelta(hours=1), 1)})
+
+    def test_coalesce(self):
+        with coalesce_rollups():
+            sessions = [self.create_session(6) for i in range(5)]
+            for session in sessions:
+                self.achieve(session, 0)
+            self.assertFalse(DailyStudyTime.objects.exists())
+
+        self.assertEqual(self.get_daily(), {(6, self.courses[0].pk): (timedelta(hours=5), 5)})
+
+    def test_coalesce_in_transaction(self):
+        # A nested block ending inside a transaction writes its rollups in that transaction, not after the outer block
+        with coalesce_rollups():
+            with transaction.atomic(), coalesce_rollups():
+                self.achieve(self.create_session(6), 0)
+                self.achieve(self.create_session(6), 1)
+            self.assertEqual(self.get_daily(), {
+                (6, self.courses[0].pk): (timedelta(hours=1), 1),
+                (6, self.courses[1].pk): (timedelta(hours=1), 1),
+            })
+            with self.assertRaises(ValueError), transaction.atomic(), coalesce_rollups():
+                self.create_session(7)
+                raise ValueError
+
+        self.assertEqual(self.get_daily(), {
+            (6, self.courses[0].pk): (timedelta(hours=1), 1),
+            (6, self.courses[1].pk): (timedelta(hours=1), 1),
+        })
+
+    def test_cascade_refreshes_once(self):
+        # Outside a block a cascade delete still recomputes each bucket once, not once per achievement
+        for day in (6, 6, 6, 7):
+            self.achieve(self.create_session(day), 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.courses[0].delete()
+        self.assertEqual(len([query for query in queries if 'FROM "auth_user"' in query['sql']]), 1)
+        self.assertEqual(self.get_daily(), {(6, None): (timedelta(hours=3), 3), (7, None): (timedelta(hours=1), 1)})
+
+    def test_rebuild(self):
+        for day in range(1, 20, 3):
+            self.achieve(self.create_session(day), day % 2)
+        expected = self.get_daily()
+        DailyStudyTime.objects.all().delete()
+        WeeklyStudyTime.objects.all().delete()
+
+        self.assertEqual(rebuild(), 7)
+        self.assertEqual(self.get_daily(), expected)
+        self.assertEqual(WeeklyStudyTime.objects.count(), 4)
+
+    def test_range_queries(self):
+        for day in range(1, 20):
+            self.achieve(self.create_session(day), 0)
+
+        with self.assertNumQueries(1):
+            rows = study_time(self.user, date(2024, 3, 4), date(2024, 3, 10), course_id=self.courses[0].pk)
+        self.assertEqual([row['day'].day for row in rows], list(range(4, 11)))
+        weeks = study_time(self.user, date(2024, 3, 1), date(2024, 3, 31), by='week')
+        self.assertEqual([(row['week'].day, row['sessions']) for row in weeks], [(4, 7), (11, 7), (18, 2)])
+
+    def test_endpoint(self):
+        self.create_session(4)
+        self.client.login(username='testuser', password='testpassword')
+
+        response = self.client.get(reverse('study-time'), {'start': '2024-03-01', 'end': '2024-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{'day': '2024-03-04', 'course': None, 'duration': 3600.0, 'sessions': 1}])
+
+        response = self.client.get(reverse('study-time'), {'start': '2024-03-31', 'end': '2024-03-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('study-time'), {'by': 'month'})
+        self.assertEqual(response.status_code, 400)
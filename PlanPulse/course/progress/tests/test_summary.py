@@ -0,0 +1,92 @@
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from course.progress.models import CourseMetric, AchievementMetric, InstanceMetric, Achievement
+from course.progress.summary import compute_summary, summary_delta
+from course.models.models import Course, Chapter
+
+
+class CourseSummaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = Course.objects.create(user=self.user, name='Test Course')
+        self.pages = CourseMetric.objects.create(course=self.course, name='Pages', metric_type='number')
+        self.done = AchievementMetric.objects.create(course_metric=self.pages, achievement_level='Done', weight=1)
+        self.summarized = AchievementMetric.objects.create(course_metric=self.pages, achievement_level='Summarized', weight=3)
+        content_type = ContentType.objects.get_for_model(Chapter)
+        self.instances = []
+        for i in range(2):
+            chapter = Chapter.objects.create(course=self.course, name=f'Chapter {i}')
+            self.instances.append(InstanceMetric.objects.create(content_type=content_type, object_id=chapter.id, course_metric=self.pages, value=10))
+        Achievement.objects.create(progress_instance=self.instances[0], achievement_metric=self.done, value=10)
+        Achievement.objects.create(progress_instance=self.instances[1], achievement_metric=self.summarized, value=5)
+        self.url = reverse('course-summary', args=[self.course.pk])
+
+    def test_compute_summary(self):
+        summary = compute_summary(self.course.pk)
+        metric = summary['metrics'][0]
+        self.assertEqual([level['percent_done'] for level in metric['levels']], [50.0, 25.0])
+        # (1 * 10 + 3 * 5) / (1 * 20 + 3 * 20)
+        self.assertEqual(metric['percent_done'], 31.25)
+        self.assertEqual(summary['percent_done'], 31.25)
+
+    def test_summary_delta(self):
+        previous = compute_summary(self.course.pk)
+        self.assertIs(summary_delta(None, previous), previous)
+        self.assertIsNone(summary_delta(previous, compute_summary(self.course.pk)))
+
+        Achievement.objects.create(progress_instance=self.instances[1], achievement_metric=self.done, value=5)
+        summary = compute_summary(self.course.pk)
+        delta = summary_delta(previous, summary)
+        # Only the Done level changed, its metric and course percentages with it
+        self.assertEqual(delta, {'course': self.course.pk, 'percent_done': summary['percent_done'], 'metrics': [{
+            'id': self.pages.pk, 'percent_done': summary['metrics'][0]['percent_done'],
+            'levels': [{'id': self.done.pk, 'total': 15, 'percent_done': 75.0}],
+        }]})
+
+        summarized_id = self.summarized.pk
+        self.summarized.delete()
+        minutes = CourseMetric.objects.create(course=self.course, name='Minutes', metric_type='number')
+        delta = summary_delta(summary, compute_summary(self.course.pk))
+        self.assertEqual(delta['metrics'][0]['id'], minutes.pk)
+        self.assertEqual(delta['metrics'][0]['levels'], [])
+        self.assertEqual(delta['metrics'][1]['removed'], [summarized_id])
+
+    def test_not_modified(self):
+        self.client.force_login(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['percent_done'], 31.25)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in queries if 'metric' in query['sql'] or 'achievement' in query['sql']])
+
+    def test_progress_changes_etag(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(self.url)['ETag']
+
+        Achievement.objects.create(progress_instance=self.instances[1], achievement_metric=self.done, value=5)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['metrics'][0]['levels'][0]['percent_done'], 75.0)
+
+    def test_metric_deleted(self):
+        self.client.force_login(self.user)
+        etag = self.client.get(self.url)['ETag']
+
+        self.pages.delete()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['metrics'], [])
+
+    def test_other_user(self):
+        self.client.force_login(User.objects.create_user(username='testuser2', password='testpassword'))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
@@ -0,0 +1,135 @@
+from io import StringIO
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from datetime import timedelta
+from course.progress.models import CourseMetric, AchievementMetric, InstanceMetric, Achievement
+from course.models.models import Course, Chapter
+
+
+class MetricTotalsTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(user=User.objects.create_user(username='testuser', password='testpassword'), name='Test Course')
+        self.chapter = Chapter.objects.create(course=self.course, name='Test Chapter')
+        self.course_metric = CourseMetric.objects.create(course=self.course, name='Pages', metric_type='number')
+        self.achievement_metric = AchievementMetric.objects.create(course_metric=self.course_metric, achievement_level='Done', weight=1, time_estimate=timedelta(minutes=1))
+        self.progress_instance = InstanceMetric.objects.create(content_type=ContentType.objects.get_for_model(self.chapter), object_id=self.chapter.id, course_metric=self.course_metric, value=10)
+        self.achievement = Achievement.objects.create(progress_instance=self.progress_instance, achievement_metric=self.achievement_metric, value=4)
+
+    def test_get_total_is_a_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.course_metric.get_total(), 10)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.achievement_metric.get_total(), 4)
+
+    def test_update_loaded_instance(self):
+        progress_instance = InstanceMetric.objects.get(pk=self.progress_instance.pk)
+        progress_instance.value = 25
+        progress_instance.save()
+        self.assertEqual(self.course_metric.get_total(), 25)
+
+    def test_move_to_other_metric(self):
+        other_metric = CourseMetric.objects.create(course=self.course, name='Slides', metric_type='number')
+        self.progress_instance.achievements.all().delete()
+        self.progress_instance.course_metric = other_metric
+        self.progress_instance.save()
+        self.assertEqual(self.course_metric.get_total(), 0)
+        self.assertEqual(other_metric.get_total(), 10)
+
+    def test_cascade_delete(self):
+        self.progress_instance.delete()
+        self.assertEqual(self.course_metric.get_total(), 0)
+        self.assertEqual(self.achievement_metric.get_total(), 0)
+
+    def test_cascade_skips_deleted_totals(self):
+        # The totals of metrics deleted in the same cascade are not updated row by row
+        other_metric = AchievementMetric.objects.create(course_metric=self.course_metric, achievement_level='Summarized', weight=1)
+        Achievement.objects.create(progress_instance=self.progress_instance, achievement_metric=other_metric, value=2)
+        with CaptureQueriesContext(connection) as queries:
+            self.achievement_metric.delete()
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE') and '"total"' in query['sql']])
+        self.assertEqual(other_metric.get_total(), 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.course.delete()
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE') and '"total"' in query['sql']])
+        self.assertFalse(CourseMetric.objects.exists())
+
+    def test_queryset_delete(self):
+        Achievement.objects.filter(pk=self.achievement.pk).delete()
+        self.assertEqual(self.achievement_metric.get_total(), 0)
+
+    def test_check_and_rebuild_command(self):
+        CourseMetric.objects.filter(pk=self.course_metric.pk).update(total=99)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_metric_totals', '--check', stdout=StringIO())
+
+        call_command('rebuild_metric_totals', stdout=StringIO())
+        self.assertEqual(self.course_metric.get_total(), 10)
+        call_command('rebuild_metric_totals', '--check', stdout=StringIO())
+
+
+class DatabaseSumTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(user=User.objects.create_user(username='testuser', password='testpassword'), name='Test Course')
+        self.chapter1 = Chapter.objects.create(course=self.course, name='Chapter 1')
+        self.chapter2 = Chapter.objects.create(course=self.course, name='Chapter 2')
+        self.content_type = ContentType.objects.get_for_model(self.chapter1)
+        self.pages = CourseMetric.objects.create(course=self.course, name='Pages', metric_type='number')
+        self.time = CourseMetric.objects.create(course=self.course, name='Time', metric_type='time')
+        self.empty = CourseMetric.objects.create(course=self.course, name='Slides', metric_type='number')
+        for chapter, pages, minutes in ((self.chapter1, 10, 5), (self.chapter2, 20, 15)):
+            InstanceMetric.objects.create(content_type=self.content_type, object_id=chapter.id, course_metric=self.pages, value=pages)
+            InstanceMetric.objects.create(content_type=self.content_type, object_id=chapter.id, course_metric=self.time, value=minutes * 60)
+
+    def test_compute_total(self):
+        self.assertEqual(self.pages.compute_total(), 30)
+        self.assertEqual(self.time.compute_total(), 20 * 60)
+        self.assertEqual(self.empty.compute_total(), 0)
+
+    def test_sum_many_single_query(self):
+        with self.assertNumQueries(1):
+            result = CourseMetric.sum_many([self.pages.pk, self.time.pk, self.empty.pk])
+
+        self.assertEqual(result, {self.pages.pk: 30, self.time.pk: 20 * 60, self.empty.pk: 0})
+
+
+class WithProgressTest(TestCase):
+    def setUp(self):
+        self.course = Course.objects.create(user=User.objects.create_user(username='testuser', password='testpassword'), name='Test Course')
+        self.pages = CourseMetric.objects.create(course=self.course, name='Pages', metric_type='number')
+        self.slides = CourseMetric.objects.create(course=self.course, name='Slides', metric_type='number')
+        self.done = AchievementMetric.objects.create(course_metric=self.pages, achievement_level='Done', weight=1)
+        content_type = ContentType.objects.get_for_model(Chapter)
+        for i in range(20):
+            chapter = Chapter.objects.create(course=self.course, name=f'Chapter {i}')
+            instance = InstanceMetric.objects.create(content_type=content_type, object_id=chapter.id, course_metric=self.pages, value=i)
+            InstanceMetric.objects.create(content_type=content_type, object_id=chapter.id, course_metric=self.slides, value=2 * i)
+            Achievement.objects.create(progress_instance=instance, achievement_metric=self.done, value=i)
+
+    def test_chapters_with_progress(self):
+        with self.assertNumQueries(3):
+            chapters = list(Chapter.objects.filter(course=self.course).with_progress())
+            values = {chapter.name: sorted(instance.value for instance in chapter.progress.all()) for chapter in chapters}
+            achieved = sum(achievement.value for chapter in chapters for instance in chapter.progress.all() for achievement in instance.achievements.all())
+
+        self.assertEqual(len(values), 20)
+        self.assertEqual(values['Chapter 3'], [3, 6])
+        self.assertEqual(achieved, sum(range(20)))
+
+    def test_courses_with_progress(self):
+        InstanceMetric.objects.create(content_type=ContentType.objects.get_for_model(Course), object_id=self.course.id, course_metric=self.pages, value=5)
+        with self.assertNumQueries(3):
+            course = Course.objects.with_progress().get(pk=self.course.pk)
+            self.assertEqual([instance.value for instance in course.progress.all()], [5])
+
+    def test_chapter_delete_removes_progress(self):
+        Chapter.objects.filter(course=self.course).delete()
+        self.assertFalse(InstanceMetric.objects.exists())
+        self.assertEqual(self.pages.get_total(), 0)
+        self.assertEqual(self.done.get_total(), 0)
@@ -0,0 +1,78 @@
+from django.db import models
+from django.db.models.functions import Coalesce
+from .fields import FixedPointField, fixed_value
+
+
+def move(model, old, new):
+    '''
+    Moves a stored value between running totals.
+    old and new are (metric id, value) pairs, or None when the value did not or no longer exists
+    '''
+    old_id, old_value = old or (None, 0)
+    new_id, new_value = new or (None, 0)
+
+    if old_id == new_id:
+        add(model, new_id, (new_value or 0) - (old_value or 0))
+    else:
+        add(model, old_id, -(old_value or 0))
+        add(model, new_id, new_value or 0)
+
+
+def add(model, pk, delta):
+    '''
+    Adds delta to the total of a single metric row without reading it first
+    '''
+    if pk is None or not delta:
+        return
+    model.objects.filter(pk=pk).update(total=models.F('total') + fixed_value(delta))
+
+
+def add_many(model, deltas):
+    '''
+    Adds a {metric id: delta} dict to the totals with a single UPDATE
+    '''
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    output_field = FixedPointField(max_digits=14, decimal_places=2)
+    delta = models.Case(*[models.When(pk=pk, then=fixed_value(delta)) for pk, delta in deltas.items()], output_field=output_field)
+    model.objects.filter(pk__in=deltas).update(total=models.F('total') + delta)
+
+
+def computed_totals():
+    '''
+    Returns the CourseMetric and AchievementMetric querysets annotated with the total computed from the source rows
+    '''
+    from .models import CourseMetric, AchievementMetric, InstanceMetric, Achievement
+
+    return (
+        CourseMetric.objects.annotate(computed=_sum_of(InstanceMetric, 'course_metric')),
+        AchievementMetric.objects.annotate(computed=_sum_of(Achievement, 'achievement_metric')),
+    )
+
+
+def check_totals():
+    '''
+    Returns the metrics whose stored total differs from the computed total
+    '''
+    return [metric for queryset in computed_totals() for metric in queryset.exclude(total=models.F('computed'))]
+
+
+def rebuild_totals():
+    '''
+    Recomputes every stored total from the source rows, returns the number of updated rows
+    '''
+    from .models import CourseMetric, AchievementMetric, InstanceMetric, Achievement
+
+    return (CourseMetric.objects.update(total=_sum_of(InstanceMetric, 'course_metric'))
+            + AchievementMetric.objects.update(total=_sum_of(Achievement, 'achievement_metric')))
+
+
+def _sum_of(model, field):
+    subquery = (model.objects
+                .filter(**{field: models.OuterRef('pk')})
+                .values(field)
+                .annotate(sum=models.Sum('value'))
+                .values('sum'))
+    output_field = FixedPointField(max_digits=14, decimal_places=2)
+    return Coalesce(models.Subquery(subquery, output_field=output_field), fixed_value(0), output_field=output_field)
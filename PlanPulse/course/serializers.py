@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models.models import Course
+from .models.models import Course, Chapter
+from .progress.models import CourseMetric, AchievementMetric, InstanceMetric
 
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
@@ -7,9 +8,80 @@ class CourseSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class AchievementMetricOutlineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AchievementMetric
+        fields = ['id', 'achievement_level', 'weight', 'time_estimate', 'total']
+
+
+class CourseMetricOutlineSerializer(serializers.ModelSerializer):
+    achievement_levels = AchievementMetricOutlineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = CourseMetric
+        fields = ['id', 'name', 'metric_type', 'total', 'achievement_levels']
+
+
+class InstanceMetricOutlineSerializer(serializers.ModelSerializer):
+    achieved = serializers.SerializerMethodField()
+
+    class Meta:
+        model = InstanceMetric
+        fields = ['id', 'course_metric', 'value', 'achieved']
+
+    def get_achieved(self, instance):
+        '''
+        Sums the prefetched achievements per achievement metric
+        '''
+        achieved = {}
+        for achievement in instance.achievements.all():
+            achieved[achievement.achievement_metric_id] = achieved.get(achievement.achievement_metric_id, 0) + achievement.value
+        return {str(pk): str(value) for pk, value in achieved.items()}
+
+
+class ChapterOutlineSerializer(serializers.ModelSerializer):
+    position = serializers.IntegerField(read_only=True)
+    progress = InstanceMetricOutlineSerializer(many=True, read_only=True)
+    subchapters = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Chapter
+        fields = ['id', 'name', 'description', 'completed', 'date_completed', 'is_numbered', 'position', 'progress', 'subchapters']
+
+    def get_subchapters(self, chapter):
+        return ChapterOutlineSerializer(chapter.subchapters, many=True, context=self.context).data
+
+
+class CourseOutlineSerializer(CourseSerializer):
+    '''
+    Course with its nested chapters and metrics, expects the chapter_tree and metrics attributes
+    to be loaded up front (see CourseOutlineView) so serializing runs no queries
+    '''
+    chapters = ChapterOutlineSerializer(source='chapter_tree', many=True, read_only=True)
+    metrics = CourseMetricOutlineSerializer(many=True, read_only=True)
+
+    class Meta(CourseSerializer.Meta):
+        pass
+
+
+class CourseListSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Course
+        fields = ['id', 'name', 'institution', 'instructor', 'study_points', 'completed', 'date_modified']
+
+
 class CreateCourseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
         fields = ['name', 'description', 'institution', 'instructor', 'study_points']
 
-    
\ No newline at end of file
+
+class AchievementRecordSerializer(serializers.Serializer):
+    progress_instance = serializers.IntegerField()
+    achievement_metric = serializers.IntegerField()
+    study_session = serializers.IntegerField(required=False, allow_null=True)
+    value = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+
+
+class BulkAchievementSerializer(serializers.Serializer):
+    achievements = AchievementRecordSerializer(many=True, allow_empty=False, max_length=1000)
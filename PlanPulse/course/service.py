@@ -1,6 +1,12 @@
 from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.forms import ValidationError
 from .models.models import Course, Chapter
+from .models.touch import touch_ids
 from .progress.models import CourseMetric, AchievementMetric, InstanceMetric, Achievement, StudySession
+from .progress.metric import metric_types
+from .progress import rollups, totals
 
 def create_course(user, name, description, institution, instructor, study_points):
     return Course.objects.create(user=user, name=name, description=description, institution=institution, instructor=instructor, study_points=study_points)
@@ -18,5 +24,106 @@ def create_study_session(user, start_time, end_time, duration):
 def create_achievement(course_metric, achievement_level, weight, time_estimate):
     return AchievementMetric.objects.create(course_metric=course_metric, achievement_level=achievement_level, weight=weight, time_estimate=time_estimate)
 
+def record_achievements(user, records):
+    '''
+    Validates and creates many achievements of a user at once.
+    records is a list of dicts with progress_instance, achievement_metric, value and optionally study_session ids.
+    All capacities are checked with one grouped query and the achievements are created with one bulk insert,
+    raises a ValidationError with the errors per record index when any record is invalid.
+    '''
+    with transaction.atomic(), rollups.coalesce_rollups():
+        errors, instances = check_achievements(user, records)
+        if errors:
+            raise ValidationError(errors)
+        return save_achievements(records, instances)
 
 
+def check_achievements(user, records, in_order=False):
+    '''
+    Validates achievement records with a fixed number of queries, locking the progress instances involved.
+    Returns the errors per record index and the locked instances by id, must run inside a transaction.
+    With in_order the capacity is claimed in record order, so only the records that no longer fit are rejected.
+    '''
+    instance_ids = {record['progress_instance'] for record in records}
+    instances = {row['pk']: row for row in (InstanceMetric.objects
+                                            .select_for_update()
+                                            .filter(pk__in=instance_ids, course_metric__course__user=user)
+                                            .values('pk', 'value', 'course_metric_id', 'course_metric__course_id', 'course_metric__metric_type'))}
+    achievement_metrics = dict(AchievementMetric.objects
+                               .filter(pk__in={record['achievement_metric'] for record in records})
+                               .values_list('pk', 'course_metric_id'))
+    session_ids = {record['study_session'] for record in records if record.get('study_session')}
+    sessions = set(StudySession.objects.filter(pk__in=session_ids, user=user).values_list('pk', flat=True)) if session_ids else set()
+    used = dict(Achievement.objects
+                .filter(progress_instance__in=instances)
+                .values('progress_instance')
+                .annotate(used=Sum('value'))
+                .values_list('progress_instance', 'used'))
+
+    errors = {}
+    seen = set()
+    for index, record in enumerate(records):
+        instance = instances.get(record['progress_instance'])
+        value = record.get('value') or 0
+        key = (record['progress_instance'], record['achievement_metric'], record.get('study_session'))
+        if instance is None:
+            errors[index] = "The progress instance does not exist"
+        elif achievement_metrics.get(record['achievement_metric']) != instance['course_metric_id']:
+            errors[index] = "The achievement metric must belong to the same course metric as the progress instance"
+        elif record.get('study_session') and record['study_session'] not in sessions:
+            errors[index] = "The study session must belong to the same user as the progress instance"
+        elif value < 0:
+            errors[index] = "The achievement value cannot be negative"
+        elif key[2] and key in seen:
+            errors[index] = "The achievement is recorded more than once for the same study session"
+        else:
+            seen.add(key)
+
+    by_type = {}  # The values are validated per metric type, one array per type
+    for index, record in enumerate(records):
+        if index not in errors:
+            by_type.setdefault(instances[record['progress_instance']]['course_metric__metric_type'], []).append(index)
+    for metric_type, indexes in by_type.items():
+        for position, message in metric_types.get(metric_type).validate_many([records[index].get('value') or 0 for index in indexes]).items():
+            errors[indexes[position]] = message
+
+    for index, record in enumerate(records):
+        if index not in errors:
+            instance = instances[record['progress_instance']]
+            used[instance['pk']] = used.get(instance['pk'], 0) + (record.get('value') or 0)
+            if in_order and instance['value'] < used[instance['pk']]:
+                used[instance['pk']] -= record.get('value') or 0
+                errors[index] = "The sum of the achievement values cannot exceed the progress instance value"
+
+    for index, record in enumerate(records):
+        instance = instances.get(record['progress_instance'])
+        if not in_order and index not in errors and instance['value'] < used[instance['pk']]:
+            errors[index] = "The sum of the achievement values cannot exceed the progress instance value"
+    return errors, instances
+
+
+def save_achievements(records, instances):
+    '''
+    Bulk creates checked achievement records and adds them to the totals, instances as returned by check_achievements
+    '''
+    try:
+        achievements = Achievement.objects.bulk_create([
+            Achievement(progress_instance_id=record['progress_instance'],
+                        achievement_metric_id=record['achievement_metric'],
+                        study_session_id=record.get('study_session'),
+                        value=record.get('value') or 0)
+            for record in records
+        ])
+    except IntegrityError as error:
+        raise ValidationError("An achievement is already recorded for this progress instance and study session") from error
+
+    deltas = {}
+    for achievement in achievements:
+        # Bulk created rows skip from_db, a later save must move the value instead of adding it again
+        achievement._stored = achievement.get_stored_value()
+        achievement._loaded_session_id = achievement.study_session_id
+        deltas[achievement.achievement_metric_id] = deltas.get(achievement.achievement_metric_id, 0) + achievement.value
+    totals.add_many(AchievementMetric, deltas)
+    touch_ids(Course, {instances[record['progress_instance']]['course_metric__course_id'] for record in records})
+    rollups.mark_sessions({record.get('study_session') for record in records})
+    return achievements
@@ -0,0 +1,105 @@
+'''
+Generates synthetic accounts to measure the models and the API against. The courses are shaped like
+course/examples/concepten_van_programeertalen.json: blocks of nested chapters with Pages and Slides to do,
+done or summarized at the weights and time estimates of the example. Every user also gets a history of
+study sessions with achievements that never exceed the progress instances.
+
+The data is random but the same for the same seed and sizes, apart from the session times that are relative to now.
+'''
+
+import random
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from .importer import import_courses
+from .models.touch import coalesce_touches
+from .progress import rollups
+from .progress.models import AchievementMetric, InstanceMetric, StudySession
+from . import service
+
+METRICS = [
+    {'name': 'Pages', 'type': 'number', 'levels': [{'name': 'Done', 'weight': 4, 'time_estimate': '00:04:00'},
+                                                     {'name': 'Summarized', 'weight': 12, 'time_estimate': '00:12:00'}]},
+    {'name': 'Slides', 'type': 'number', 'levels': [{'name': 'Done', 'weight': 1, 'time_estimate': '00:01:00'}]},
+]
+
+
+def generate(users=1, courses=3, chapters=20, depth=2, sessions=50, days=90, prefix='synthetic', seed=0, password=None):
+    '''
+    Creates users accounts with courses courses of chapters chapters nested depth levels deep,
+    and sessions study sessions per course spread over the last days days. Returns the users.
+    '''
+    rng = random.Random(seed)
+    password = make_password(password)  # Hashed once, hashing per user is slow; None makes it unusable
+    created = User.objects.bulk_create([User(username=f'{prefix}{i}', password=password) for i in range(users)])
+    for user in created:
+        with coalesce_touches(), transaction.atomic(), rollups.coalesce_rollups():
+            course_ids = [course.pk for course in import_courses(user, [course_document(rng, f'Course {i + 1}', chapters, depth) for i in range(courses)])]
+            _create_history(rng, user, course_ids, sessions, days)
+    return created
+
+
+def course_document(rng, name, chapters, depth):
+    '''
+    Returns an import document of a course with chapters chapters in total, nested depth levels deep
+    '''
+    return {'name': name, 'institution': 'Synthetic University', 'study_points': rng.choice([3, 4, 6]),
+            'metrics': METRICS, 'chapters': _chapters(rng, chapters, depth, '')}
+
+
+def _chapters(rng, count, depth, prefix):
+    if depth <= 1:
+        return [_leaf(rng, f'{prefix}{i + 1}') for i in range(count)]
+
+    blocks = max(1, min(count, round(count ** (1 / depth))))
+    rest = count - blocks
+    documents = []
+    for i in range(blocks):
+        size = rest // blocks + (1 if i < rest % blocks else 0)
+        if size:
+            documents.append({'name': f'Block {prefix}{i + 1}', 'chapters': _chapters(rng, size, depth - 1, f'{prefix}{i + 1}.')})
+        else:
+            documents.append(_leaf(rng, f'{prefix}{i + 1}'))
+    return documents
+
+
+def _leaf(rng, number):
+    return {'name': f'Chapter {number}', 'progress': {'Pages': rng.randint(20, 40), 'Slides': rng.randint(25, 50)}}
+
+
+def _create_history(rng, user, course_ids, count, days):
+    '''
+    Creates count study sessions per course, each with a few achievements on the chapters of that course
+    '''
+    instances = {}
+    for pk, value, course_metric_id, course_id in (InstanceMetric.objects
+                                                   .filter(course_metric__course__in=course_ids)
+                                                   .values_list('pk', 'value', 'course_metric_id', 'course_metric__course_id')):
+        instances.setdefault(course_id, []).append({'pk': pk, 'value': value, 'course_metric_id': course_metric_id, 'course_metric__course_id': course_id})
+    levels = {}
+    for pk, course_metric_id in AchievementMetric.objects.filter(course_metric__course__in=course_ids).values_list('pk', 'course_metric_id'):
+        levels.setdefault(course_metric_id, []).append(pk)
+
+    now = timezone.now()
+    sessions = []
+    for _ in range(count * len(course_ids)):
+        # The time spent, and the session ending after some breaks on top of it
+        end_time = now - timedelta(days=rng.uniform(0, days))
+        duration = timedelta(minutes=rng.randint(20, 120))
+        start_time = end_time - duration - timedelta(minutes=rng.randint(0, 15))
+        sessions.append(StudySession(user=user, start_time=start_time, end_time=end_time, duration=duration))
+    sessions = StudySession.objects.bulk_create(sessions)
+    used = {}
+    records = []
+    for index, session in enumerate(sessions):
+        course_instances = instances.get(course_ids[index % len(course_ids)], [])
+        for instance in rng.sample(course_instances, min(3, len(course_instances))):
+            value = min(rng.randint(1, 5), instance['value'] - used.get(instance['pk'], 0))
+            if value > 0:
+                used[instance['pk']] = used.get(instance['pk'], 0) + value
+                records.append({'progress_instance': instance['pk'], 'achievement_metric': rng.choice(levels[instance['course_metric_id']]),
+                                'study_session': session.pk, 'value': value})
+    service.save_achievements(records, {instance['pk']: instance for course_instances in instances.values() for instance in course_instances})
+    rollups.mark_sessions(session.pk for session in sessions)
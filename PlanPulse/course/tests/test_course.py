@@ -1,6 +1,10 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.forms import ValidationError
 from course.models.models import Course, Chapter
+from course.models.touch import coalesce_touches
 
 class CourseModelTest(TestCase):
     def setUp(self):
@@ -47,9 +51,11 @@ class ChapterTestCase(TestCase):
         chapter3 = Chapter.objects.create(name='Chapter 3', course=course_increment)
 
         # Assert
-        self.assertEqual(chapter1.order, 1)
-        self.assertEqual(chapter2.order, 2)
-        self.assertEqual(chapter3.order, 3)
+        self.assertEqual(chapter1.get_position(), 1)
+        self.assertEqual(chapter2.get_position(), 2)
+        self.assertEqual(chapter3.get_position(), 3)
+        self.assertLess(chapter1.order, chapter2.order)
+        self.assertLess(chapter2.order, chapter3.order)
 
     def test_auto_decrement_order(self):
         # Arrange
@@ -65,8 +71,8 @@ class ChapterTestCase(TestCase):
         chapter3.refresh_from_db()
 
         # Assert
-        self.assertEqual(chapter1.order, 1)
-        self.assertEqual(chapter3.order, 2)
+        self.assertEqual(chapter1.get_position(), 1)
+        self.assertEqual(chapter3.get_position(), 2)
 
     def test_move_order_up(self):
         # Arrange
@@ -85,10 +91,10 @@ class ChapterTestCase(TestCase):
         chapter4.refresh_from_db()
 
         # Assert
-        self.assertEqual(chapter1.order, 2)
-        self.assertEqual(chapter2.order, 3)
-        self.assertEqual(chapter3.order, 1)
-        self.assertEqual(chapter4.order, 4)
+        self.assertEqual(chapter1.get_position(), 2)
+        self.assertEqual(chapter2.get_position(), 3)
+        self.assertEqual(chapter3.get_position(), 1)
+        self.assertEqual(chapter4.get_position(), 4)
 
     def test_move_order_down(self):
         # Arrange
@@ -107,10 +113,10 @@ class ChapterTestCase(TestCase):
         chapter4.refresh_from_db()
 
         # Assert
-        self.assertEqual(chapter1.order, 3)
-        self.assertEqual(chapter2.order, 1)
-        self.assertEqual(chapter3.order, 2)
-        self.assertEqual(chapter4.order, 4)
+        self.assertEqual(chapter1.get_position(), 3)
+        self.assertEqual(chapter2.get_position(), 1)
+        self.assertEqual(chapter3.get_position(), 2)
+        self.assertEqual(chapter4.get_position(), 4)
 
     def test_has_access(self):
         # Arrange
@@ -128,6 +134,149 @@ class ChapterTestCase(TestCase):
         self.assertEqual(subchapter.name, 'Subchapter 1')
         self.assertEqual(subchapter.course, self.course)
         self.assertEqual(subchapter.parent_chapter, self.chapter)
-        self.assertEqual(subchapter.order, 1)
+        self.assertEqual(subchapter.get_position(), 1)
         self.assertTrue(subchapter.is_numbered)
 
+
+
+class ChapterTreeTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = Course.objects.create(user=self.user, name='Test Course')
+        self.chapter1 = Chapter.objects.create(name='Chapter 1', course=self.course)
+        self.chapter2 = Chapter.objects.create(name='Chapter 2', course=self.course)
+        self.chapter1_1 = self.chapter1.add_subchapter('Chapter 1.1')
+        self.chapter1_2 = self.chapter1.add_subchapter('Chapter 1.2')
+        self.chapter1_2_1 = self.chapter1_2.add_subchapter('Chapter 1.2.1')
+
+    def test_path(self):
+        self.chapter1_2_1.refresh_from_db()
+        self.assertEqual(self.chapter1_2_1.path, f"{self.chapter1.pk}/{self.chapter1_2.pk}/{self.chapter1_2_1.pk}/")
+        self.assertEqual(self.chapter1_2_1.depth, 2)
+        self.assertEqual(self.chapter1.depth, 0)
+
+    def test_get_chapter_tree(self):
+        with self.assertNumQueries(1):
+            tree = self.course.get_chapter_tree()
+
+        self.assertEqual(tree, [self.chapter1, self.chapter2])
+        self.assertEqual(tree[0].subchapters, [self.chapter1_1, self.chapter1_2])
+        self.assertEqual(tree[0].subchapters[1].subchapters, [self.chapter1_2_1])
+        self.assertEqual(tree[1].subchapters, [])
+
+    def test_get_subtree(self):
+        with self.assertNumQueries(1):
+            subtree = self.chapter1_2.get_subtree()
+
+        self.assertEqual(subtree, self.chapter1_2)
+        self.assertEqual(subtree.subchapters, [self.chapter1_2_1])
+
+    def test_get_ancestors_and_descendants(self):
+        self.assertEqual(list(self.chapter1_2_1.get_ancestors()), [self.chapter1, self.chapter1_2])
+        self.assertEqual(set(self.chapter1.get_descendants()), {self.chapter1_1, self.chapter1_2, self.chapter1_2_1})
+
+    def test_move_to_other_parent(self):
+        chapter = Chapter.objects.get(pk=self.chapter1_2.pk)
+        chapter.parent_chapter = self.chapter2
+        chapter.save()
+
+        self.chapter1_1.refresh_from_db()
+        self.chapter1_2_1.refresh_from_db()
+        self.assertEqual(chapter.get_position(), 1)
+        self.assertEqual(self.chapter1_1.get_position(), 1)
+        self.assertEqual(self.chapter1_2_1.path, f"{self.chapter2.pk}/{self.chapter1_2.pk}/{self.chapter1_2_1.pk}/")
+        self.assertEqual(list(self.chapter2.get_descendants().order_by('path')), [chapter, self.chapter1_2_1])
+
+    def test_move_into_own_subchapter(self):
+        chapter = Chapter.objects.get(pk=self.chapter1.pk)
+        chapter.parent_chapter = self.chapter1_2_1
+        with self.assertRaises(ValidationError):
+            chapter.save()
+
+
+class ChapterReorderTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = Course.objects.create(user=self.user, name='Test Course')
+        self.chapters = [Chapter.objects.create(name=f'Chapter {i}', course=self.course) for i in range(1, 6)]
+
+    def get_names(self):
+        return [chapter.name for chapter in self.course.get_chapter_tree()]
+
+    def test_move_order_writes_one_chapter(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.chapters[4].move_order(2, save=True)
+
+        chapter_updates = [query for query in queries if query['sql'].startswith('UPDATE "course_chapter"')]
+        self.assertEqual(len(chapter_updates), 1)
+        self.assertEqual(self.get_names(), ['Chapter 1', 'Chapter 5', 'Chapter 2', 'Chapter 3', 'Chapter 4'])
+
+    def test_move_order_without_gap(self):
+        # Keep moving to the same spot until the gap between chapter 1 and 2 is used up
+        for i in range(Chapter.ORDER_GAP.bit_length() + 1):
+            chapter = Chapter.objects.get(pk=self.chapters[2 + i % 3].pk)
+            chapter.move_order(2, save=True)
+
+        tree = self.course.get_chapter_tree()
+        self.assertEqual([chapter.position for chapter in tree], [1, 2, 3, 4, 5])
+        self.assertEqual(tree[0].name, 'Chapter 1')
+        self.assertEqual(len({chapter.order for chapter in tree}), 5)
+
+    def test_reorder(self):
+        new_order = [self.chapters[i].pk for i in (3, 0, 4, 2, 1)]
+        with self.assertNumQueries(6):  # Select, then a savepoint around two chapter updates and the course modified date
+            Chapter.reorder(self.course, None, new_order)
+
+        self.assertEqual(self.get_names(), ['Chapter 4', 'Chapter 1', 'Chapter 5', 'Chapter 3', 'Chapter 2'])
+
+    def test_reorder_needs_all_siblings(self):
+        with self.assertRaises(ValidationError):
+            Chapter.reorder(self.course, None, [chapter.pk for chapter in self.chapters[1:]])
+
+
+class CoalesceTouchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = Course.objects.create(user=self.user, name='Test Course')
+
+    def get_course_updates(self, queries):
+        return [query['sql'] for query in queries if query['sql'].startswith('UPDATE "course_course"')]
+
+    def test_touch_is_narrow(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.course.modified()
+
+        updates = self.get_course_updates(queries)
+        self.assertEqual(len(updates), 1)
+        self.assertTrue(updates[0].startswith('UPDATE "course_course" SET "date_modified" = '))
+
+    def test_coalesce_touches(self):
+        old_modified_date = Course.objects.get(pk=self.course.pk).date_modified
+        with CaptureQueriesContext(connection) as queries:
+            with coalesce_touches():
+                for i in range(10):
+                    chapter = Chapter.objects.create(name=f'Chapter {i}', course=self.course)
+                    chapter.add_subchapter('Subchapter')
+
+        self.assertEqual(len(self.get_course_updates(queries)), 1)
+        self.assertGreater(Course.objects.get(pk=self.course.pk).date_modified, old_modified_date)
+
+    def test_coalesce_touches_discards_on_error(self):
+        old_modified_date = Course.objects.get(pk=self.course.pk).date_modified
+        with self.assertRaises(ValueError):
+            with coalesce_touches():
+                self.course.modified()
+                raise ValueError()
+
+        self.assertEqual(Course.objects.get(pk=self.course.pk).date_modified, old_modified_date)
+
+
+class FlatManagerTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = Course.objects.create(user=self.user, name='Test Course')
+        self.chapter = Chapter.objects.create(name='Chapter 1', course=self.course)
+
+    def test_flat(self):
+        self.assertEqual(list(Course.flat.filter(user=self.user)), [self.course])
+        self.assertEqual(list(Chapter.flat.filter(course=self.course).columns('id', 'name')), [{'id': self.chapter.pk, 'name': 'Chapter 1'}])
@@ -0,0 +1,128 @@
+import csv
+import io
+import json
+import zipfile
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from datetime import datetime, timedelta, timezone
+from course.export import export_account
+from course.importer import import_course
+from course.progress.models import AchievementMetric, InstanceMetric, StudySession
+from course.service import record_achievements
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = self.create_course(self.user, 'Course')
+        self.create_course(User.objects.create_user(username='other', password='testpassword'), 'Other')
+        self.session = StudySession.objects.create(user=self.user, start_time=datetime(2024, 3, 1, 10, tzinfo=timezone.utc), duration=timedelta(minutes=45))
+        done = AchievementMetric.objects.get(course_metric__course=self.course)
+        record_achievements(self.user, [{'progress_instance': instance.pk, 'achievement_metric': done.pk, 'value': 2, 'study_session': self.session.pk}
+                                        for instance in InstanceMetric.objects.filter(course_metric=done.course_metric)])
+
+    def create_course(self, user, name):
+        return import_course(user, {
+            'name': name,
+            'metrics': [{'name': 'Pages', 'levels': [{'name': 'Done', 'time_estimate': 60}]}],
+            'chapters': [{'name': f'Chapter {i}', 'chapters': [{'name': f'Chapter {i}.1', 'progress': {'Pages': 10}}]} for i in range(3)],
+        })
+
+    def test_json(self):
+        data = json.loads(b''.join(export_account(self.user)))
+
+        self.assertEqual(list(data), ['courses', 'chapters', 'course_metrics', 'achievement_metrics', 'instance_metrics', 'study_sessions', 'achievements'])
+        self.assertEqual([course['name'] for course in data['courses']], ['Course'])
+        self.assertEqual(len(data['chapters']), 6)
+        self.assertEqual(len(data['achievements']), 3)
+        self.assertEqual(data['achievements'][0]['value'], '2.00')
+        self.assertEqual(data['achievement_metrics'][0]['time_estimate'], 'P0DT00H01M00S')
+        self.assertEqual(data['study_sessions'], [{'id': self.session.pk, 'start_time': '2024-03-01T10:00:00Z', 'end_time': None, 'duration': 'P0DT00H45M00S'}])
+        self.assertEqual({row['object_type'] for row in data['instance_metrics']}, {'chapter'})
+
+    def test_dependency_order(self):
+        data = json.loads(b''.join(export_account(self.user, chunk_size=2)))
+
+        seen = set()
+        for chapter in data['chapters']:
+            self.assertTrue(chapter['parent_chapter_id'] is None or chapter['parent_chapter_id'] in seen)
+            seen.add(chapter['id'])
+        self.assertTrue({row['object_id'] for row in data['instance_metrics']} <= seen)
+
+    def test_chunks(self):
+        chunks = list(export_account(self.user, chunk_size=2))
+        with self.assertNumQueries(7):  # One per table however many chunks it is read in
+            self.assertEqual(b''.join(export_account(self.user, chunk_size=2)), b''.join(chunks))
+        self.assertGreater(len(chunks), 7)
+
+    def test_csv(self):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(export_account(self.user, 'csv', chunk_size=2))))
+
+        self.assertEqual(archive.namelist(), ['courses.csv', 'chapters.csv', 'course_metrics.csv', 'achievement_metrics.csv',
+                                              'instance_metrics.csv', 'study_sessions.csv', 'achievements.csv'])
+        chapters = list(csv.DictReader(io.TextIOWrapper(archive.open('chapters.csv'))))
+        self.assertEqual([chapter['name'] for chapter in chapters], ['Chapter 0', 'Chapter 0.1', 'Chapter 1', 'Chapter 1.1', 'Chapter 2', 'Chapter 2.1'])
+        sessions = list(csv.DictReader(io.TextIOWrapper(archive.open('study_sessions.csv'))))
+        self.assertEqual(sessions, [{'id': str(self.session.pk), 'start_time': '2024-03-01T10:00:00Z', 'end_time': '', 'duration': 'P0DT00H45M00S'}])
+
+    def test_zipped_json(self):
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(export_account(self.user, zipped=True))))
+        self.assertEqual(json.loads(archive.read('account.json')), json.loads(b''.join(export_account(self.user))))
+
+    def test_empty_account(self):
+        data = json.loads(b''.join(export_account(User.objects.create_user(username='empty', password='testpassword'))))
+        self.assertTrue(all(rows == [] for rows in data.values()))
+
+
+class ExportViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        import_course(self.user, {'name': 'Course', 'chapters': [{'name': 'Chapter 1'}]})
+        self.client.force_login(self.user)
+
+    def test_json(self):
+        response = self.client.get(reverse('export'))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="planpulse-export.json"')
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['courses'][0]['name'], 'Course')
+
+    def test_csv(self):
+        response = self.client.get(reverse('export'), {'output': 'csv'})
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="planpulse-export.csv.zip"')
+        self.assertIn('chapters.csv', zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))).namelist())
+
+    def test_zipped_json(self):
+        response = self.client.get(reverse('export'), {'zip': '1'})
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="planpulse-export.json.zip"')
+
+    def test_unknown_output(self):
+        self.assertEqual(self.client.get(reverse('export'), {'output': 'xml'}).status_code, 400)
+
+    async def test_streams_under_asgi(self):
+        # Under ASGI a sync iterator would be read into a list first, the chunks must be pulled one at a time
+        produced = []
+
+        def export_account(user, output, zipped):
+            for chunk in (b'{"courses": ', b'[]}'):
+                produced.append(chunk)
+                yield chunk
+
+        await self.async_client.aforce_login(self.user)
+        with mock.patch('course.views.export.export_account', export_account):
+            response = await self.async_client.get(reverse('export'))
+            self.assertTrue(response.is_async)
+            chunks = aiter(response.streaming_content)
+            self.assertEqual(await anext(chunks), b'{"courses": ')
+            self.assertEqual(produced, [b'{"courses": '])
+            self.assertEqual([chunk async for chunk in chunks], [b'[]}'])
+
+        response = await self.async_client.get(reverse('export'))
+        self.assertEqual(json.loads(b''.join([chunk async for chunk in response.streaming_content]))['courses'][0]['name'], 'Course')
+
+    def test_anonymous(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('export')).status_code, 403)
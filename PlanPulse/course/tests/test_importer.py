@@ -0,0 +1,120 @@
+import json
+from io import StringIO
+from pathlib import Path
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.forms import ValidationError
+from django.test import TestCase
+from django.urls import reverse
+from datetime import timedelta
+from course.importer import import_course, import_courses
+from course.models.models import Course, Chapter
+from course.progress.models import CourseMetric, AchievementMetric, InstanceMetric
+from course.progress.totals import check_totals
+
+EXAMPLE = Path(__file__).resolve().parent.parent / 'examples' / 'concepten_van_programeertalen.json'
+
+
+class ImportCourseTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.document = json.loads(EXAMPLE.read_text(encoding='utf-8'))
+
+    def test_import_example(self):
+        course = import_course(self.user, self.document)
+
+        tree = course.get_chapter_tree()
+        self.assertEqual([chapter.name for chapter in tree], ['Basisconcepten', 'Geavanceerde concepten', 'Parallel programmeren', "Programmeerparadigma's"])
+        self.assertEqual([chapter.position for chapter in tree[0].subchapters], [1, 2, 3, 4])
+        self.assertEqual(tree[0].subchapters[1].name, 'Variabelen en geheugen')
+        self.assertEqual(tree[0].subchapters[1].path, f"{tree[0].pk}/{tree[0].subchapters[1].pk}/")
+
+        pages = CourseMetric.objects.get(course=course, name='Pages')
+        self.assertEqual(pages.get_total(), 460)
+        self.assertEqual(pages.achievement_levels.get(achievement_level='Summarized').time_estimate, timedelta(minutes=12))
+        self.assertEqual(check_totals(), [])
+
+        # New chapters are appended after the imported ones
+        chapter = tree[2].add_subchapter('Extra')
+        self.assertEqual(chapter.get_position(), 3)
+
+    def test_import_many_in_constant_queries(self):
+        documents = [dict(self.document, name=f"Course {i}") for i in range(3)]
+        # Duplicate check, savepoint, courses, two chapter depths, paths, metrics, levels, instances, release.
+        # Larger imports only add statements when a bulk insert is split into batches
+        with self.assertNumQueries(10):
+            import_courses(self.user, documents)
+
+        self.assertEqual(Course.objects.count(), 3)
+        self.assertEqual(Chapter.objects.count(), 3 * 21)
+        self.assertEqual(AchievementMetric.objects.count(), 3 * 3)
+        self.assertEqual(InstanceMetric.objects.count(), 3 * 17 * 2)
+
+    def test_invalid_document(self):
+        self.document['chapters'][0]['progress'] = {'Unknown': 1}
+        with self.assertRaises(ValidationError):
+            import_course(self.user, self.document)
+        self.assertFalse(Course.objects.exists())
+
+    def test_malformed_metrics(self):
+        metrics = [
+            ['Pages'],
+            [{'name': 'Pages', 'levels': ['Done']}],
+            [{'name': 'Pages', 'levels': [{'name': 'Done'}, {'name': 'Done'}]}],
+        ]
+        for document_metrics in metrics:
+            with self.subTest(metrics=document_metrics), self.assertRaises(ValidationError):
+                import_course(self.user, {'name': 'Course', 'metrics': document_metrics})
+        with self.assertRaises(ValidationError):
+            import_course(self.user, {'name': 'Course', 'chapters': [{'name': 'Chapter', 'progress': ['Pages']}]})
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('import-courses'), {'courses': [{'name': 'Course', 'metrics': ['Pages']}]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Course.objects.exists())
+
+    def test_values_out_of_range(self):
+        # Valid JSON that the database or timedelta cannot hold is a ValidationError, not a server error
+        documents = [
+            {'name': 'Course', 'metrics': [{'name': 'P'}], 'chapters': [{'name': 'Chapter', 'progress': {'P': value}}]}
+            for value in ('NaN', float('nan'), 'Infinity', '1e30', 1e10, 10 ** 16)
+        ] + [
+            {'name': 'Course', 'metrics': [{'name': 'P', 'levels': [{'name': 'Done', 'time_estimate': value}]}]}
+            for value in (1e300, float('nan'), '1e300', 1e13)
+        ] + [
+            {'name': 'Course', 'metrics': [{'name': 'T', 'type': 'time'}], 'chapters': [{'name': 'Chapter', 'progress': {'T': 1e9}}]},
+        ]
+        for document in documents:
+            with self.subTest(document=document), self.assertRaises(ValidationError):
+                import_course(self.user, document)
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('import-courses'), {'courses': [documents[3]]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Course.objects.exists())
+
+    def test_metric_type_values(self):
+        self.document['metrics'].append({'name': 'Quiz', 'type': 'percentage'})
+        self.document['chapters'][0]['chapters'][0]['progress']['Quiz'] = 80
+        course = import_course(self.user, self.document)
+        self.assertEqual(CourseMetric.objects.get(course=course, name='Quiz').total, 80)
+
+        self.document['name'] = 'Other'
+        self.document['chapters'][0]['chapters'][1]['progress']['Quiz'] = 120
+        with self.assertRaisesMessage(ValidationError, 'Other: Quiz progress: Invalid percentage value'):
+            import_course(self.user, self.document)
+
+    def test_duplicate_name(self):
+        import_course(self.user, self.document)
+        with self.assertRaises(ValidationError):
+            import_course(self.user, self.document)
+
+    def test_command(self):
+        call_command('import_courses', 'testuser', str(EXAMPLE), stdout=StringIO())
+        self.assertTrue(Course.objects.filter(user=self.user, name='Concepten van Programeertalen').exists())
+
+    def test_endpoint(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('import-courses'), {'courses': [self.document]}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['courses']), 1)
@@ -0,0 +1,54 @@
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Sum
+from django.test import TestCase
+from course.models.models import Course, Chapter
+from course.progress.models import CourseMetric, AchievementMetric, InstanceMetric, Achievement, StudySession, DailyStudyTime
+from course.synthetic import generate
+
+
+class GenerateTest(TestCase):
+    def test_sizes(self):
+        users = generate(users=2, courses=2, chapters=30, depth=3, sessions=10)
+
+        self.assertEqual([user.username for user in users], ['synthetic0', 'synthetic1'])
+        self.assertEqual(Course.objects.count(), 4)
+        course = Course.objects.first()
+        self.assertEqual(Chapter.objects.filter(course=course).count(), 30)
+        self.assertEqual(max(chapter.path.count('/') for chapter in Chapter.flat.filter(course=course)), 3)
+        self.assertEqual(StudySession.objects.filter(user=users[0]).count(), 20)
+        self.assertFalse(users[0].has_usable_password())
+
+    def test_consistent(self):
+        generate(courses=1, chapters=10, sessions=200)
+
+        for instance in InstanceMetric.objects.annotate(used=Sum('achievements__value')):
+            self.assertLessEqual(instance.used or 0, instance.value)
+        for metric in CourseMetric.objects.all():
+            self.assertEqual(metric.total, metric.compute_total())
+        for metric in AchievementMetric.objects.annotate(sum=Sum('achievement__value')):
+            self.assertEqual(metric.total, metric.sum or 0)
+        self.assertTrue(DailyStudyTime.objects.exists())
+        for session in StudySession.objects.all():
+            session.full_clean()  # The rows pass the validation of the model
+
+    def test_seed(self):
+        generate(courses=1, chapters=10, sessions=5, prefix='a', seed=1)
+        generate(courses=1, chapters=10, sessions=5, prefix='b', seed=1)
+
+        def values(prefix):
+            return list(Achievement.objects.filter(study_session__user__username__startswith=prefix).order_by('pk').values_list('value', flat=True))
+        self.assertEqual(values('a'), values('b'))
+
+
+class GenerateDataCommandTest(TestCase):
+    def test_command(self):
+        out = StringIO()
+        call_command('generate_data', '--users', '1', '--courses', '1', '--chapters', '5', '--sessions', '2', '--password', 'secret', stdout=out)
+
+        self.assertIn('Generated 1 user(s) with 1 course(s), 5 chapter(s), 2 study session(s)', out.getvalue())
+        self.assertTrue(User.objects.get(username='synthetic0').check_password('secret'))
+        with self.assertRaises(CommandError):
+            call_command('generate_data', stdout=out)
@@ -0,0 +1,290 @@
+import asyncio
+import json
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from course.importer import import_course
+from core import cache as response_cache, events, routers
+from course.models.models import Course, Chapter
+from course.models.touch import topic
+from course.progress.models import AchievementMetric, InstanceMetric
+from course.service import record_achievements
+
+
+class CourseListViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.courses = [Course.objects.create(user=self.user, name=f'Course {i}') for i in range(25)]
+        Course.objects.create(user=User.objects.create_user(username='testuser2', password='testpassword'), name='Other')
+        self.client.force_login(self.user)
+
+    def test_pages(self):
+        names = []
+        cursor = None
+        for expected in (10, 10, 5):
+            response = self.client.get(reverse('course-list'), {'limit': 10, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertEqual(len(data['results']), expected)
+            names += [course['name'] for course in data['results']]
+            cursor = data['next']
+
+        self.assertIsNone(cursor)
+        self.assertEqual(names, [f'Course {i}' for i in range(25)])
+
+    def test_same_modified_date(self):
+        Course.objects.filter(user=self.user).update(date_modified=self.courses[0].date_modified)
+        first = self.client.get(reverse('course-list'), {'limit': 20}).json()
+        second = self.client.get(reverse('course-list'), {'limit': 20, 'cursor': first['next']}).json()
+        ids = [course['id'] for course in first['results'] + second['results']]
+        self.assertEqual(ids, sorted(course.pk for course in self.courses))
+
+    def test_only_listed_columns_without_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('course-list'))
+
+        course_queries = [query['sql'] for query in queries if 'FROM "course_course"' in query['sql']]
+        self.assertEqual(len(course_queries), 1)
+        self.assertNotIn('COUNT', course_queries[0])
+        self.assertNotIn('"description"', course_queries[0])
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'name', 'institution', 'instructor', 'study_points', 'completed', 'date_modified'})
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('course-list'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CourseOutlineViewTest(TestCase):
+    # Session, user, course, chapters, progress, achievements, metrics and achievement levels
+    QUERY_BUDGET = 8
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_login(self.user)
+
+    def create_course(self, chapters):
+        blocks = chapters // 10
+        course = import_course(self.user, {
+            'name': f'Course {chapters}',
+            'metrics': [
+                {'name': 'Pages', 'levels': [{'name': 'Done', 'weight': 4}, {'name': 'Summarized', 'weight': 12}]},
+                {'name': 'Time', 'type': 'time', 'levels': [{'name': 'Done'}]},
+            ],
+            'chapters': [{'name': f'Block {block}', 'progress': {'Pages': 10, 'Time': 600},
+                          'chapters': [{'name': f'Chapter {block}.{i}', 'progress': {'Pages': 10, 'Time': 600}} for i in range(9)]}
+                         for block in range(blocks)],
+        })
+        done = AchievementMetric.objects.get(course_metric__course=course, course_metric__name='Pages', achievement_level='Done')
+        record_achievements(self.user, [{'progress_instance': pk, 'achievement_metric': done.pk, 'value': 5}
+                                        for pk in InstanceMetric.objects.filter(course_metric=done.course_metric).values_list('pk', flat=True)])
+        return course
+
+    def assert_outline(self, chapters):
+        course = self.create_course(chapters)
+        with self.assertNumQueries(self.QUERY_BUDGET):
+            response = self.client.get(reverse('course-outline', args=[course.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        outline = response.json()
+        self.assertEqual(len(outline['chapters']), chapters // 10)
+        self.assertEqual(sum(1 + len(chapter['subchapters']) for chapter in outline['chapters']), chapters)
+        self.assertEqual([metric['name'] for metric in outline['metrics']], ['Pages', 'Time'])
+        return outline
+
+    def test_10_chapters(self):
+        outline = self.assert_outline(10)
+        chapter = outline['chapters'][0]['subchapters'][2]
+        self.assertEqual(chapter['name'], 'Chapter 0.2')
+        self.assertEqual(chapter['position'], 3)
+        pages = next(instance for instance in chapter['progress'] if instance['value'] == '10.00')
+        self.assertEqual(list(pages['achieved'].values()), ['5.00'])
+
+    def test_100_chapters(self):
+        self.assert_outline(100)
+
+    def test_1000_chapters(self):
+        self.assert_outline(1000)
+
+    def test_other_user(self):
+        course = Course.objects.create(user=User.objects.create_user(username='testuser2', password='testpassword'), name='Other')
+        self.assertEqual(self.client.get(reverse('course-outline', args=[course.pk])).status_code, 404)
+
+
+class LiveProgressViewTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = import_course(self.user, {
+            'name': 'Course',
+            'metrics': [{'name': 'Pages', 'levels': [{'name': 'Done'}]}],
+            'chapters': [{'name': 'Chapter 1', 'progress': {'Pages': 10}}],
+        })
+
+    def test_published_on_commit(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        subscription = loop.run_until_complete(self.subscribe(topic(Course, self.course.pk)))
+        self.addCleanup(subscription.close)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Chapter.objects.get(course=self.course).complete()
+            self.assertEqual(loop.run_until_complete(subscription.get_batch(window=0, timeout=0.01)), {})
+        self.assertEqual(loop.run_until_complete(subscription.get_batch(window=0, timeout=1)), {topic(Course, self.course.pk): None})
+
+    async def subscribe(self, course_topic):
+        return events.subscribe([course_topic])
+
+    async def test_push_summary(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('live-progress'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        for i in range(3):
+            events.publish(topic(Course, self.course.pk))
+        event, data = (await anext(stream)).decode().strip().split('\n')
+        self.assertEqual(event, 'event: progress')
+        summary = json.loads(data.removeprefix('data: '))
+        self.assertEqual((summary['course'], summary['metrics'][0]['total']), (self.course.pk, 10.0))
+
+        # Later events only carry what changed, nothing when the progress did not change
+        instance = await InstanceMetric.objects.aget(course_metric__course=self.course)
+        level = await AchievementMetric.objects.aget(course_metric__course=self.course)
+        await sync_to_async(record_achievements)(self.user, [{'progress_instance': instance.pk, 'achievement_metric': level.pk, 'value': 10}])
+        events.publish(topic(Course, self.course.pk))
+        event, data = (await anext(stream)).decode().strip().split('\n')
+        delta = json.loads(data.removeprefix('data: '))
+        self.assertEqual(delta['percent_done'], 100.0)
+        self.assertEqual([set(metric) for metric in delta['metrics']], [{'id', 'percent_done', 'levels'}])
+
+    async def test_requires_login(self):
+        response = await self.async_client.get(reverse('live-progress'))
+        self.assertEqual(response.status_code, 403)
+
+
+class AsyncReadViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', email='test@example.com', password='testpassword')
+        self.course = import_course(self.user, {
+            'name': 'Course',
+            'metrics': [{'name': 'Pages', 'levels': [{'name': 'Done'}]}],
+            'chapters': [{'name': 'Chapter 1', 'chapters': [{'name': 'Chapter 1.1', 'progress': {'Pages': 10}}]}],
+        })
+
+    def test_views_are_async(self):
+        for name, args in (('profile', []), ('course-list', []), ('course-outline', [self.course.pk]), ('course-summary', [self.course.pk])):
+            match = resolve(reverse(name, args=args))
+            self.assertTrue(iscoroutinefunction(match.func), name)
+
+    async def test_read_endpoints(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('profile'))
+        self.assertEqual(response.json(), {'username': 'testuser', 'email': 'test@example.com'})
+
+        response = await self.async_client.get(reverse('course-list'))
+        self.assertEqual([course['name'] for course in response.json()['results']], ['Course'])
+
+        response = await self.async_client.get(reverse('course-outline', args=[self.course.pk]))
+        self.assertEqual(response.json()['chapters'][0]['subchapters'][0]['name'], 'Chapter 1.1')
+
+        response = await self.async_client.get(reverse('course-summary', args=[self.course.pk]))
+        self.assertEqual(response.json()['metrics'][0]['total'], 10.0)
+        response = await self.async_client.get(reverse('course-summary', args=[self.course.pk]), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_anonymous(self):
+        for name, args in (('profile', []), ('course-list', []), ('course-outline', [self.course.pk]), ('course-summary', [self.course.pk])):
+            response = await self.async_client.get(reverse(name, args=args))
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual(response.json(), {'detail': 'Authentication credentials were not provided.'})
+
+    async def test_read_only(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(reverse('course-list'))
+        self.assertEqual(response.status_code, 405)
+
+
+class ResponseCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.course = import_course(self.user, {
+            'name': 'Course',
+            'metrics': [{'name': 'Pages', 'levels': [{'name': 'Done'}]}],
+            'chapters': [{'name': 'Chapter 1', 'progress': {'Pages': 10}}],
+        })
+        self.client.force_login(self.user)
+
+    def test_hit_and_miss(self):
+        url = reverse('course-outline', args=[self.course.pk])
+        first = self.client.get(url)
+        with self.assertNumQueries(2):  # Session and user only
+            second = self.client.get(url)
+
+        self.assertEqual((first['X-Cache'], second['X-Cache']), ('miss', 'hit'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(response_cache.stats(), {'hits': 1, 'misses': 1})
+        self.assertEqual(self.client.get(url, {'limit': 1})['X-Cache'], 'miss')
+
+    def test_replica_reads_not_stored(self):
+        url = reverse('course-outline', args=[self.course.pk])
+        token = routers.activate(routers.Policy('replica1'))
+        try:
+            # Reads the test database, as a replica in sync would; the ReplicaMiddleware, if configured, picks replica1 too
+            with override_settings(REPLICA_DATABASES=['replica1'], REPLICA_APPS=[]):
+                self.assertEqual(self.client.get(url)['X-Cache'], 'miss')
+                self.assertEqual(self.client.get(url)['X-Cache'], 'miss')
+        finally:
+            routers.deactivate(token)
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'hit')
+
+    def test_per_user(self):
+        self.client.get(reverse('course-list'))
+        self.client.force_login(User.objects.create_user(username='other', password='testpassword'))
+        response = self.client.get(reverse('course-list'))
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertEqual(response.json()['results'], [])
+
+    def test_invalidated_by_achievement(self):
+        url = reverse('course-outline', args=[self.course.pk])
+        self.client.get(url)
+        done = AchievementMetric.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            record_achievements(self.user, [{'progress_instance': InstanceMetric.objects.get().pk, 'achievement_metric': done.pk, 'value': 4}])
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'miss')
+        self.assertEqual(response.json()['chapters'][0]['progress'][0]['achieved'], {str(done.pk): '4.00'})
+
+    def test_invalidated_by_course_and_chapter(self):
+        url = reverse('course-list')
+        for change in (lambda: Course.objects.filter(pk=self.course.pk).get().save(),
+                       lambda: Chapter.objects.create(course=self.course, name='Chapter 2'),
+                       lambda: Course.objects.create(user=self.user, name='Second')):
+            self.client.get(url)
+            self.assertEqual(self.client.get(url)['X-Cache'], 'hit')
+            with self.captureOnCommitCallbacks(execute=True):
+                change()
+            self.assertEqual(self.client.get(url)['X-Cache'], 'miss')
+
+    def test_not_invalidated_by_other_user(self):
+        url = reverse('course-list')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(user=User.objects.create_user(username='other', password='testpassword'), name='Other')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'hit')
+
+    def test_errors_not_cached(self):
+        url = reverse('course-outline', args=[self.course.pk + 1])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'miss')
@@ -2,4 +2,14 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
+    path("", views.CourseListView.as_view(), name="course-list"),
+    path("import", views.ImportCourseView.as_view(), name="import-courses"),
+    path("<int:course_id>/outline", views.CourseOutlineView.as_view(), name="course-outline"),
+    path("<int:course_id>/summary", views.CourseSummaryView.as_view(), name="course-summary"),
+    path("sessions/ingest", views.IngestSessionsView.as_view(), name="ingest-sessions"),
+    path("live", views.LiveProgressView.as_view(), name="live-progress"),
+    path("forecast", views.ForecastView.as_view(), name="forecast"),
+    path("export", views.ExportView.as_view(), name="export"),
+    path("study-time", views.StudyTimeView.as_view(), name="study-time"),
+    path("achievements/bulk", views.BulkAchievementView.as_view(), name="bulk-achievements"),
 ]
\ No newline at end of file
@@ -1,8 +1,46 @@
+import json
+from asgiref.sync import sync_to_async
+from django.forms import ValidationError
+from django.http import StreamingHttpResponse
+from datetime import timedelta
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, quote_etag
+from rest_framework.authentication import SessionAuthentication
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
-from .serializers import CreateCourseSerializer
-from .models.models import Course
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework import permissions, status
+from .serializers import CourseListSerializer, CourseOutlineSerializer, CreateCourseSerializer, BulkAchievementSerializer
+from .pagination import apaginate_by_modified, get_limit
+from .models.models import Course, Chapter, build_tree
+from .models.touch import topic
+from .progress.models import CourseMetric
+from .progress.summary import aget_summary, get_summary, summary_delta
+from .progress.rollups import study_time
+from .progress.forecast import get_forecast
+from core import events
+from core.views import AsyncReadView, render, stream
+from . import export, importer, ingest, service
+
+
+class CourseListView(AsyncReadView):
+    cache_responses = True
+
+    async def get(self, request):
+        try:
+            limit = get_limit(request.GET.get('limit'))
+            courses, cursor = await apaginate_by_modified(
+                Course.flat.filter(user=request.user).columns(*CourseListSerializer.Meta.fields),
+                request.GET.get('cursor'),
+                limit,
+            )
+        except ValidationError as error:
+            return render({"error": error.messages}, status_code=status.HTTP_400_BAD_REQUEST)
+
+        serializer = CourseListSerializer(courses, many=True)
+        return render({"results": serializer.data, "next": cursor})
 
 
 class CreateCourseView(APIView):
@@ -17,4 +55,180 @@ class CreateCourseView(APIView):
             serializer.save() 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
\ No newline at end of file
+
+
+class BulkAchievementView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (SessionAuthentication,)
+
+    def post(self, request):
+        serializer = BulkAchievementSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            achievements = service.record_achievements(request.user, serializer.validated_data['achievements'])
+        except ValidationError as error:
+            errors = error.message_dict if hasattr(error, 'error_dict') else error.messages
+            return Response({"achievements": errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"achievements": [achievement.pk for achievement in achievements]}, status=status.HTTP_201_CREATED)
+
+
+class IngestSessionsView(APIView):
+    '''
+    Streams an NDJSON upload of study sessions through the ingestion in batches and answers with an NDJSON result per line
+    '''
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (SessionAuthentication,)
+
+    def post(self, request):
+        results = ingest.ingest_sessions(request.user, request.stream or [])
+        return stream(request, (json.dumps(result) + '\n' for result in results), content_type='application/x-ndjson')
+
+
+class ExportView(APIView):
+    '''
+    Streams an export of all data of the user, as JSON or as a zip archive of CSV files.
+    The output parameter selects json (the default) or csv, zip=1 zips the JSON as well.
+    '''
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (SessionAuthentication,)
+
+    def get(self, request):
+        output = request.query_params.get('output', 'json')
+        if output not in export.FORMATS:
+            return Response({"error": [f"Unknown output {output}, use {' or '.join(export.FORMATS)}"]}, status=status.HTTP_400_BAD_REQUEST)
+
+        zipped = output == 'csv' or request.query_params.get('zip') in ('1', 'true')
+        content_type, extension = ('application/zip', f'{output}.zip') if zipped else ('application/json', output)
+        response = stream(request, export.export_account(request.user, output, zipped), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="planpulse-export.{extension}"'
+        return response
+
+
+class StudyTimeView(APIView):
+    '''
+    Answers study time range queries from the rollups, per day and course or per week.
+    The range defaults to the last seven days, durations are in seconds.
+    '''
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (SessionAuthentication,)
+
+    def get(self, request):
+        try:
+            end = self.get_date(request.query_params.get('end'), timezone.localdate())
+            start = self.get_date(request.query_params.get('start'), end - timedelta(days=6))
+            course_id = request.query_params.get('course')
+            rows = study_time(request.user, start, end, request.query_params.get('by', 'day'), int(course_id) if course_id else None)
+        except (ValidationError, ValueError) as error:
+            return Response({"error": getattr(error, 'messages', [str(error)])}, status=status.HTTP_400_BAD_REQUEST)
+
+        for row in rows:
+            row['duration'] = row['duration'].total_seconds()
+        return Response({"start": start, "end": end, "results": rows}, status=status.HTTP_200_OK)
+
+    def get_date(self, value, default):
+        if not value:
+            return default
+        date = parse_date(value)
+        if date is None:
+            raise ValidationError(f"Invalid date {value}")
+        return date
+
+
+class ForecastView(APIView):
+    '''
+    Returns the remaining study time of the user in seconds, in total and per course and chapter
+    '''
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (SessionAuthentication,)
+
+    def get(self, request):
+        return Response(get_forecast(request.user), status=status.HTTP_200_OK)
+
+
+class ImportCourseView(APIView):
+    permission_classes = (permissions.IsAuthenticated,)
+    authentication_classes = (SessionAuthentication,)
+
+    def post(self, request):
+        documents = request.data.get('courses', [request.data]) if isinstance(request.data, dict) else request.data
+        if not isinstance(documents, list):
+            return Response({"error": "Expected a course document or a list of courses"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            courses = importer.import_courses(request.user, documents)
+        except ValidationError as error:
+            return Response({"error": error.messages}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"courses": [course.pk for course in courses]}, status=status.HTTP_201_CREATED)
+
+
+class CourseSummaryView(AsyncReadView):
+    async def get(self, request, course_id):
+        date_modified = await Course.flat.filter(pk=course_id, user=request.user).values_list('date_modified', flat=True).afirst()
+        if date_modified is None:
+            return render({"error": "Course not found"}, status_code=status.HTTP_404_NOT_FOUND)
+
+        # The modified date is the version of the summary, answer without reading any progress when it is unchanged
+        etag = quote_etag(f"{course_id}-{date_modified.timestamp()}")
+        last_modified = int(date_modified.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = render(await aget_summary(course_id, date_modified))
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class LiveProgressView(AsyncReadView):
+    '''
+    Pushes the progress of every course of the user that changes as server-sent events, instead of polling.
+    The first event of a course is its whole summary, later ones only its changed metrics and levels (summary_delta).
+    Changes are coalesced per burst of window seconds; the courses are those of the user when the connection opens.
+    Needs an ASGI server, the connection is held by the event loop and not by a thread.
+    '''
+    window = 0.25
+    keepalive = 15
+
+    async def get(self, request):
+        topics = {topic(Course, pk): pk async for pk in Course.flat.filter(user=request.user).values_list('pk', flat=True)}
+        response = StreamingHttpResponse(self.stream(events.subscribe(topics), topics), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, subscription, topics):
+        sent = {}
+        with subscription:
+            yield "retry: 3000\n\n"
+            while True:
+                batch = await subscription.get_batch(self.window, self.keepalive)
+                if not batch:
+                    yield ": keepalive\n\n"
+                for course_topic in sorted(batch):
+                    summary = await sync_to_async(self.get_summary)(topics[course_topic])
+                    if summary is None:
+                        continue
+                    delta = summary_delta(sent.get(course_topic), summary)
+                    sent[course_topic] = summary
+                    if delta is not None:
+                        yield f"event: progress\ndata: {json.dumps(delta, cls=JSONEncoder)}\n\n"
+
+    def get_summary(self, course_id):
+        date_modified = Course.flat.filter(pk=course_id).values_list('date_modified', flat=True).first()
+        return get_summary(course_id, date_modified) if date_modified else None
+
+
+class CourseOutlineView(AsyncReadView):
+    cache_responses = True
+
+    async def get(self, request, course_id):
+        course = await Course.flat.filter(pk=course_id, user=request.user).afirst()
+        if course is None:
+            return render({"error": "Course not found"}, status_code=status.HTTP_404_NOT_FOUND)
+
+        # A fixed number of queries: chapters, their progress and achievements, metrics and their levels
+        course.chapter_tree = build_tree([chapter async for chapter in Chapter.flat.filter(course=course).with_progress()])
+        course.metrics = [metric async for metric in CourseMetric.objects.filter(course=course).prefetch_related('achievement_levels')]
+        return render(CourseOutlineSerializer(course).data)
@@ -1,3 +1,15 @@
-from django.db import models
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from core import cache as response_cache
 
-# Create your models here.
+
+@receiver(post_save, sender=User)
+def invalidate_profile(sender, instance, **kwargs):
+    '''
+    Drops the cached responses of a user whose profile changed, logging in only updates last_login
+    '''
+    if kwargs.get('update_fields') == frozenset(['last_login']):
+        return
+    transaction.on_commit(lambda: response_cache.invalidate_users([instance.pk]))
@@ -2,6 +2,7 @@ from django.contrib.auth import get_user_model, login, logout
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from core.views import AsyncReadView, render
 from .serializers import UserRegisterSerializer, UserLoginSerializer, UserSerializer
 from rest_framework import permissions, status
 
@@ -41,10 +42,9 @@ class UserLogout(APIView):
         return Response(status=status.HTTP_200_OK)
 
 
-class UserProfile(APIView):
-    permission_classes = (permissions.IsAuthenticated,)
-    authentication_classes = (SessionAuthentication,)
+class UserProfile(AsyncReadView):
+    cache_responses = True
 
-    def get(self, request):
+    async def get(self, request):
         serializer = UserSerializer(request.user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return render(serializer.data)
\ No newline at end of file